@@ -1,13 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
 from app.database import get_db
 from app.models.models import Resume, ATSResult
 from app.services.ats_service import ATSScorer
-from app.services.report_service import ReportGenerator
-from app.utils.pdf_utils import extract_text_from_pdf
+from app.services.extraction_cache import extract_text_cached
+from app.services.extraction_pool import run_extraction
+from app.services.resume_index import record_resume_deletion
+from app.services.feature_store import build_feature_record, features_from_record, stored_resume_features, stored_text
+from app.services.enrichment_service import (
+    PENDING, COMPLETE, ATS_ENRICHMENT,
+    start_enrichment, find_analysis, enrichment_payload, enrichment_events
+)
+from app.utils.upload_utils import read_upload, persist_upload, read_batch_uploads
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+import asyncio
+import json
 import os
-import shutil
+from uuid import uuid4
 from datetime import datetime
 from app.config import settings
 from bson import ObjectId
@@ -36,111 +46,103 @@ async def analyze_ats(
     if not file.filename.endswith(('.pdf', '.PDF')):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
     
-    # Save uploaded file
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"resume_{timestamp}_{file.filename}"
-    filepath = os.path.join(settings.upload_dir, filename)
+    # Read the upload into memory, hashing it and enforcing the size limit.
+    # Nothing touches disk unless a new resume record is created below.
+    upload = await read_upload(file, settings.max_upload_size)
+    content_hash = upload['content_hash']
+    print(f"Received {upload['size']} bytes")
     
-    print(f"Saving file to: {filepath}")
+    # Reuse an identical earlier upload from this user instead of storing a duplicate
+    existing_resume = None
+    if user_id:
+        existing_resume = await db.resumes.find_one({"user_id": user_id, "content_hash": content_hash})
+        if existing_resume and not os.path.exists(existing_resume['file_path']):
+            existing_resume = None
+        if existing_resume:
+            print(f"Reusing stored resume: {existing_resume['_id']}")
     
     try:
-        with open(filepath, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        print(f"File saved successfully")
-    except Exception as e:
-        print(f"Error saving file: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
-    
-    try:
-        # Extract text from PDF
+        # Extract text from the in-memory PDF (skipped entirely on a cache hit)
         print("Extracting text from PDF...")
-        resume_text = extract_text_from_pdf(filepath)
+        resume_text = await extract_text_cached(db, content_hash, upload['data'])
         print(f"Extracted {len(resume_text)} characters")
         
         if not resume_text or len(resume_text) < 50:
             raise HTTPException(status_code=400, detail="Could not extract text from PDF. The file may be corrupted or scanned image.")
         
-        # Calculate ATS score
+        # Heuristic score now; the Gemini analysis is blended in the background
         print("Calculating ATS score...")
-        ats_scorer = ATSScorer()
-        result = ats_scorer.calculate_ats_score(resume_text)
+        # The feature record is stored with the resume for later analyses
+        feature_record = build_feature_record(resume_text)
+        result = ATSScorer().calculate_heuristic_score(resume_text, features_from_record(feature_record))
         print(f"ATS Score calculated: {result['overall_score']}")
+        analysis_id = uuid4().hex
+        ats_id = None
+        resume_id = None
+        user_name = "User"
         
         # Save to database if user_id provided
         if user_id:
             print(f"Saving to database for user: {user_id}")
-            # Save resume record
-            resume_doc = {
-                "user_id": user_id,
-                "file_name": file.filename,
-                "file_path": filepath,
-                "file_type": "application/pdf",
-                "extracted_text": resume_text[:5000],  # Store first 5000 chars
-                "ats_score": result['overall_score'],
-                "uploaded_at": datetime.utcnow()
-            }
-            resume_result = await db.resumes.insert_one(resume_doc)
-            resume_id = str(resume_result.inserted_id)
-            print(f"Resume saved with ID: {resume_id}")
+            if existing_resume:
+                resume_id = str(existing_resume['_id'])
+                await db.resumes.update_one(
+                    {"_id": existing_resume['_id']},
+                    {"$set": {"ats_score": result['overall_score'], "features": feature_record}}
+                )
+                print(f"Resume updated with ID: {resume_id}")
+            else:
+                # Persist the file only now that a resume record is being created
+                filepath = await persist_upload(upload, settings.upload_dir)
+                print(f"File saved to: {filepath}")
+                
+                # Save resume record
+                resume_doc = {
+                    "user_id": user_id,
+                    "file_name": file.filename,
+                    "file_path": filepath,
+                    "file_type": "application/pdf",
+                    "content_hash": content_hash,
+                    "extracted_text": stored_text(resume_text),
+                    "ats_score": result['overall_score'],
+                    "features": feature_record,
+                    "uploaded_at": datetime.utcnow()
+                }
+                resume_result = await db.resumes.insert_one(resume_doc)
+                resume_id = str(resume_result.inserted_id)
+                print(f"Resume saved with ID: {resume_id}")
             
-            # Save ATS result
-            ats_doc = {
-                "user_id": user_id,
-                "resume_id": resume_id,
-                "overall_score": result['overall_score'],
-                "formatting_score": result['formatting_score'],
-                "keywords_score": result['keywords_score'],
-                "readability_score": result['readability_score'],
-                "structure_score": result['structure_score'],
-                "suggestions": result['suggestions'],
-                "ai_analysis": result.get('ai_analysis'),
-                "created_at": datetime.utcnow()
-            }
-            ats_insert = await db.ats_results.insert_one(ats_doc)
+            # Save ATS result (updated with the blended score once AI analysis finishes)
+            ats_insert = await db.ats_results.insert_one(_ats_doc(user_id, resume_id, result, analysis_id))
             ats_id = str(ats_insert.inserted_id)
             print(f"ATS result saved with ID: {ats_id}")
             
-            # Generate report
-            print("Generating report...")
-            report_gen = ReportGenerator()
             user = await db.users.find_one({"_id": ObjectId(user_id)})
             user_name = user['full_name'] if user else "User"
-            report_path = report_gen.generate_ats_report(result, user_name)
-            print(f"Report generated: {report_path}")
-            
-            # Update with report path
-            await db.ats_results.update_one(
-                {"_id": ObjectId(ats_id)},
-                {"$set": {"report_path": report_path}}
-            )
-            
-            result['atsId'] = ats_id
-            result['reportPath'] = report_path
         
-        # Format response
-        response_data = {
-            'overallScore': result['overall_score'],
-            'metrics': {
-                'formatting': result['formatting_score'],
-                'keywords': result['keywords_score'],
-                'readability': result['readability_score'],
-                'structure': result['structure_score']
-            },
-            'suggestions': result['suggestions'],
-            'foundKeywords': result.get('found_keywords', []),
-            'sectionsFound': result.get('sections_found', [])
-        }
+        # Gemini analysis, blending and the report run on the job workers
+        await start_enrichment(db, ATS_ENRICHMENT, analysis_id, {
+            'resume_text': resume_text,
+            'result': result,
+            'ats_id': ats_id,
+            'resume_id': resume_id,
+            'user_name': user_name
+        })
         
+        # Format response
+        response_data = format_ats_result(result)
+        response_data['analysisId'] = analysis_id
+        response_data['jobId'] = analysis_id
+        response_data['enrichmentStatus'] = PENDING
         if user_id:
-            response_data['atsId'] = result.get('atsId')
-            response_data['reportPath'] = result.get('reportPath')
+            response_data['atsId'] = ats_id
         
         print("=== ATS Analysis Completed Successfully ===")
         
         return {
             "success": True,
             "data": response_data,
-            "message": "ATS analysis complete"
+            "message": "ATS score ready, AI analysis in progress"
         }
         
     except HTTPException:
@@ -153,6 +155,161 @@ async def analyze_ats(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+def format_ats_result(result: dict) -> dict:
+    """Shape an ATSScorer result for API responses"""
+    return {
+        'overallScore': result['overall_score'],
+        'metrics': {
+            'formatting': result['formatting_score'],
+            'keywords': result['keywords_score'],
+            'readability': result['readability_score'],
+            'structure': result['structure_score']
+        },
+        'suggestions': result['suggestions'],
+        'foundKeywords': result.get('found_keywords', []),
+        'sectionsFound': result.get('sections_found', [])
+    }
+
+def _ats_doc(user_id: str, resume_id: str, result: dict, analysis_id: str) -> dict:
+    """ats_results document for a heuristic result awaiting AI enrichment"""
+    return {
+        "user_id": user_id,
+        "resume_id": resume_id,
+        "analysis_id": analysis_id,
+        "enrichment_status": PENDING,
+        "overall_score": result['overall_score'],
+        "formatting_score": result['formatting_score'],
+        "keywords_score": result['keywords_score'],
+        "readability_score": result['readability_score'],
+        "structure_score": result['structure_score'],
+        "suggestions": result['suggestions'],
+        "found_keywords": result.get('found_keywords', []),
+        "sections_found": result.get('sections_found', []),
+        "ai_analysis": None,
+        "created_at": datetime.utcnow()
+    }
+
+@router.get("/analysis/{analysis_id}")
+async def get_ats_analysis(analysis_id: str, db = Depends(get_db)):
+    """Poll an analysis: heuristic result while pending, blended result once complete"""
+    state = await find_analysis(db, db.ats_results, analysis_id)
+    if not state:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    
+    return {
+        "success": True,
+        "data": enrichment_payload(analysis_id, state, format_ats_result),
+        "message": "AI analysis complete" if state['status'] == COMPLETE else f"AI analysis {state['status']}"
+    }
+
+@router.get("/analysis/{analysis_id}/events")
+async def stream_ats_analysis(analysis_id: str, db = Depends(get_db)):
+    """Server-sent events: current result now, `partial` results as AI analysis streams in, then the final one"""
+    state = await find_analysis(db, db.ats_results, analysis_id)
+    if not state:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    
+    return StreamingResponse(
+        enrichment_events(db, db.ats_results, analysis_id, state, format_ats_result),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+@router.post("/analyze-batch")
+async def analyze_ats_batch(
+    files: List[UploadFile] = File(...),
+    db = Depends(get_db)
+):
+    """
+    Analyze many resumes (PDFs and/or ZIP archives of PDFs) at once.
+    Streams NDJSON in completion order; each line carries the resume's index in
+    the upload for matching. A resume gets a line as soon as it is scored
+    (`enrichmentStatus` pending, or an error), then a second one with the
+    blended score once the AI analysis of its window of completed resumes is in.
+    """
+    items = await read_batch_uploads(
+        files, settings.max_upload_size, settings.batch_max_files, settings.max_batch_upload_size
+    )
+    print(f"=== ATS Batch Analysis: {len(items)} resume(s) ===")
+    
+    semaphore = asyncio.Semaphore(settings.batch_concurrency)
+    ats_scorer = ATSScorer()
+    
+    async def score_item(index: int, item: dict) -> dict:
+        """Extraction and heuristic score; the AI analysis is batched afterwards"""
+        line = {'index': index, 'fileName': item['file_name']}
+        if item.get('error'):
+            return {**line, 'success': False, 'error': item['error']}
+        
+        async with semaphore:
+            try:
+                resume_text = await extract_text_cached(db, item['content_hash'], item['data'])
+                if not resume_text or len(resume_text) < 50:
+                    return {**line, 'success': False, 'error': "Could not extract text from PDF"}
+                
+                result = ats_scorer.calculate_heuristic_score(resume_text)
+                return {**line, 'success': True, 'resume_text': resume_text, 'result': result}
+            except Exception as e:
+                print(f"Batch item {index} failed: {e}")
+                return {**line, 'success': False, 'error': str(e)}
+    
+    # Lines from the scoring and AI tasks, None once everything is done
+    lines: asyncio.Queue = asyncio.Queue()
+    tasks = []
+    
+    async def analyze_window(window: dict):
+        """Several resumes per Gemini call instead of one call each"""
+        try:
+            resume_texts = {index: line['resume_text'] for index, line in window.items()}
+            async for index, ai_analysis in ats_scorer.iter_ai_analyses(resume_texts):
+                line = window[index]
+                result = ats_scorer.apply_ai_analysis(line['result'], ai_analysis)
+                await lines.put({
+                    'index': line['index'], 'fileName': line['fileName'], 'success': True,
+                    'enrichmentStatus': COMPLETE, 'data': format_ats_result(result)
+                })
+        except Exception as e:
+            # The heuristic lines are already out; only the follow-ups are lost
+            print(f"Batch AI analysis failed: {e}")
+    
+    async def run_batch():
+        try:
+            scoring = [asyncio.create_task(score_item(i, item)) for i, item in enumerate(items)]
+            tasks.extend(scoring)
+            window = {}
+            for finished in asyncio.as_completed(scoring):
+                line = await finished
+                if not line['success']:
+                    await lines.put(line)
+                    continue
+                await lines.put({
+                    'index': line['index'], 'fileName': line['fileName'], 'success': True,
+                    'enrichmentStatus': PENDING, 'data': format_ats_result(line['result'])
+                })
+                # AI runs in rolling windows of completed resumes, while the rest are still scored
+                window[str(line['index'])] = line
+                if len(window) >= settings.llm_batch_max_items:
+                    tasks.append(asyncio.create_task(analyze_window(window)))
+                    window = {}
+            if window:
+                tasks.append(asyncio.create_task(analyze_window(window)))
+            await asyncio.gather(*tasks)
+        finally:
+            await lines.put(None)
+    
+    async def stream_results():
+        runner = asyncio.create_task(run_batch())
+        try:
+            while (line := await lines.get()) is not None:
+                yield json.dumps(line) + "\n"
+        finally:
+            # Client went away or stream finished - drop any work still pending
+            runner.cancel()
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
 @router.get("/download/{ats_id}")
 async def download_ats_report(ats_id: str, db = Depends(get_db)):
     """Download ATS report"""
@@ -161,6 +318,9 @@ async def download_ats_report(ats_id: str, db = Depends(get_db)):
     except:
         raise HTTPException(status_code=400, detail="Invalid ATS ID")
     
+    if ats_result and not ats_result.get('report_path') and ats_result.get('enrichment_status') == PENDING:
+        raise HTTPException(status_code=409, detail="Report is still being generated, try again shortly")
+    
     if not ats_result or not ats_result.get('report_path'):
         raise HTTPException(status_code=404, detail="Report not found")
     
@@ -234,6 +394,7 @@ async def delete_resume(resume_id: str, db = Depends(get_db)):
     
     # Delete from database
     await db.resumes.delete_one({"_id": ObjectId(resume_id)})
+    await record_resume_deletion(db, resume_id)
     
     # Also delete associated ATS results
     await db.ats_results.delete_many({"resume_id": resume_id})
@@ -266,72 +427,51 @@ async def analyze_stored_resume(
         if not resume_text or len(resume_text) < 50:
             if not os.path.exists(resume['file_path']):
                 raise HTTPException(status_code=404, detail="Resume file not found on server")
-            resume_text = extract_text_from_pdf(resume['file_path'])
+            resume_text = (await run_extraction(resume['file_path']))['text']
         
-        # Calculate ATS score
-        ats_scorer = ATSScorer()
-        result = ats_scorer.calculate_ats_score(resume_text)
+        # Heuristic score now, from the features stored at upload; the Gemini
+        # analysis is blended in the background
+        features = await stored_resume_features(db, resume, resume_text)
+        result = ATSScorer().calculate_heuristic_score(resume_text, features)
+        analysis_id = uuid4().hex
+        ats_id = None
+        user_name = "User"
         
         # Save ATS result to database
         if user_id:
-            ats_doc = {
-                "user_id": user_id,
-                "resume_id": resume_id,
-                "overall_score": result['overall_score'],
-                "formatting_score": result['formatting_score'],
-                "keywords_score": result['keywords_score'],
-                "readability_score": result['readability_score'],
-                "structure_score": result['structure_score'],
-                "suggestions": result['suggestions'],
-                "ai_analysis": result.get('ai_analysis'),
-                "created_at": datetime.utcnow()
-            }
-            ats_insert = await db.ats_results.insert_one(ats_doc)
+            ats_insert = await db.ats_results.insert_one(_ats_doc(user_id, resume_id, result, analysis_id))
             ats_id = str(ats_insert.inserted_id)
             
-            # Generate report
-            report_gen = ReportGenerator()
-            user = await db.users.find_one({"_id": ObjectId(user_id)})
-            user_name = user['full_name'] if user else "User"
-            report_path = report_gen.generate_ats_report(result, user_name)
-            
-            # Update with report path
-            await db.ats_results.update_one(
-                {"_id": ObjectId(ats_id)},
-                {"$set": {"report_path": report_path}}
-            )
-            
             # Update resume ATS score
             await db.resumes.update_one(
                 {"_id": ObjectId(resume_id)},
                 {"$set": {"ats_score": result['overall_score']}}
             )
             
-            result['atsId'] = ats_id
-            result['reportPath'] = report_path
+            user = await db.users.find_one({"_id": ObjectId(user_id)})
+            user_name = user['full_name'] if user else "User"
         
-        # Format response
-        response_data = {
-            'overallScore': result['overall_score'],
-            'metrics': {
-                'formatting': result['formatting_score'],
-                'keywords': result['keywords_score'],
-                'readability': result['readability_score'],
-                'structure': result['structure_score']
-            },
-            'suggestions': result['suggestions'],
-            'foundKeywords': result.get('found_keywords', []),
-            'sectionsFound': result.get('sections_found', [])
-        }
+        # Gemini analysis, blending and the report run on the job workers
+        await start_enrichment(db, ATS_ENRICHMENT, analysis_id, {
+            'resume_text': resume_text,
+            'result': result,
+            'ats_id': ats_id,
+            'resume_id': resume_id,
+            'user_name': user_name
+        })
         
+        # Format response
+        response_data = format_ats_result(result)
+        response_data['analysisId'] = analysis_id
+        response_data['jobId'] = analysis_id
+        response_data['enrichmentStatus'] = PENDING
         if user_id:
-            response_data['atsId'] = result.get('atsId')
-            response_data['reportPath'] = result.get('reportPath')
+            response_data['atsId'] = ats_id
         
         return {
             "success": True,
             "data": response_data,
-            "message": "ATS analysis complete"
+            "message": "ATS score ready, AI analysis in progress"
         }
     except Exception as e:
         print(f"Error analyzing stored resume: {e}")
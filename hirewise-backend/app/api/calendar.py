@@ -1,28 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Header
+from fastapi import APIRouter, Depends, HTTPException, status
 from datetime import datetime, timedelta
 from typing import List, Optional
 from bson import ObjectId
 
 from app.database import get_database
 from app.models.models import CalendarActivity
+from app.utils.auth import get_current_user_email
 
 router = APIRouter(prefix="/api/calendar", tags=["calendar"])
 
-# Temporary: Get user from Authorization header (email-based)
-async def get_current_user_email(authorization: Optional[str] = Header(None), db = Depends(get_database)):
-    """Get current user from authorization header (email)"""
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    # Extract email from "Bearer email@example.com"
-    email = authorization.replace("Bearer ", "").strip()
-    user = await db.users.find_one({"email": email})
-    
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
-    
-    return user
-
 @router.get("/activities")
 async def get_user_activities(
     start_date: Optional[str] = None,
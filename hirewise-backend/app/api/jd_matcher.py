@@ -1,12 +1,26 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
 from app.database import get_db
 from app.models.models import Resume, JDMatch
 from app.services.jd_matcher_service import JDMatcher
-from app.services.report_service import ReportGenerator
-from app.utils.pdf_utils import extract_text_from_pdf
+from app.services.extraction_cache import extract_text_cached
+from app.services.extraction_pool import run_extraction
+from app.services.jd_ranker import rank_job_descriptions
+from app.services.resume_index import search_resumes, get_resume_index_stats
+from app.services.feature_store import build_feature_record, features_from_record, stored_resume_features, stored_text
+from app.services.jd_feature_cache import get_jd_features
+from app.services.enrichment_service import (
+    PENDING, COMPLETE, JD_ENRICHMENT,
+    start_enrichment, find_analysis, enrichment_payload, enrichment_events
+)
+from app.utils.auth import RECRUITER_ROLE, get_current_user_email
+from app.utils.skill_taxonomy import skill_fields
+from app.utils.upload_utils import read_upload, persist_upload
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, Optional, Tuple
+import asyncio
 import os
+from uuid import uuid4
 from datetime import datetime
 from app.config import settings
 from bson import ObjectId
@@ -18,6 +32,46 @@ class JDMatchResponse(BaseModel):
     data: dict
     message: str
 
+def format_jd_result(result: dict) -> dict:
+    """Shape a JDMatcher result for API responses"""
+    return {
+        'matchScore': result['match_score'],
+        'analysis': {
+            'technicalSkills': result['technical_skills'],
+            'experience': result['experience_score'],
+            'education': result['education_score'],
+            'keywords': result['keywords_score']
+        },
+        'matchedSkills': result['matched_skills'],
+        'missingSkills': result['missing_skills'],
+        'recommendations': result['recommendations']
+    }
+
+def _jd_doc(
+    user_id: str, resume_id: str, job_title: Optional[str], job_description: str, jd_features: dict,
+    result: dict, analysis_id: str
+) -> dict:
+    """jd_matches document for a heuristic result awaiting AI enrichment"""
+    return {
+        "user_id": user_id,
+        "resume_id": resume_id,
+        "job_title": job_title,
+        "job_description": job_description,
+        **skill_fields(jd_features['skill_ids'], 'jd_skill_ids'),
+        "analysis_id": analysis_id,
+        "enrichment_status": PENDING,
+        "match_score": result['match_score'],
+        "technical_skills": result['technical_skills'],
+        "experience_score": result['experience_score'],
+        "education_score": result['education_score'],
+        "keywords_score": result['keywords_score'],
+        "matched_skills": result['matched_skills'],
+        "missing_skills": result['missing_skills'],
+        "recommendations": result['recommendations'],
+        "ai_analysis": None,
+        "created_at": datetime.utcnow()
+    }
+
 @router.post("/analyze", response_model=JDMatchResponse)
 async def analyze_jd_match(
     resume_file: UploadFile = File(...),
@@ -32,18 +86,21 @@ async def analyze_jd_match(
     if not resume_file.filename.endswith(('.pdf', '.PDF')):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
     
-    # Save uploaded file temporarily
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"resume_{timestamp}_{resume_file.filename}"
-    filepath = os.path.join(settings.upload_dir, filename)
+    # Read the upload into memory, hashing it and enforcing the size limit.
+    # Nothing touches disk unless a new resume record is created below.
+    upload = await read_upload(resume_file, settings.max_upload_size)
+    content_hash = upload['content_hash']
     
-    import shutil
-    with open(filepath, "wb") as buffer:
-        shutil.copyfileobj(resume_file.file, buffer)
+    # Reuse an identical earlier upload from this user instead of storing a duplicate
+    existing_resume = None
+    if user_id:
+        existing_resume = await db.resumes.find_one({"user_id": user_id, "content_hash": content_hash})
+        if existing_resume and not os.path.exists(existing_resume['file_path']):
+            existing_resume = None
     
     try:
-        # Extract text from PDF
-        resume_text = extract_text_from_pdf(filepath)
+        # Extract text from the in-memory PDF (skipped entirely on a cache hit)
+        resume_text = await extract_text_cached(db, content_hash, upload['data'])
         
         if not resume_text or len(resume_text) < 50:
             raise HTTPException(status_code=400, detail="Could not extract text from PDF")
@@ -51,86 +108,108 @@ async def analyze_jd_match(
         if not job_description or len(job_description) < 50:
             raise HTTPException(status_code=400, detail="Job description is too short")
         
-        # Calculate match score
-        jd_matcher = JDMatcher()
-        result = jd_matcher.calculate_match_score(resume_text, job_description)
+        # Heuristic match now; the Gemini analysis is blended in the background.
+        # Both feature sets are kept so they can be stored
+        matcher = JDMatcher()
+        feature_record = build_feature_record(resume_text)
+        resume_features = features_from_record(feature_record)
+        # Parsed once per distinct JD, however many resumes are matched against it
+        jd_features = await get_jd_features(db, job_description)
+        result = matcher.calculate_heuristic_match(resume_text, job_description, resume_features, jd_features)
+        analysis_id = uuid4().hex
+        match_id = None
+        user_name = "User"
         
         # Save to database if user_id provided
         if user_id:
-            # Save resume record
-            resume_doc = {
-                "user_id": user_id,
-                "file_name": resume_file.filename,
-                "file_path": filepath,
-                "file_type": "application/pdf",
-                "extracted_text": resume_text[:5000],
-                "uploaded_at": datetime.utcnow()
-            }
-            resume_result = await db.resumes.insert_one(resume_doc)
-            resume_id = str(resume_result.inserted_id)
+            if existing_resume:
+                resume_id = str(existing_resume['_id'])
+                if features_from_record(existing_resume.get('features')) is None:
+                    # Stored before the current feature extractor
+                    await db.resumes.update_one(
+                        {"_id": existing_resume['_id']}, {"$set": {"features": feature_record}}
+                    )
+            else:
+                # Persist the file only now that a resume record is being created
+                filepath = await persist_upload(upload, settings.upload_dir)
+                
+                # Save resume record
+                resume_doc = {
+                    "user_id": user_id,
+                    "file_name": resume_file.filename,
+                    "file_path": filepath,
+                    "file_type": "application/pdf",
+                    "content_hash": content_hash,
+                    "extracted_text": stored_text(resume_text),
+                    "features": feature_record,
+                    "uploaded_at": datetime.utcnow()
+                }
+                resume_result = await db.resumes.insert_one(resume_doc)
+                resume_id = str(resume_result.inserted_id)
             
-            # Save JD match result
-            jd_doc = {
-                "user_id": user_id,
-                "resume_id": resume_id,
-                "job_description": job_description,
-                "match_score": result['match_score'],
-                "technical_skills": result['technical_skills'],
-                "experience_score": result['experience_score'],
-                "education_score": result['education_score'],
-                "keywords_score": result['keywords_score'],
-                "matched_skills": result['matched_skills'],
-                "missing_skills": result['missing_skills'],
-                "recommendations": result['recommendations'],
-                "ai_analysis": result.get('ai_analysis'),
-                "created_at": datetime.utcnow()
-            }
-            jd_insert = await db.jd_matches.insert_one(jd_doc)
+            # Save JD match result (updated with the blended score once AI analysis finishes)
+            jd_insert = await db.jd_matches.insert_one(
+                _jd_doc(user_id, resume_id, job_title, job_description, jd_features, result, analysis_id)
+            )
             match_id = str(jd_insert.inserted_id)
             
-            # Generate report
-            report_gen = ReportGenerator()
             user = await db.users.find_one({"_id": ObjectId(user_id)})
             user_name = user['full_name'] if user else "User"
-            report_path = report_gen.generate_jd_match_report(result, job_title, user_name)
-            
-            # Update with report path
-            await db.jd_matches.update_one(
-                {"_id": ObjectId(match_id)},
-                {"$set": {"report_path": report_path}}
-            )
-            
-            result['matchId'] = match_id
-            result['reportPath'] = report_path
         
-        # Format response
-        response_data = {
-            'matchScore': result['match_score'],
-            'analysis': {
-                'technicalSkills': result['technical_skills'],
-                'experience': result['experience_score'],
-                'education': result['education_score'],
-                'keywords': result['keywords_score']
-            },
-            'matchedSkills': result['matched_skills'],
-            'missingSkills': result['missing_skills'],
-            'recommendations': result['recommendations']
-        }
+        # Gemini analysis, blending and the report run on the job workers
+        await start_enrichment(db, JD_ENRICHMENT, analysis_id, {
+            'resume_text': resume_text,
+            'job_description': job_description,
+            'result': result,
+            'match_id': match_id,
+            'job_title': job_title,
+            'user_name': user_name
+        })
         
+        # Format response
+        response_data = format_jd_result(result)
+        response_data['analysisId'] = analysis_id
+        response_data['jobId'] = analysis_id
+        response_data['enrichmentStatus'] = PENDING
         if user_id:
-            response_data['matchId'] = result.get('matchId')
-            response_data['reportPath'] = result.get('reportPath')
+            response_data['matchId'] = match_id
         
         return {
             "success": True,
             "data": response_data,
-            "message": "JD match analysis complete"
+            "message": "Match score ready, AI analysis in progress"
         }
         
     except Exception as e:
         print(f"Error analyzing JD match: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/analysis/{analysis_id}")
+async def get_jd_analysis(analysis_id: str, db = Depends(get_db)):
+    """Poll an analysis: heuristic result while pending, blended result once complete"""
+    state = await find_analysis(db, db.jd_matches, analysis_id)
+    if not state:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    
+    return {
+        "success": True,
+        "data": enrichment_payload(analysis_id, state, format_jd_result),
+        "message": "AI analysis complete" if state['status'] == COMPLETE else f"AI analysis {state['status']}"
+    }
+
+@router.get("/analysis/{analysis_id}/events")
+async def stream_jd_analysis(analysis_id: str, db = Depends(get_db)):
+    """Server-sent events: current result now, `partial` results as AI analysis streams in, then the final one"""
+    state = await find_analysis(db, db.jd_matches, analysis_id)
+    if not state:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    
+    return StreamingResponse(
+        enrichment_events(db, db.jd_matches, analysis_id, state, format_jd_result),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
 @router.get("/download/{match_id}")
 async def download_jd_report(match_id: str, db = Depends(get_db)):
     """Download JD match report"""
@@ -139,6 +218,9 @@ async def download_jd_report(match_id: str, db = Depends(get_db)):
     except:
         raise HTTPException(status_code=400, detail="Invalid match ID")
     
+    if jd_match and not jd_match.get('report_path') and jd_match.get('enrichment_status') == PENDING:
+        raise HTTPException(status_code=409, detail="Report is still being generated, try again shortly")
+    
     if not jd_match or not jd_match.get('report_path'):
         raise HTTPException(status_code=404, detail="Report not found")
     
@@ -149,6 +231,26 @@ async def download_jd_report(match_id: str, db = Depends(get_db)):
         filename=os.path.basename(jd_match['report_path'])
     )
 
+async def _stored_resume(db, resume_id: str) -> Tuple[str, Dict]:
+    """
+    Text of a previously uploaded resume, re-extracted from its file if needed,
+    and its features (as stored at upload)
+    """
+    # Fetch resume from database
+    resume = await db.resumes.find_one({"_id": ObjectId(resume_id)})
+    if not resume:
+        raise HTTPException(status_code=404, detail="Resume not found")
+    
+    # Use extracted text from database if available
+    resume_text = resume.get('extracted_text')
+    
+    # If not available or too short, re-extract from file
+    if not resume_text or len(resume_text) < 50:
+        if not os.path.exists(resume['file_path']):
+            raise HTTPException(status_code=404, detail="Resume file not found on server")
+        resume_text = (await run_extraction(resume['file_path']))['text']
+    return resume_text, await stored_resume_features(db, resume, resume_text)
+
 @router.post("/analyze-stored", response_model=JDMatchResponse)
 async def analyze_stored_resume_jd(
     resume_id: str = Form(...),
@@ -159,86 +261,156 @@ async def analyze_stored_resume_jd(
 ):
     """Analyze a previously uploaded resume against job description"""
     try:
-        # Fetch resume from database
-        resume = await db.resumes.find_one({"_id": ObjectId(resume_id)})
-        if not resume:
-            raise HTTPException(status_code=404, detail="Resume not found")
-        
-        # Use extracted text from database if available
-        resume_text = resume.get('extracted_text')
-        
-        # If not available or too short, re-extract from file
-        if not resume_text or len(resume_text) < 50:
-            if not os.path.exists(resume['file_path']):
-                raise HTTPException(status_code=404, detail="Resume file not found on server")
-            resume_text = extract_text_from_pdf(resume['file_path'])
+        resume_text, resume_features = await _stored_resume(db, resume_id)
         
         if not job_description or len(job_description) < 50:
             raise HTTPException(status_code=400, detail="Job description is too short")
         
-        # Calculate match score
-        jd_matcher = JDMatcher()
-        result = jd_matcher.calculate_match_score(resume_text, job_description)
+        # Heuristic match now; the Gemini analysis is blended in the background
+        jd_features = await get_jd_features(db, job_description)
+        result = JDMatcher().calculate_heuristic_match(resume_text, job_description, resume_features, jd_features)
+        analysis_id = uuid4().hex
+        match_id = None
+        user_name = "User"
         
         # Save to database if user_id provided
         if user_id:
-            # Save JD match result
-            jd_doc = {
-                "user_id": user_id,
-                "resume_id": resume_id,
-                "job_description": job_description,
-                "match_score": result['match_score'],
-                "technical_skills": result['technical_skills'],
-                "experience_score": result['experience_score'],
-                "education_score": result['education_score'],
-                "keywords_score": result['keywords_score'],
-                "matched_skills": result['matched_skills'],
-                "missing_skills": result['missing_skills'],
-                "recommendations": result['recommendations'],
-                "ai_analysis": result.get('ai_analysis'),
-                "created_at": datetime.utcnow()
-            }
-            jd_insert = await db.jd_matches.insert_one(jd_doc)
+            jd_insert = await db.jd_matches.insert_one(
+                _jd_doc(user_id, resume_id, job_title, job_description, jd_features, result, analysis_id)
+            )
             match_id = str(jd_insert.inserted_id)
             
-            # Generate report
-            report_gen = ReportGenerator()
             user = await db.users.find_one({"_id": ObjectId(user_id)})
             user_name = user['full_name'] if user else "User"
-            report_path = report_gen.generate_jd_match_report(result, job_title, user_name)
-            
-            # Update with report path
-            await db.jd_matches.update_one(
-                {"_id": ObjectId(match_id)},
-                {"$set": {"report_path": report_path}}
-            )
-            
-            result['matchId'] = match_id
-            result['reportPath'] = report_path
         
-        # Format response
-        response_data = {
-            'matchScore': result['match_score'],
-            'analysis': {
-                'technicalSkills': result['technical_skills'],
-                'experience': result['experience_score'],
-                'education': result['education_score'],
-                'keywords': result['keywords_score']
-            },
-            'matchedSkills': result['matched_skills'],
-            'missingSkills': result['missing_skills'],
-            'recommendations': result['recommendations']
-        }
+        # Gemini analysis, blending and the report run on the job workers
+        await start_enrichment(db, JD_ENRICHMENT, analysis_id, {
+            'resume_text': resume_text,
+            'job_description': job_description,
+            'result': result,
+            'match_id': match_id,
+            'job_title': job_title,
+            'user_name': user_name
+        })
         
+        # Format response
+        response_data = format_jd_result(result)
+        response_data['analysisId'] = analysis_id
+        response_data['jobId'] = analysis_id
+        response_data['enrichmentStatus'] = PENDING
         if user_id:
-            response_data['matchId'] = result.get('matchId')
-            response_data['reportPath'] = result.get('reportPath')
+            response_data['matchId'] = match_id
         
         return {
             "success": True,
             "data": response_data,
-            "message": "JD match analysis complete"
+            "message": "Match score ready, AI analysis in progress"
         }
     except Exception as e:
         print(f"Error analyzing stored resume: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/rank", response_model=JDMatchResponse)
+async def rank_stored_job_descriptions(
+    resume_id: str = Form(...),
+    user_id: str = Form(...),
+    top_k: int = Form(10),
+    ai_top: int = Form(0),
+    db = Depends(get_db)
+):
+    """
+    Rank every job description the user has matched against before for one
+    of their resumes, best first. Scores are the heuristic match; `ai_top`
+    also runs the Gemini analysis for that many of the top results.
+    """
+    if top_k < 1:
+        raise HTTPException(status_code=400, detail="top_k must be at least 1")
+    
+    try:
+        resume_text, resume_features = await _stored_resume(db, resume_id)
+        ranked = await rank_job_descriptions(
+            db, user_id, resume_text, min(top_k, settings.jd_rank_max_results), resume_features
+        )
+        
+        # Gemini only for the few results the user will actually look at
+        ai_count = min(max(ai_top, 0), settings.jd_rank_max_ai, len(ranked))
+        if ai_count:
+            matcher = JDMatcher()
+            analyses = await asyncio.gather(*(
+                matcher.get_ai_match_analysis(resume_text, item['job_description'])
+                for item in ranked[:ai_count]
+            ))
+            for item, ai_analysis in zip(ranked, analyses):
+                item['result'] = matcher.apply_ai_analysis(item['result'], ai_analysis)
+        
+        results = []
+        for item in ranked:
+            entry = format_jd_result(item['result'])
+            entry.update({
+                'matchId': item['match_id'],
+                'jobTitle': item['job_title'],
+                'jobDescription': item['job_description'][:300],
+                'createdAt': item['created_at'],
+                'heuristicScore': item['result']['heuristic_score'],
+                'aiAnalysis': item['result']['ai_analysis']
+            })
+            results.append(entry)
+        
+        return {
+            "success": True,
+            "data": {"resumeId": resume_id, "results": results},
+            "message": f"Ranked {len(results)} job description(s)"
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error ranking job descriptions: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/candidates", response_model=JDMatchResponse)
+async def find_candidates(
+    job_description: str = Form(...),
+    top_k: int = Form(20),
+    required_skills: Optional[str] = Form(None),
+    db = Depends(get_db),
+    current_user: dict = Depends(get_current_user_email)
+):
+    """
+    Recruiter mode: the stored resumes that best fit a job description.
+    `required_skills` (comma-separated) keeps only resumes mentioning all of them.
+    Recruiters search every resume; other users only their own.
+    """
+    if not job_description or len(job_description) < 50:
+        raise HTTPException(status_code=400, detail="Job description is too short")
+    if top_k < 1:
+        raise HTTPException(status_code=400, detail="top_k must be at least 1")
+    
+    try:
+        ranked = await search_resumes(
+            db, job_description, min(top_k, settings.resume_index_max_results),
+            required_skills.split(',') if required_skills else None,
+            None if current_user.get('role') == RECRUITER_ROLE else str(current_user['_id'])
+        )
+        
+        results = []
+        for item in ranked:
+            entry = format_jd_result(item['result'])
+            entry.update({
+                'resumeId': str(item['resume']['_id']),
+                'userId': item['resume'].get('user_id'),
+                'fileName': item['resume'].get('file_name'),
+                'uploadedAt': item['resume'].get('uploaded_at'),
+                'searchScore': round(item['bm25'], 3)
+            })
+            results.append(entry)
+        
+        return {
+            "success": True,
+            "data": {"results": results, "indexedResumes": get_resume_index_stats()['documents']},
+            "message": f"Found {len(results)} candidate(s)"
+        }
+    except Exception as e:
+        print(f"Error searching candidates: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
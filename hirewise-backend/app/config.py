@@ -8,6 +8,50 @@ class Settings(BaseSettings):
     
     # Google Gemini
     gemini_api_key: str
+    gemini_model: str = "gemini-pro"
+    llm_timeout: float = 30.0  # seconds per Gemini call
+    llm_backend: str = "gemini"  # "gemini", or "fake" for offline load/regression testing
+    
+    # Fake LLM backend (llm_backend=fake): deterministic, schema-valid replies
+    fake_llm_seed: int = 0
+    fake_llm_latency: str = "lognormal"  # constant | uniform | lognormal | exponential
+    fake_llm_latency_mean: float = 1.5  # seconds (median for lognormal)
+    fake_llm_latency_spread: float = 0.5  # uniform half-width in seconds / lognormal sigma
+    fake_llm_error_rate: float = 0.0  # fraction of calls failing with a server error
+    fake_llm_rate_limit_rate: float = 0.0  # fraction of calls answering 429
+    fake_llm_rpm: int = 0  # simulated per-minute quota, 429 beyond it; 0 = unlimited
+    fake_llm_stream_chunks: int = 8
+    
+    # LLM Gateway (per process: API and each worker get their own share)
+    llm_rate_per_minute: int = 60  # token bucket refill, match to the Gemini quota
+    llm_burst: int = 10
+    llm_max_in_flight: int = 8
+    llm_max_queue: int = 100  # calls waiting beyond this are rejected straight away
+    llm_queue_timeout: float = 10.0  # max seconds to wait for a slot and a rate token
+    llm_breaker_failures: int = 5  # consecutive failures that open the circuit
+    llm_breaker_cooldown: float = 30.0  # seconds before a probe call is let through
+    llm_max_attempts: int = 2
+    llm_retry_base_delay: float = 1.0  # seconds, doubled per attempt, full jitter
+    llm_hedge_delay: float = 10.0  # start a second attempt after this long; 0 = off
+    
+    # LLM Response Cache (keyed by model, prompt version and normalized inputs)
+    llm_cache_size: int = 1024  # in-process LRU entries
+    llm_cache_ttl: int = 604800  # 7 days
+    
+    # Prompt Builder (resume/JD content packed into each prompt, ~4 chars per token)
+    prompt_resume_tokens: int = 750
+    prompt_jd_tokens: int = 500
+    
+    # TF-IDF Model (corpus-fitted, used for resume/JD similarity)
+    tfidf_refresh_interval: int = 86400  # seconds between refits
+    tfidf_min_documents: int = 20  # below this the hashing vectorizer is kept
+    tfidf_max_documents: int = 10000  # newest resumes and JDs each
+    tfidf_max_features: int = 50000
+    
+    # LLM Prompt Batching (bulk analysis packs several resumes per call)
+    llm_batch_token_budget: int = 12000  # estimated prompt + output tokens per call
+    llm_batch_max_items: int = 8
+    llm_batch_output_tokens: int = 400  # reserved per item for its JSON answer
     
     # CORS
     frontend_url: str = "http://localhost:8000"
@@ -16,6 +60,77 @@ class Settings(BaseSettings):
     max_upload_size: int = 5242880  # 5MB
     upload_dir: str = "./uploads"
     reports_dir: str = "./reports"
+    models_dir: str = "./models"
+    
+    # Batch ATS Analysis
+    batch_concurrency: int = 4  # resumes analyzed at the same time per request
+    batch_max_files: int = 200
+    max_batch_upload_size: int = 104857600  # 100MB per request
+    
+    # JD Ranking (one resume against a user's stored job descriptions)
+    jd_rank_index_size: int = 128  # users whose JD index stays in memory
+    jd_rank_max_jds: int = 2000  # newest distinct JDs indexed per user
+    jd_rank_max_results: int = 50
+    jd_rank_max_ai: int = 3  # top results that can get a Gemini analysis per request
+    
+    # Recruiter Search (inverted index over stored resumes, snapshotted to models_dir)
+    resume_index_rerank: int = 200  # BM25 candidates rescored with the JD match formula
+    resume_index_max_results: int = 100
+    resume_index_sync_interval: float = 30.0  # seconds between catch-ups from MongoDB
+    resume_index_snapshot_changes: int = 1000  # snapshot after this many changes
+    resume_index_tombstone_ttl: int = 604800  # 7 days; older snapshots are rebuilt
+    
+    # JD Feature Cache (keyed by SHA-256 of the normalized JD)
+    jd_feature_cache_size: int = 1024  # in-process LRU entries
+    jd_feature_cache_ttl: int = 604800  # 7 days
+    jd_feature_cache_max_documents: int = 20000  # persistent (MongoDB) tier
+
+    # Skill Taxonomy (canonical skills, aliases and categories)
+    skill_taxonomy_path: str = ""  # JSON data file; empty = bundled app/data/skill_taxonomy.json
+
+    # Embeddings and Vector Store (semantic search over stored resumes and JDs)
+    # Share of embedding cosine in semantic scores. 0 = TF-IDF only: no embedding, and the
+    # vector store (sync, IVF build, vector search) stays inert until this is raised
+    semantic_embedding_weight: float = 0.0
+    embedding_backend: str = "hashing"  # "hashing" (offline, no model) or "sentence-transformers"
+    embedding_model: str = "all-MiniLM-L6-v2"  # sentence-transformers model name or local path
+    embedding_dimension: int = 256  # hashing embedder only; models have their own
+    vector_store_dir: str = "./models/vectors"
+    vector_store_sync_interval: float = 30.0  # seconds between catch-ups from MongoDB
+    vector_search_batch: int = 65536  # rows scored per NumPy batch
+    vector_ivf_min_rows: int = 100000  # approximate (IVF) search from this many vectors
+    vector_ivf_lists: int = 0  # k-means lists; 0 = sqrt(vectors)
+    vector_ivf_probe: int = 8  # lists scanned per query
+    
+    # AI Enrichment (heuristic score is returned first, Gemini result follows)
+    enrichment_timeout: float = 60.0  # seconds per attempt before it counts as failed
+    
+    # Analysis Job Queue (MongoDB `jobs` collection)
+    job_embedded_workers: int = 2  # job slots run inside the API process; 0 = only `python -m app.worker`
+    job_worker_concurrency: int = 4  # job slots per `python -m app.worker` process
+    job_lease_seconds: float = 60.0  # a job whose lease lapses is picked up by another worker
+    job_heartbeat_interval: float = 15.0
+    job_max_attempts: int = 3  # then the job is dead-lettered
+    job_retry_base_delay: float = 5.0  # seconds, doubled per attempt
+    job_retry_max_delay: float = 300.0
+    job_poll_interval: float = 1.0  # idle workers and SSE streams check this often
+    job_retention: int = 86400  # finished jobs are removed after a day
+    
+    # PDF Extraction Pool
+    extraction_workers: int = 0  # 0 = one worker per CPU core
+    extraction_timeout: float = 30.0  # seconds per document
+    extraction_max_tasks_per_child: int = 50  # recycle workers to cap leaked memory
+    extraction_max_chars: int = 30000  # stop reading pages once this much text is extracted
+    extraction_max_pages: int = 15
+    extraction_max_page_chars: int = 10000
+    extraction_fast_path: bool = True  # try PyPDF2 before pdfplumber
+    extraction_quality_threshold: float = 0.6  # escalate to pdfplumber below this score
+    
+    # Extraction Cache (keyed by SHA-256 of the PDF bytes)
+    extraction_cache_size: int = 256  # in-process LRU entries
+    extraction_cache_ttl: int = 604800  # 7 days
+    extraction_cache_max_documents: int = 50000  # persistent (MongoDB) tier
+    extraction_cache_max_chars: int = 100000  # per cached document
     
     class Config:
         env_file = ".env"
@@ -1,6 +1,10 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import OperationFailure
 from app.config import settings
 
+# create_index error code when the index exists with other options
+INDEX_OPTIONS_CONFLICT = 85
+
 # MongoDB client - initialized once
 mongodb_client = AsyncIOMotorClient(settings.mongodb_url)
 
@@ -23,6 +27,19 @@ async def close_mongo_connection():
     mongodb_client.close()
     print("Closed MongoDB connection")
 
+async def ensure_ttl_index(collection, field: str, ttl_seconds: int):
+    """Create a TTL index on `field`, or change its expiry in place if the TTL setting changed"""
+    try:
+        await collection.create_index(field, expireAfterSeconds=ttl_seconds)
+    except OperationFailure as e:
+        if e.code != INDEX_OPTIONS_CONFLICT:
+            raise
+        await collection.database.command(
+            'collMod', collection.name,
+            index={'keyPattern': {field: 1}, 'expireAfterSeconds': ttl_seconds}
+        )
+        print(f"Updated TTL index {collection.name}.{field} to {ttl_seconds}s")
+
 # Helper to get database (for dependency injection)
 async def get_db():
     return get_database()
@@ -1,13 +1,30 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import connect_to_mongo, close_mongo_connection
+from app.database import connect_to_mongo, close_mongo_connection, get_database
 from app.config import settings
 from app.api import auth, ats, jd_matcher, feedback, calendar
+from app.services.extraction_cache import ensure_extraction_cache_indexes
+from app.services.extraction_pool import get_executor, shutdown_extraction_pool
+from app.services.enrichment_service import ensure_enrichment_indexes
+from app.services.jd_feature_cache import ensure_jd_feature_cache_indexes
+from app.services.jd_ranker import ensure_jd_rank_indexes
+from app.services.job_queue import ensure_job_indexes
+from app.services.llm_cache import ensure_llm_cache_indexes, get_llm_cache_stats
+from app.services.llm_gateway import get_gateway_stats
+from app.services.resume_index import (
+    ensure_resume_index_indexes, load_resume_index, save_resume_index, sync_resume_index_periodically
+)
+from app.services.vector_store import sync_vector_stores_periodically, vector_search_enabled
+from app.services.tfidf_model import load_tfidf_model, refresh_tfidf_model_periodically
+from app.worker import start_embedded_workers, stop_embedded_workers
+from app.utils.upload_utils import UploadSizeLimitMiddleware
+import asyncio
 import os
 
 # Ensure directories exist
 os.makedirs(settings.upload_dir, exist_ok=True)
 os.makedirs(settings.reports_dir, exist_ok=True)
+os.makedirs(settings.models_dir, exist_ok=True)
 
 # Create FastAPI app
 app = FastAPI(
@@ -16,6 +33,14 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Reject oversized uploads before the multipart body is parsed.
+# Added before CORS so CORS wraps it and its 413s reach the browser
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_body_size=settings.max_upload_size,
+    path_limits={"/api/ats/analyze-batch": settings.max_batch_upload_size}
+)
+
 # CORS middleware - MUST be before routes
 app.add_middleware(
     CORSMiddleware,
@@ -29,11 +54,37 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup_event():
     await connect_to_mongo()
+    await ensure_extraction_cache_indexes(get_database())
+    await ensure_enrichment_indexes(get_database())
+    await ensure_job_indexes(get_database())
+    await ensure_jd_rank_indexes(get_database())
+    await ensure_resume_index_indexes(get_database())
+    await ensure_llm_cache_indexes(get_database())
+    await ensure_jd_feature_cache_indexes(get_database())
+    start_embedded_workers(get_database())
+    get_executor()
+    load_tfidf_model()
+    app.state.tfidf_refresh = asyncio.create_task(refresh_tfidf_model_periodically(get_database()))
+    load_resume_index()
+    app.state.resume_index_sync = asyncio.create_task(sync_resume_index_periodically(get_database()))
+    # The vector store is only read when embeddings take part in matching
+    app.state.vector_sync = None
+    if vector_search_enabled():
+        app.state.vector_sync = asyncio.create_task(sync_vector_stores_periodically(get_database()))
+    else:
+        print("Vector store disabled (SEMANTIC_EMBEDDING_WEIGHT=0)")
     print("Application started successfully")
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    app.state.tfidf_refresh.cancel()
+    app.state.resume_index_sync.cancel()
+    if app.state.vector_sync is not None:
+        app.state.vector_sync.cancel()
+    await save_resume_index()
+    await stop_embedded_workers()
     await close_mongo_connection()
+    shutdown_extraction_pool()
     print("Application shutdown")
 
 # Include routers
@@ -55,6 +106,15 @@ def read_root():
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/health/llm")
+def llm_health():
+    """Gemini gateway (breaker state, queue depth) and response cache counters"""
+    return {
+        "backend": settings.llm_backend,
+        "gateway": get_gateway_stats(),
+        "cache": get_llm_cache_stats()
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
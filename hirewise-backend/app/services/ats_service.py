@@ -1,49 +1,73 @@
-import google.generativeai as genai
 from app.config import settings
-from app.utils.pdf_utils import (
-    extract_sections, extract_contact_info, 
-    extract_keywords, check_formatting
-)
-import json
-from typing import Dict, List
+from app.services import llm_client
+from app.services.llm_batching import estimate_tokens, iter_batched_json
+from app.services.llm_cache import generate_json_cached, stream_json_cached
+from app.services.prompt_builder import compress_resume
+from app.utils.resume_features import analyze_resume, formatting_report
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
-# Configure Gemini
-genai.configure(api_key=settings.gemini_api_key)
+# Bump when the AI analysis prompt changes so cached responses are not reused
+AI_ANALYSIS_PROMPT_VERSION = 1
+
+# Shown instead of an AI analysis when no Gemini key is configured
+UNCONFIGURED_AI_ANALYSIS = {
+    'score': 75,
+    'formatting_issues': ["Configure Gemini API key for AI-powered analysis"],
+    'missing_sections': [],
+    'keyword_suggestions': [],
+    'improvements': ["Get detailed AI analysis by adding your Gemini API key in .env file"]
+}
+
+def _is_valid_ai_analysis(analysis: Dict) -> bool:
+    score = analysis.get('score')
+    return isinstance(score, (int, float)) and 0 <= score <= 100
 
 class ATSScorer:
-    def __init__(self):
-        self.model = genai.GenerativeModel('gemini-pro')
+    async def calculate_ats_score(self, resume_text: str) -> Dict:
+        """Heuristic score blended with the Gemini analysis"""
+        result = self.calculate_heuristic_score(resume_text)
+        
+        print("Getting AI analysis...")
+        ai_analysis = await self.get_ai_analysis(resume_text)
+        return self.apply_ai_analysis(result, ai_analysis)
     
-    def calculate_ats_score(self, resume_text: str) -> Dict:
+    def calculate_heuristic_score(self, resume_text: str, resume_features: Optional[Dict] = None) -> Dict:
         """
         Calculate ATS score using weighted average of multiple factors
         Formula: Overall Score = (Formatting * 0.25) + (Keywords * 0.30) + 
                                  (Structure * 0.25) + (Readability * 0.20)
+        Deterministic and fast; see apply_ai_analysis for the AI blend.
         """
         print("=== Starting ATS Score Calculation ===")
         
+        # Tokenize and scan the text once for every feature below
+        features = resume_features if resume_features is not None else analyze_resume(resume_text)
+        
         # 1. Check formatting (25% weight)
         print("Checking formatting...")
-        formatting_result = check_formatting(resume_text)
+        formatting_result = formatting_report(features)
         formatting_score = formatting_result['score']
         print(f"Formatting score: {formatting_score}")
         
         # 2. Check keywords (30% weight)
         print("Extracting keywords...")
-        keywords = extract_keywords(resume_text)
+        keywords = features['action_verbs']
         keywords_score = min((len(keywords) / 15) * 100, 100)  # Target: 15+ keywords
         print(f"Keywords found: {len(keywords)}, Score: {keywords_score}")
         
         # 3. Check structure (25% weight)
         print("Checking structure...")
-        sections = extract_sections(resume_text)
+        sections = features['sections']
         required_sections = ['experience', 'education', 'skills']
         found_sections = [sec for sec in required_sections if sec in sections]
         structure_score = (len(found_sections) / len(required_sections)) * 100
-        print(f"Sections found: {list(sections.keys())}, Score: {structure_score}")
+        print(f"Sections found: {sections}, Score: {structure_score}")
         
         # Check contact info
-        contact_info = extract_contact_info(resume_text)
+        contact_info = {
+            'has_email': features['has_email'],
+            'has_phone': features['has_phone']
+        }
         if contact_info['has_email']:
             structure_score = min(structure_score + 10, 100)
         if contact_info['has_phone']:
@@ -52,7 +76,7 @@ class ATSScorer:
         
         # 4. Readability (20% weight)
         print("Checking readability...")
-        word_count = len(resume_text.split())
+        word_count = features['word_count']
         if 300 <= word_count <= 800:
             readability_score = 100
         elif word_count < 300:
@@ -70,54 +94,76 @@ class ATSScorer:
         )
         print(f"Initial overall score: {overall_score}")
         
-        # Get AI analysis
-        print("Getting AI analysis...")
-        ai_analysis = self.get_ai_analysis(resume_text)
-        print(f"AI analysis score: {ai_analysis.get('score', 'N/A')}")
-        
-        # Combine AI score with formula (weighted: 60% formula, 40% AI)
-        if ai_analysis and 'score' in ai_analysis:
-            overall_score = (overall_score * 0.6) + (ai_analysis['score'] * 0.4)
-            print(f"Combined score with AI: {overall_score}")
-        
-        # Generate suggestions
+        # Generate suggestions (AI improvements are appended once available)
         suggestions = self.generate_suggestions(
             formatting_result, keywords, sections, 
-            contact_info, word_count, ai_analysis
+            contact_info, word_count, None
         )
         
         result = {
             'overall_score': round(overall_score, 1),
+            'heuristic_score': round(overall_score, 1),
             'formatting_score': round(formatting_score, 1),
             'keywords_score': round(keywords_score, 1),
             'structure_score': round(structure_score, 1),
             'readability_score': round(readability_score, 1),
             'suggestions': suggestions,
-            'ai_analysis': ai_analysis,
+            'heuristic_suggestions': suggestions,
+            'ai_analysis': None,
             'found_keywords': keywords,
-            'sections_found': list(sections.keys())
+            'sections_found': sections
         }
         
         print("=== ATS Score Calculation Complete ===")
-        print(f"Final result: {result}")
+        print(f"Heuristic result: {result}")
         
         return result
     
-    def get_ai_analysis(self, resume_text: str) -> Dict:
-        """Get AI-powered ATS analysis using Gemini"""
+    def apply_ai_analysis(self, result: Dict, ai_analysis: Optional[Dict]) -> Dict:
+        """Blend an AI analysis into a heuristic result (returns a new dict)"""
+        overall_score = result['heuristic_score']
+        print(f"AI analysis score: {ai_analysis.get('score', 'N/A') if ai_analysis else 'N/A'}")
+        
+        # Combine AI score with formula (weighted: 60% formula, 40% AI)
+        if ai_analysis and 'score' in ai_analysis:
+            overall_score = (overall_score * 0.6) + (ai_analysis['score'] * 0.4)
+            print(f"Combined score with AI: {overall_score}")
+        
+        # Add AI suggestions
+        suggestions = list(result['heuristic_suggestions'])
+        if ai_analysis and 'improvements' in ai_analysis:
+            suggestions.extend(ai_analysis['improvements'][:3])
+        
+        return {
+            **result,
+            'overall_score': round(overall_score, 1),
+            'suggestions': suggestions[:8],  # Limit to top 8 suggestions
+            'ai_analysis': ai_analysis
+        }
+    
+    async def get_ai_analysis(self, resume_text: str) -> Optional[Dict]:
+        """Get AI-powered ATS analysis using Gemini (None if it is unavailable)"""
         try:
             # Check if API key is configured
-            if not settings.gemini_api_key or settings.gemini_api_key == "your_gemini_api_key_here":
+            if not llm_client.is_configured():
                 print("Gemini API key not configured, skipping AI analysis")
-                return {
-                    'score': 75,
-                    'formatting_issues': ["Configure Gemini API key for AI-powered analysis"],
-                    'missing_sections': [],
-                    'keyword_suggestions': [],
-                    'improvements': ["Get detailed AI analysis by adding your Gemini API key in .env file"]
-                }
+                return dict(UNCONFIGURED_AI_ANALYSIS)
+            
+            resume_excerpt = compress_resume(resume_text, settings.prompt_resume_tokens)
+            prompt = self.build_prompt(resume_excerpt)
+            
+            return await generate_json_cached(
+                'ats_analysis', AI_ANALYSIS_PROMPT_VERSION, [resume_excerpt], prompt
+            )
             
-            prompt = f"""
+        except Exception as e:
+            # No made-up score: callers keep the heuristic result
+            print(f"AI analysis error: {e}")
+            return None
+    
+    def build_prompt(self, resume_excerpt: str) -> str:
+        """Single-resume ATS analysis prompt"""
+        return f"""
 Analyze this resume for ATS (Applicant Tracking System) compatibility.
 Provide a detailed analysis in JSON format with:
 1. Overall ATS compatibility score (0-100)
@@ -127,7 +173,7 @@ Provide a detailed analysis in JSON format with:
 5. Specific improvements needed
 
 Resume:
-{resume_text[:3000]}
+{resume_excerpt}
 
 Return ONLY valid JSON in this exact format:
 {{
@@ -138,28 +184,79 @@ Return ONLY valid JSON in this exact format:
     "improvements": ["list of specific improvements"]
 }}
 """
-            
-            response = self.model.generate_content(prompt)
-            # Extract JSON from response
-            response_text = response.text.strip()
-            # Remove markdown code blocks if present
-            if response_text.startswith('```'):
-                response_text = response_text.split('```')[1]
-                if response_text.startswith('json'):
-                    response_text = response_text[4:]
-            
-            ai_result = json.loads(response_text)
-            return ai_result
-            
-        except Exception as e:
-            print(f"AI analysis error: {e}")
-            return {
-                'score': 75,
-                'formatting_issues': [],
-                'missing_sections': [],
-                'keyword_suggestions': [],
-                'improvements': []
-            }
+    
+    async def stream_ai_analysis(self, resume_text: str) -> AsyncIterator[Dict]:
+        """
+        Streamed get_ai_analysis: yields the partial analysis as fields arrive
+        (the score comes first), the complete analysis last. Raises LLMError
+        if no usable analysis could be obtained.
+        """
+        if not llm_client.is_configured():
+            yield dict(UNCONFIGURED_AI_ANALYSIS)
+            return
+        
+        resume_excerpt = compress_resume(resume_text, settings.prompt_resume_tokens)
+        async for analysis in stream_json_cached(
+            'ats_analysis', AI_ANALYSIS_PROMPT_VERSION, [resume_excerpt],
+            self.build_prompt(resume_excerpt), is_valid=_is_valid_ai_analysis
+        ):
+            yield analysis
+    
+    def build_batch_prompt(self, resumes: List[Tuple[str, str]]) -> str:
+        """One prompt analysing several (id, resume excerpt) pairs"""
+        blocks = "\n\n".join(
+            f'<<<RESUME id="{resume_id}">>>\n{excerpt}\n<<<END RESUME>>>'
+            for resume_id, excerpt in resumes
+        )
+        return f"""
+Analyze each of the following resumes for ATS (Applicant Tracking System) compatibility.
+Analyze every resume independently; do not compare them with each other.
+For each resume provide:
+1. Overall ATS compatibility score (0-100)
+2. Specific formatting issues
+3. Missing critical sections
+4. Keyword optimization suggestions
+5. Specific improvements needed
+
+{blocks}
+
+Return ONLY a valid JSON array with one object per resume, using its id, in this exact format:
+[
+    {{
+        "id": "r1",
+        "score": 85,
+        "formatting_issues": ["list of issues"],
+        "missing_sections": ["list of missing sections"],
+        "keyword_suggestions": ["list of keywords to add"],
+        "improvements": ["list of specific improvements"]
+    }}
+]
+"""
+    
+    async def iter_ai_analyses(self, resume_texts: Dict[str, str]) -> AsyncIterator[Tuple[str, Optional[Dict]]]:
+        """
+        AI analysis for many resumes (id -> text), several per Gemini call.
+        Yields (id, analysis or None) as each batch completes.
+        """
+        if not llm_client.is_configured():
+            for resume_id in resume_texts:
+                yield resume_id, dict(UNCONFIGURED_AI_ANALYSIS)
+            return
+        
+        excerpts = {
+            resume_id: compress_resume(text, settings.prompt_resume_tokens)
+            for resume_id, text in resume_texts.items()
+        }
+        async for resume_id, analysis in iter_batched_json(
+            'ats_analysis', AI_ANALYSIS_PROMPT_VERSION,
+            {resume_id: [excerpt] for resume_id, excerpt in excerpts.items()},
+            build_prompt=self.build_batch_prompt,
+            prompt_overhead=estimate_tokens(self.build_batch_prompt([])),
+            is_valid=_is_valid_ai_analysis,
+            single=lambda resume_id: self.get_ai_analysis(resume_texts[resume_id]),
+            excerpt=excerpts.get
+        ):
+            yield resume_id, analysis
     
     def generate_suggestions(
         self, formatting_result, keywords, sections, 
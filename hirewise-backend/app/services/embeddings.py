@@ -0,0 +1,89 @@
+"""
+Text embedders for the vector store and the semantic part of JD matching.
+
+Selected with `embedding_backend`:
+- "hashing": offline and model-free. Word unigrams/bigrams feature-hashed
+  (signed) straight into `embedding_dimension`, so every process produces the
+  same vectors without fitting anything. Lexical rather than semantic, but
+  dense and fixed-size like a model's.
+- "sentence-transformers": a local sentence-transformers model
+  (`embedding_model`, a name or a path); needs the optional package.
+
+Vectors are float32 and L2-normalized, so dot product is cosine similarity.
+"""
+from app.config import settings
+from sklearn.feature_extraction.text import HashingVectorizer
+from typing import List, Optional
+import abc
+import numpy as np
+
+class Embedder(abc.ABC):
+    name = 'base'
+    dimension = 0
+
+    def model_id(self) -> str:
+        """Identity of the vector space; vectors from different ids never mix"""
+        return f"{self.name}:{self.dimension}"
+
+    @abc.abstractmethod
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """(len(texts), dimension) float32, L2-normalized rows"""
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+class HashingEmbedder(Embedder):
+    name = 'hashing'
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        # Signed hashing keeps dot products unbiased despite collisions
+        self._vectorizer = HashingVectorizer(
+            n_features=dimension, ngram_range=(1, 2), stop_words='english',
+            alternate_sign=True, norm=None
+        )
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return _normalize(self._vectorizer.transform(texts).toarray())
+
+class SentenceTransformerEmbedder(Embedder):
+    name = 'sentence-transformers'
+
+    def __init__(self, model_name: str):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise RuntimeError(
+                "embedding_backend=sentence-transformers needs the sentence-transformers package"
+            ) from e
+        self.model_name = model_name
+        self._model = SentenceTransformer(model_name)
+        self.dimension = self._model.get_sentence_embedding_dimension()
+
+    def model_id(self) -> str:
+        return f"{self.name}:{self.model_name}:{self.dimension}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = self._model.encode(texts, batch_size=32, convert_to_numpy=True, show_progress_bar=False)
+        return _normalize(vectors)
+
+_embedder: Optional[Embedder] = None
+
+def get_embedder() -> Embedder:
+    """The process-wide embedder chosen by `embedding_backend`"""
+    global _embedder
+    if _embedder is None:
+        if settings.embedding_backend == 'hashing':
+            _embedder = HashingEmbedder(settings.embedding_dimension)
+        elif settings.embedding_backend == 'sentence-transformers':
+            _embedder = SentenceTransformerEmbedder(settings.embedding_model)
+        else:
+            raise ValueError(f"Unknown embedding_backend: {settings.embedding_backend}")
+        print(f"Embedder: {_embedder.model_id()}")
+    return _embedder
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    return get_embedder().embed(texts)
@@ -0,0 +1,208 @@
+from app.config import settings
+from app.services.ats_service import ATSScorer
+from app.services.jd_matcher_service import JDMatcher
+from app.services.report_service import ReportGenerator
+from app.services.llm_client import LLMError
+from app.services.job_queue import QUEUED, RUNNING, SUCCEEDED, DEAD, enqueue_job, get_job, set_job_progress
+from bson import ObjectId
+from typing import AsyncIterator, Callable, Dict, Optional
+import asyncio
+import json
+import time
+
+PENDING = 'pending'
+COMPLETE = 'complete'
+FAILED = 'failed'
+
+# Job kinds handled by app.worker
+ATS_ENRICHMENT = 'ats_enrichment'
+JD_ENRICHMENT = 'jd_enrichment'
+
+HEARTBEAT_INTERVAL = 15.0  # seconds between SSE keep-alive comments
+PROGRESS_INTERVAL = 0.5  # min seconds between partial-result writes to the job
+
+_JOB_STATUS = {QUEUED: PENDING, RUNNING: PENDING, SUCCEEDED: COMPLETE, DEAD: FAILED}
+
+async def ensure_enrichment_indexes(db):
+    """Index the analysis ids used to poll persisted results"""
+    await db.ats_results.create_index("analysis_id", sparse=True)
+    await db.jd_matches.create_index("analysis_id", sparse=True)
+
+async def start_enrichment(db, kind: str, analysis_id: str, payload: Dict):
+    """
+    Queue the AI enrichment of a heuristic result; the job id is the analysis id.
+    payload must carry the heuristic 'result' plus whatever the job kind needs.
+    """
+    await enqueue_job(db, kind, {**payload, 'analysis_id': analysis_id}, job_id=analysis_id)
+
+# ---- Job handlers (run by app.worker) ----
+
+async def _stream_analysis(
+    db, payload: Dict, analyses: AsyncIterator[Dict], apply: Callable[[Dict, Dict], Dict]
+) -> Dict:
+    """
+    Consume a streamed AI analysis, publishing the blended partial result on
+    the job as fields arrive so clients see them before generation finishes
+    """
+    ai_analysis = None
+    last_progress = 0.0
+    async for ai_analysis in analyses:
+        now = time.monotonic()
+        if payload.get('analysis_id') and now - last_progress >= PROGRESS_INTERVAL:
+            last_progress = now
+            await set_job_progress(db, payload['analysis_id'], apply(payload['result'], ai_analysis))
+
+    if ai_analysis is None:
+        # Retried with backoff; dead-lettering keeps the heuristic result
+        raise LLMError("AI analysis unavailable")
+    return ai_analysis
+
+async def run_ats_enrichment(db, payload: Dict) -> Dict:
+    """Blend the Gemini analysis into an ATS result and persist it with its report"""
+    ats_scorer = ATSScorer()
+    ai_analysis = await _stream_analysis(
+        db, payload, ats_scorer.stream_ai_analysis(payload['resume_text']), ats_scorer.apply_ai_analysis
+    )
+    result = ats_scorer.apply_ai_analysis(payload['result'], ai_analysis)
+    await _persist_ats(db, payload, result, COMPLETE)
+    return result
+
+async def fail_ats_enrichment(db, payload: Dict):
+    """Dead-lettered: keep the heuristic result as final and still produce the report"""
+    await _persist_ats(db, payload, payload['result'], FAILED)
+
+async def _persist_ats(db, payload: Dict, result: Dict, status: str):
+    if not payload.get('ats_id'):
+        return
+
+    report_gen = ReportGenerator()
+    report_path = await asyncio.to_thread(
+        report_gen.generate_ats_report, result, payload.get('user_name', "User")
+    )
+    print(f"Report generated: {report_path}")
+
+    await db.ats_results.update_one(
+        {"_id": ObjectId(payload['ats_id'])},
+        {"$set": {
+            "enrichment_status": status,
+            "overall_score": result['overall_score'],
+            "suggestions": result['suggestions'],
+            "ai_analysis": result.get('ai_analysis'),
+            "report_path": report_path
+        }}
+    )
+    await db.resumes.update_one(
+        {"_id": ObjectId(payload['resume_id'])},
+        {"$set": {"ats_score": result['overall_score']}}
+    )
+
+async def run_jd_enrichment(db, payload: Dict) -> Dict:
+    """Blend the Gemini analysis into a JD match and persist it with its report"""
+    jd_matcher = JDMatcher()
+    ai_analysis = await _stream_analysis(
+        db, payload,
+        jd_matcher.stream_ai_match_analysis(payload['resume_text'], payload['job_description']),
+        jd_matcher.apply_ai_analysis
+    )
+    result = jd_matcher.apply_ai_analysis(payload['result'], ai_analysis)
+    await _persist_jd(db, payload, result, COMPLETE)
+    return result
+
+async def fail_jd_enrichment(db, payload: Dict):
+    """Dead-lettered: keep the heuristic match as final and still produce the report"""
+    await _persist_jd(db, payload, payload['result'], FAILED)
+
+async def _persist_jd(db, payload: Dict, result: Dict, status: str):
+    if not payload.get('match_id'):
+        return
+
+    report_gen = ReportGenerator()
+    report_path = await asyncio.to_thread(
+        report_gen.generate_jd_match_report,
+        result, payload.get('job_title', "Position"), payload.get('user_name', "User")
+    )
+
+    await db.jd_matches.update_one(
+        {"_id": ObjectId(payload['match_id'])},
+        {"$set": {
+            "enrichment_status": status,
+            "match_score": result['match_score'],
+            "recommendations": result['recommendations'],
+            "ai_analysis": result.get('ai_analysis'),
+            "report_path": report_path
+        }}
+    )
+
+# ---- Client-facing state ----
+
+async def find_analysis(db, collection, analysis_id: str) -> Optional[Dict]:
+    """
+    Current state of an analysis from its job (with the partial AI result
+    while it streams in), falling back to the persisted result document once
+    the finished job has expired from the queue
+    """
+    job = await get_job(db, analysis_id)
+    if job:
+        status = _JOB_STATUS[job['status']]
+        if status == COMPLETE:
+            result = job['result']
+        elif status == PENDING and job.get('progress'):
+            result = job['progress']
+        else:
+            result = job['payload']['result']
+        return {
+            'status': status,
+            'result': result,
+            'error': "AI analysis failed" if status == FAILED else None
+        }
+
+    doc = await collection.find_one({"analysis_id": analysis_id})
+    if not doc:
+        return None
+    return {'status': doc.get('enrichment_status', COMPLETE), 'result': doc, 'error': None}
+
+def enrichment_payload(analysis_id: str, state: Dict, format_result: Callable[[Dict], Dict]) -> Dict:
+    """Client-facing view of an analysis: status plus the current (blended or heuristic) result"""
+    payload = {
+        'analysisId': analysis_id,
+        'status': state['status'],
+        'data': format_result(state['result'])
+    }
+    if state['error']:
+        payload['error'] = state['error']
+    return payload
+
+def _sse_event(event: str, payload: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+async def enrichment_events(
+    db, collection, analysis_id: str, state: Dict, format_result: Callable[[Dict], Dict]
+) -> AsyncIterator[str]:
+    """
+    Server-sent events for an analysis: the current state right away, a
+    `partial` event whenever more of the AI analysis has streamed in, then the
+    final state once the enrichment job settles (the job is polled, since it
+    may be running in another process)
+    """
+    yield _sse_event(state['status'], enrichment_payload(analysis_id, state, format_result))
+
+    waited = 0.0
+    last_result = state['result']
+    while state['status'] == PENDING:
+        await asyncio.sleep(settings.job_poll_interval)
+        state = await find_analysis(db, collection, analysis_id)
+        if state is None:
+            return
+
+        if state['status'] == PENDING and state['result'] != last_result:
+            last_result = state['result']
+            waited = 0.0
+            yield _sse_event('partial', enrichment_payload(analysis_id, state, format_result))
+            continue
+
+        waited += settings.job_poll_interval
+        if waited >= HEARTBEAT_INTERVAL and state['status'] == PENDING:
+            waited = 0.0
+            yield ": keep-alive\n\n"
+
+    yield _sse_event(state['status'], enrichment_payload(analysis_id, state, format_result))
@@ -0,0 +1,82 @@
+from app.config import settings
+from app.database import ensure_ttl_index
+from app.utils.cache import LRUCache
+from app.services.extraction_pool import run_extraction
+from app.services.mongo_cache import is_expired, trim_lru_collection
+from app.utils.pdf_utils import PDFSource
+from datetime import datetime
+from typing import Dict, Optional
+import hashlib
+
+# In-process tier in front of the persistent `extraction_cache` collection
+_memory_cache = LRUCache(
+    max_entries=settings.extraction_cache_size,
+    ttl_seconds=settings.extraction_cache_ttl
+)
+
+def hash_pdf_bytes(data: bytes) -> str:
+    """SHA-256 of the raw PDF bytes, used as the cache key"""
+    return hashlib.sha256(data).hexdigest()
+
+async def ensure_extraction_cache_indexes(db):
+    """Create TTL / lookup indexes used by the extraction cache"""
+    await ensure_ttl_index(db.extraction_cache, "last_used_at", settings.extraction_cache_ttl)
+    await db.resumes.create_index([("user_id", 1), ("content_hash", 1)])
+
+async def get_cached_extraction(db, content_hash: str) -> Optional[Dict]:
+    """Look up extracted text by content hash (memory first, then MongoDB)"""
+    entry = _memory_cache.get(content_hash)
+    if entry:
+        print(f"Extraction cache hit (memory): {content_hash[:12]}")
+        return entry
+
+    doc = await db.extraction_cache.find_one({"_id": content_hash})
+    if not doc or is_expired(doc, settings.extraction_cache_ttl):
+        return None
+
+    await db.extraction_cache.update_one(
+        {"_id": content_hash},
+        {"$set": {"last_used_at": datetime.utcnow()}}
+    )
+
+    entry = {
+        'text': doc['text'],
+        'page_count': doc.get('page_count', 0),
+        'parser': doc.get('parser'),
+        'tier': doc.get('tier')
+    }
+    _memory_cache.set(content_hash, entry)
+    print(f"Extraction cache hit (mongo): {content_hash[:12]}")
+    return entry
+
+async def store_extraction(db, content_hash: str, extraction: Dict):
+    """Store extracted text and parse metadata under the content hash"""
+    entry = {
+        'text': extraction['text'][:settings.extraction_cache_max_chars],
+        'page_count': extraction.get('page_count', 0),
+        'parser': extraction.get('parser'),
+        'tier': extraction.get('tier')
+    }
+    _memory_cache.set(content_hash, entry)
+
+    now = datetime.utcnow()
+    await db.extraction_cache.update_one(
+        {"_id": content_hash},
+        {
+            "$set": {**entry, "char_count": len(entry['text']), "last_used_at": now},
+            "$setOnInsert": {"created_at": now}
+        },
+        upsert=True
+    )
+    await trim_lru_collection(db.extraction_cache, settings.extraction_cache_max_documents)
+
+async def extract_text_cached(db, content_hash: str, source: PDFSource) -> str:
+    """Return cached text for this PDF, parsing it (path or bytes) only on a cache miss"""
+    cached = await get_cached_extraction(db, content_hash)
+    if cached:
+        return cached['text']
+
+    extraction = await run_extraction(source)
+    if extraction['text']:
+        await store_extraction(db, content_hash, extraction)
+    return extraction['text']
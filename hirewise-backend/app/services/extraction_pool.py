@@ -0,0 +1,153 @@
+from app.config import settings
+from app.utils.pdf_utils import extract_pdf_content, PDFSource
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Dict, Optional
+import asyncio
+import os
+import signal
+import weakref
+
+# Process pool that keeps pdfplumber off the event loop. Workers are
+# replaced after `extraction_max_tasks_per_child` jobs to cap leaked memory.
+_executor: Optional[ProcessPoolExecutor] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+# Pools torn down on purpose; jobs that were running on them did nothing wrong
+_recycled = weakref.WeakSet()
+# Extra wall-clock time the event loop allows beyond the in-worker deadline
+# before giving up on the worker (e.g. stuck in C code that ignores the alarm)
+_DEADLINE_GRACE = 5.0
+# A pool that breaks by itself (worker crashed) is retried this many times
+_MAX_CRASH_RETRIES = 1
+
+# Which extraction tier served each job, for tracking the fast-path hit rate
+_tier_counts = {'fast': 0, 'layout': 0}
+
+def _pool_size() -> int:
+    return settings.extraction_workers or os.cpu_count() or 1
+
+def _empty_result() -> Dict:
+    return {
+        'text': '', 'page_count': 0, 'pages_parsed': 0, 'truncated': False,
+        'parser': None, 'tier': None, 'quality': None
+    }
+
+class ExtractionTimeout(BaseException):
+    """Raised in a worker when its job passes the deadline (BaseException so parsers' `except Exception` can't swallow it)"""
+
+def _deadline_exceeded(signum, frame):
+    raise ExtractionTimeout()
+
+def _extract_with_deadline(source: PDFSource, deadline: float, **options) -> Dict:
+    """
+    Worker-side job: extract_pdf_content, abandoned after `deadline` seconds
+    so only this job fails and the worker stays usable for the next one
+    """
+    if not hasattr(signal, 'setitimer'):
+        # No SIGALRM (Windows); run_extraction's wall-clock timeout still applies
+        return extract_pdf_content(source, **options)
+    previous = signal.signal(signal.SIGALRM, _deadline_exceeded)
+    signal.setitimer(signal.ITIMER_REAL, deadline)
+    try:
+        return extract_pdf_content(source, **options)
+    except ExtractionTimeout:
+        return {**_empty_result(), 'timed_out': True}
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+def get_extraction_stats() -> Dict:
+    """Tier counters for this process plus the fast-path hit rate"""
+    total = sum(_tier_counts.values())
+    return {
+        **_tier_counts,
+        'fast_path_hit_rate': round(_tier_counts['fast'] / total, 3) if total else None
+    }
+
+def get_executor() -> ProcessPoolExecutor:
+    """Return the shared extraction executor, creating it on first use"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=_pool_size(),
+            max_tasks_per_child=settings.extraction_max_tasks_per_child
+        )
+        print(f"Extraction pool started with {_pool_size()} worker(s)")
+    return _executor
+
+def _recycle_executor(executor: ProcessPoolExecutor):
+    """Replace a pool whose worker is stuck or dead; kill its processes"""
+    global _executor
+    if _executor is executor:
+        _executor = None
+    _recycled.add(executor)
+    # ProcessPoolExecutor cannot cancel a running job, so terminate the workers
+    for process in list((executor._processes or {}).values()):
+        process.terminate()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+async def run_extraction(source: PDFSource) -> Dict:
+    """
+    Extract PDF text in the process pool with a per-job timeout.
+    `source` is a file path or the raw bytes of an in-memory upload.
+
+    The deadline is enforced inside the worker, so a slow PDF only fails its
+    own job. If a worker ignores it, the whole pool has to be killed; jobs
+    that were running alongside are then retried on a fresh pool.
+    """
+    global _semaphore
+    if _semaphore is None:
+        # One job per worker so the timeout measures parsing, not queueing
+        _semaphore = asyncio.Semaphore(_pool_size())
+
+    loop = asyncio.get_running_loop()
+    job = partial(
+        _extract_with_deadline,
+        source,
+        settings.extraction_timeout,
+        max_chars=settings.extraction_max_chars,
+        max_pages=settings.extraction_max_pages,
+        max_page_chars=settings.extraction_max_page_chars,
+        quality_threshold=settings.extraction_quality_threshold if settings.extraction_fast_path else None
+    )
+
+    label = source if isinstance(source, str) else f"<{len(source)} bytes in memory>"
+    crashes = 0
+    async with _semaphore:
+        while True:
+            executor = get_executor()
+            try:
+                result = await asyncio.wait_for(
+                    loop.run_in_executor(executor, job),
+                    timeout=settings.extraction_timeout + _DEADLINE_GRACE
+                )
+            except asyncio.TimeoutError:
+                print(f"PDF extraction worker unresponsive after {settings.extraction_timeout}s, restarting pool: {label}")
+                _recycle_executor(executor)
+                return _empty_result()
+            except BrokenProcessPool:
+                if executor in _recycled:
+                    # Another job's stuck worker took the pool down; not this PDF's fault
+                    print("Extraction pool was restarted under this job, retrying")
+                    continue
+                crashes += 1
+                print(f"Extraction pool broken (crash {crashes}), restarting")
+                _recycle_executor(executor)
+                if crashes > _MAX_CRASH_RETRIES:
+                    return _empty_result()
+                continue
+
+            if result.get('timed_out'):
+                print(f"PDF extraction timed out after {settings.extraction_timeout}s: {label}")
+                return _empty_result()
+            if result.get('tier') in _tier_counts:
+                _tier_counts[result['tier']] += 1
+            print(f"Extracted {result['pages_parsed']}/{result['page_count']} page(s) via {result['tier']} tier")
+            return result
+
+def shutdown_extraction_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,159 @@
+"""
+Local stand-in for Gemini (llm_backend=fake), for load and regression testing
+without spending quota or depending on the network.
+
+Replies are schema-valid JSON for the ATS and JD prompts (single and batched),
+derived from a hash of the resume text, so the same input always gets the same
+analysis. Latency, server errors and 429s are drawn from a generator seeded
+with fake_llm_seed, so a given sequence of calls replays identically.
+"""
+from app.config import settings
+from app.services.llm_client import LLMBackend, LLMBackendError, LLMRateLimitError, LLMTimeoutError
+from collections import deque
+from typing import AsyncIterator, Dict, List
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+
+_BATCH_BLOCK = re.compile(r'<<<RESUME id="([^"]+)">>>\n(.*?)\n<<<END RESUME>>>', re.DOTALL)
+_SINGLE_RESUME = re.compile(r'\nResume:\n(.*?)\n\nReturn ONLY', re.DOTALL)
+_JOB_DESCRIPTION = re.compile(r'\nJob Description:\n(.*?)\n\n(?:Resume:|<<<RESUME)', re.DOTALL)
+
+_FORMATTING_ISSUES = [
+    "Avoid tables and text boxes; many ATS parsers skip them",
+    "Use standard section headings such as Experience and Education",
+    "Keep dates in a consistent format",
+    "Remove headers and footers that contain contact details",
+]
+_MISSING_SECTIONS = ["Summary", "Projects", "Certifications", "Skills"]
+_KEYWORDS = ["Python", "SQL", "Docker", "AWS", "CI/CD", "REST APIs", "Kubernetes", "Agile"]
+_IMPROVEMENTS = [
+    "Quantify achievements with numbers and percentages",
+    "Start bullet points with strong action verbs",
+    "Tailor the summary to the target role",
+    "Group skills by category",
+    "Move the most relevant experience to the top",
+]
+_REQUIREMENTS = [
+    "Relevant years of experience", "Core programming language", "Cloud platform experience",
+    "Team collaboration", "Degree in a related field", "Testing practices",
+]
+
+def _rng_for(text: str) -> random.Random:
+    digest = hashlib.sha256(f"{settings.fake_llm_seed}:{text}".encode('utf-8')).digest()
+    return random.Random(int.from_bytes(digest[:8], 'big'))
+
+def fake_ats_analysis(resume_text: str) -> Dict:
+    rng = _rng_for(resume_text)
+    return {
+        'score': rng.randint(45, 95),
+        'formatting_issues': rng.sample(_FORMATTING_ISSUES, rng.randint(0, 2)),
+        'missing_sections': rng.sample(_MISSING_SECTIONS, rng.randint(0, 2)),
+        'keyword_suggestions': rng.sample(_KEYWORDS, 3),
+        'improvements': rng.sample(_IMPROVEMENTS, 3),
+    }
+
+def fake_match_analysis(resume_text: str, jd_text: str) -> Dict:
+    rng = _rng_for(jd_text + '\x1e' + resume_text)
+    matched = rng.sample(_REQUIREMENTS, 3)
+    return {
+        'match_score': rng.randint(30, 95),
+        'matched_requirements': matched,
+        'missing_requirements': [r for r in _REQUIREMENTS if r not in matched][:2],
+        'recommendations': rng.sample(_IMPROVEMENTS, 2),
+        'strength_areas': matched[:2],
+        'improvement_areas': rng.sample(_KEYWORDS, 2),
+    }
+
+def fake_reply(prompt: str) -> str:
+    """JSON reply matching what the prompt asks for"""
+    jd_found = _JOB_DESCRIPTION.search(prompt)
+    is_match = jd_found is not None
+    jd_text = jd_found.group(1) if jd_found else ''
+
+    blocks = _BATCH_BLOCK.findall(prompt)
+    if blocks:
+        entries = []
+        for item_id, resume_text in blocks:
+            analysis = fake_match_analysis(resume_text, jd_text) if is_match else fake_ats_analysis(resume_text)
+            entries.append({'id': item_id, **analysis})
+        return json.dumps(entries, indent=2)
+
+    found = _SINGLE_RESUME.search(prompt)
+    resume_text = found.group(1) if found else prompt
+    analysis = fake_match_analysis(resume_text, jd_text) if is_match else fake_ats_analysis(resume_text)
+    return json.dumps(analysis, indent=2)
+
+class FakeLLMBackend(LLMBackend):
+    name = 'fake'
+
+    def __init__(self):
+        self._rng = random.Random(settings.fake_llm_seed)
+        self._recent_calls: deque = deque()
+
+    def model_id(self, model_name: str) -> str:
+        return f"fake:{model_name}"
+
+    def sample_latency(self) -> float:
+        mean = settings.fake_llm_latency_mean
+        spread = settings.fake_llm_latency_spread
+        kind = settings.fake_llm_latency
+        if kind == 'constant':
+            return mean
+        if kind == 'uniform':
+            return max(self._rng.uniform(mean - spread, mean + spread), 0.0)
+        if kind == 'exponential':
+            return self._rng.expovariate(1 / mean) if mean > 0 else 0.0
+        # lognormal: `mean` is the median, `spread` the sigma (long right tail)
+        return mean * self._rng.lognormvariate(0, spread)
+
+    def _start_call(self) -> float:
+        """Apply the simulated quota and 429 rate; returns this call's latency"""
+        if settings.fake_llm_rpm > 0:
+            now = time.monotonic()
+            while self._recent_calls and now - self._recent_calls[0] >= 60:
+                self._recent_calls.popleft()
+            if len(self._recent_calls) >= settings.fake_llm_rpm:
+                raise LLMRateLimitError("Fake LLM rate limited: per-minute quota exhausted")
+            self._recent_calls.append(now)
+
+        if self._rng.random() < settings.fake_llm_rate_limit_rate:
+            raise LLMRateLimitError("Fake LLM rate limited: 429")
+        return self.sample_latency()
+
+    async def _sleep(self, seconds: float, deadline: float, timeout: float):
+        if time.monotonic() + seconds > deadline:
+            await asyncio.sleep(max(deadline - time.monotonic(), 0))
+            raise LLMTimeoutError(f"Gemini call timed out after {timeout}s")
+        await asyncio.sleep(seconds)
+
+    async def generate(self, prompt: str, model_name: str, timeout: float) -> str:
+        deadline = time.monotonic() + timeout
+        latency = self._start_call()
+        fails = self._rng.random() < settings.fake_llm_error_rate
+        await self._sleep(latency, deadline, timeout)
+        if fails:
+            raise LLMBackendError("Fake LLM backend error: 503 Service Unavailable")
+        return fake_reply(prompt)
+
+    async def stream(self, prompt: str, model_name: str, timeout: float) -> AsyncIterator[str]:
+        deadline = time.monotonic() + timeout
+        latency = self._start_call()
+        fails = self._rng.random() < settings.fake_llm_error_rate
+
+        # ~30% of the latency before the first chunk, the rest spread over the others
+        await self._sleep(latency * 0.3, deadline, timeout)
+        if fails:
+            raise LLMBackendError("Fake LLM backend error: 503 Service Unavailable")
+
+        reply = fake_reply(prompt)
+        count = max(settings.fake_llm_stream_chunks, 1)
+        size = -(-len(reply) // count)
+        chunks: List[str] = [reply[i:i + size] for i in range(0, len(reply), size)]
+        for index, chunk in enumerate(chunks):
+            if index:
+                await self._sleep(latency * 0.7 / max(len(chunks) - 1, 1), deadline, timeout)
+            yield chunk
@@ -0,0 +1,81 @@
+"""
+Per-resume feature records.
+
+Everything the ATS scorer and JD matcher derive from a resume's text (word
+count, formatting and contact flags, sections, action verbs, canonical skill
+ids, max years of experience, word terms and TF-IDF term counts) is computed
+once at upload and stored on the resume document as `features`. Stored
+analyses read the record instead of reprocessing the text.
+
+A record is only trusted if it carries the current FEATURE_VERSION and skill
+taxonomy version; otherwise it is rebuilt from the stored text and written back.
+Records are always built from the stored (truncated) text, so a rebuilt record
+matches the one made at upload.
+"""
+from app.services import tfidf_model
+from app.utils.resume_features import analyze_resume
+from app.utils.skill_taxonomy import TAXONOMY, skill_fields, stored_skill_ids
+from typing import Dict, Optional
+
+# Bump when analyze_resume or the record layout changes
+FEATURE_VERSION = 1
+# Length of the `extracted_text` kept on resume documents
+STORED_TEXT_CHARS = 5000
+
+def stored_text(text: str) -> str:
+    """The part of a resume's text stored as `extracted_text`"""
+    return text[:STORED_TEXT_CHARS]
+
+def build_feature_record(text: str) -> Dict:
+    """The stored form of a resume's features, from its stored text"""
+    text = stored_text(text)
+    features = analyze_resume(text)
+    return {
+        'version': FEATURE_VERSION,
+        'word_count': features['word_count'],
+        'has_bullets': features['has_bullets'],
+        'has_dates': features['has_dates'],
+        'has_email': features['has_email'],
+        'has_phone': features['has_phone'],
+        'sections': features['sections'],
+        'action_verbs': features['action_verbs'],
+        **skill_fields(features['skill_ids']),
+        'max_years': max(features['years']) if features['years'] else None,
+        'terms': sorted(features['terms']),
+        'tfidf_counts': tfidf_model.term_counts(text)
+    }
+
+def features_from_record(record: Optional[Dict]) -> Optional[Dict]:
+    """
+    analyze_resume-shaped features (plus 'tfidf_counts') from a stored record,
+    None if there is none or it is outdated
+    """
+    if not record or record.get('version') != FEATURE_VERSION:
+        return None
+    skill_ids = stored_skill_ids(record)
+    if skill_ids is None:
+        return None
+    return {
+        'word_count': record['word_count'],
+        'has_bullets': record['has_bullets'],
+        'has_dates': record['has_dates'],
+        'has_email': record['has_email'],
+        'has_phone': record['has_phone'],
+        'sections': record['sections'],
+        'action_verbs': record['action_verbs'],
+        'skill_ids': skill_ids,
+        'skills': TAXONOMY.skill_names(skill_ids),
+        # Only the maximum is ever used
+        'years': [record['max_years']] if record['max_years'] is not None else [],
+        'terms': set(record['terms']),
+        'tfidf_counts': record['tfidf_counts']
+    }
+
+async def stored_resume_features(db, resume: Dict, resume_text: str) -> Dict:
+    """Features of a stored resume; a missing or outdated record is rebuilt from resume_text and saved"""
+    features = features_from_record(resume.get('features'))
+    if features is None:
+        record = build_feature_record(resume_text)
+        await db.resumes.update_one({"_id": resume['_id']}, {"$set": {"features": record}})
+        features = features_from_record(record)
+    return features
@@ -0,0 +1,96 @@
+"""
+Cache of parsed job descriptions, for the many-candidates-one-JD pattern
+(a bootcamp or recruiter matching hundreds of resumes against one posting).
+
+A JD is normalized (Unicode, case, whitespace) and hashed; its features
+(canonical skill ids, required years, word terms and TF-IDF term counts) are
+cached under that hash in process and in the `jd_feature_cache` collection,
+so repeat matches only do resume-side work. The key includes the extractor
+and skill taxonomy versions, so bumping either starts a fresh cache.
+"""
+from app.config import settings
+from app.database import ensure_ttl_index
+from app.services import tfidf_model
+from app.services.jd_matcher_service import JDMatcher
+from app.services.llm_cache import normalize_input
+from app.services.mongo_cache import is_expired, trim_lru_collection
+from app.utils.cache import LRUCache
+from app.utils.skill_taxonomy import TAXONOMY
+from datetime import datetime
+from typing import Dict, Optional
+import hashlib
+
+# Bump when JDMatcher.jd_features or the cached fields change
+JD_FEATURE_VERSION = 1
+
+_memory_cache = LRUCache(
+    max_entries=settings.jd_feature_cache_size,
+    ttl_seconds=settings.jd_feature_cache_ttl
+)
+
+def jd_cache_key(normalized_jd: str) -> str:
+    """SHA-256 of the extractor versions and the normalized JD"""
+    hasher = hashlib.sha256()
+    hasher.update(f"{JD_FEATURE_VERSION}:{TAXONOMY.version}".encode('utf-8'))
+    hasher.update(b'\x1f')
+    hasher.update(normalized_jd.encode('utf-8'))
+    return hasher.hexdigest()
+
+async def ensure_jd_feature_cache_indexes(db):
+    await ensure_ttl_index(db.jd_feature_cache, "last_used_at", settings.jd_feature_cache_ttl)
+
+def _parse(normalized_jd: str) -> Dict:
+    """Stored form of a JD's features"""
+    features = JDMatcher().jd_features(normalized_jd)
+    return {
+        'skill_ids': sorted(features['skill_ids']),
+        'required_years': features['required_years'],
+        'terms': sorted(features['terms']),
+        'tfidf_counts': tfidf_model.term_counts(normalized_jd)
+    }
+
+def _features(entry: Dict) -> Dict:
+    """JDMatcher.jd_features-shaped features (plus 'tfidf_counts') from a cache entry"""
+    return {
+        'terms': set(entry['terms']),
+        'skill_ids': frozenset(entry['skill_ids']),
+        'required_years': entry['required_years'],
+        'tfidf_counts': entry['tfidf_counts']
+    }
+
+async def _get_persisted(db, key: str) -> Optional[Dict]:
+    doc = await db.jd_feature_cache.find_one({"_id": key})
+    if not doc or is_expired(doc, settings.jd_feature_cache_ttl):
+        return None
+
+    await db.jd_feature_cache.update_one({"_id": key}, {"$set": {"last_used_at": datetime.utcnow()}})
+    return {field: doc[field] for field in ('skill_ids', 'required_years', 'terms', 'tfidf_counts')}
+
+async def _store(db, key: str, entry: Dict):
+    now = datetime.utcnow()
+    await db.jd_feature_cache.update_one(
+        {"_id": key},
+        {"$set": {**entry, "last_used_at": now}, "$setOnInsert": {"created_at": now}},
+        upsert=True
+    )
+    await trim_lru_collection(db.jd_feature_cache, settings.jd_feature_cache_max_documents)
+
+async def get_jd_features(db, job_description: str) -> Dict:
+    """
+    Features of a JD for JDMatcher.score_match / calculate_heuristic_match,
+    parsed only the first time this (normalized) JD is seen. Treat as read-only:
+    the same dict is handed to every caller.
+    """
+    normalized = normalize_input(job_description)
+    key = jd_cache_key(normalized)
+    features = _memory_cache.get(key)
+    if features is not None:
+        return features
+
+    entry = await _get_persisted(db, key)
+    if entry is None:
+        entry = _parse(normalized)
+        await _store(db, key, entry)
+    features = _features(entry)
+    _memory_cache.set(key, features)
+    return features
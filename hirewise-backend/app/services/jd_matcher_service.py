@@ -1,122 +1,165 @@
-import google.generativeai as genai
 from app.config import settings
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import json
-import re
-from typing import Dict, List
+from app.services import llm_client, tfidf_model
+from app.services.embeddings import embed_texts
+from app.services.llm_batching import estimate_tokens, iter_batched_json
+from app.services.llm_cache import generate_json_cached, stream_json_cached
+from app.services.prompt_builder import compress_job_description, compress_resume, jd_terms
+from app.utils.resume_features import analyze_resume, extract_terms, extract_skill_ids, YEARS_PATTERN
+from app.utils.skill_taxonomy import TAXONOMY
+import numpy as np
+from typing import AsyncIterator, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
 
-genai.configure(api_key=settings.gemini_api_key)
+# Bump when the match analysis prompt changes so cached responses are not reused
+AI_MATCH_PROMPT_VERSION = 1
+
+COMMON_WORDS = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for'}
+
+def _is_valid_match_analysis(analysis: Dict) -> bool:
+    score = analysis.get('match_score')
+    return isinstance(score, (int, float)) and 0 <= score <= 100
 
 class JDMatcher:
-    def __init__(self):
-        self.model = genai.GenerativeModel('gemini-pro')
+    async def calculate_match_score(
+        self, resume_text: str, job_description: str, resume_features: Optional[Dict] = None
+    ) -> Dict:
+        """Heuristic match blended with the Gemini analysis"""
+        result = self.calculate_heuristic_match(resume_text, job_description, resume_features)
+        ai_analysis = await self.get_ai_match_analysis(resume_text, job_description)
+        return self.apply_ai_analysis(result, ai_analysis)
     
-    def calculate_match_score(self, resume_text: str, job_description: str) -> Dict:
+    def calculate_heuristic_match(
+        self, resume_text: str, job_description: str, resume_features: Optional[Dict] = None,
+        jd_features: Optional[Dict] = None
+    ) -> Dict:
         """
         Calculate JD match score using weighted average
         Formula: Match Score = (Semantic * 0.30) + (Keywords * 0.25) + 
                                (Skills * 0.25) + (Experience * 0.20)
+        Deterministic and fast; see apply_ai_analysis for the AI blend.
         """
-        # 1. Semantic similarity (30% weight)
-        semantic_score = self.calculate_semantic_similarity(resume_text, job_description)
+        # Resume text is tokenized once and shared with the ATS scorer's analyzer
+        if resume_features is None:
+            resume_features = analyze_resume(resume_text)
         
-        # 2. Keywords match (25% weight)
-        keywords_score = self.calculate_keyword_match(resume_text, job_description)
+        if jd_features is None:
+            jd_features = self.jd_features(job_description)
         
-        # 3. Skills match (25% weight)
-        skills_match = self.extract_and_match_skills(resume_text, job_description)
+        semantic_score = self.calculate_semantic_similarity(
+            resume_text, job_description,
+            resume_term_counts=resume_features.get('tfidf_counts'), jd_term_counts=jd_features.get('tfidf_counts')
+        )
+        return self.score_match(resume_features, jd_features, semantic_score)
+    
+    def jd_features(self, jd: str, skill_ids: Optional[Iterable[int]] = None) -> Dict:
+        """The JD side of the heuristic match, computed once per JD (skill_ids: as stored at ingest)"""
+        jd_lower = jd.lower()
+        jd_years = YEARS_PATTERN.findall(jd_lower)
+        return {
+            # Remove common words
+            'terms': extract_terms(jd_lower) - COMMON_WORDS,
+            'skill_ids': extract_skill_ids(jd_lower) if skill_ids is None else frozenset(skill_ids),
+            'required_years': int(jd_years[0]) if jd_years else None
+        }
+    
+    def score_match(self, resume_features: Dict, jd_features: Dict, semantic_score: float) -> Dict:
+        """Heuristic match result from precomputed resume and JD features"""
+        keywords_score = self.calculate_keyword_match(resume_features['terms'], jd_features['terms'])
+        skills_match = self.extract_and_match_skills(resume_features['skill_ids'], jd_features['skill_ids'])
         skills_score = skills_match['score']
+        experience_score = self.calculate_experience_match(resume_features['years'], jd_features['required_years'])
+        
+        match_score = self.combine_scores(semantic_score, keywords_score, skills_score, experience_score)
         
-        # 4. Experience level match (20% weight)
-        experience_score = self.calculate_experience_match(resume_text, job_description)
+        # Generate recommendations (regenerated once the AI analysis is in)
+        recommendations = self.generate_recommendations(
+            skills_match, None, match_score
+        )
         
-        # Calculate weighted average
-        match_score = (
+        return {
+            'match_score': round(match_score, 1),
+            'heuristic_score': round(match_score, 1),
+            'technical_skills': round(skills_score, 1),
+            'experience_score': round(experience_score, 1),
+            'education_score': 85,  # Placeholder, can be enhanced
+            'keywords_score': round(keywords_score, 1),
+            'matched_skills': skills_match['matched'],
+            'missing_skills': skills_match['missing'],
+            'recommendations': recommendations,
+            'ai_analysis': None
+        }
+    
+    def combine_scores(
+        self, semantic_score: float, keywords_score: float, skills_score: float, experience_score: float
+    ) -> float:
+        """Weighted average of the heuristic components"""
+        return (
             (semantic_score * 0.30) +
             (keywords_score * 0.25) +
             (skills_score * 0.25) +
             (experience_score * 0.20)
         )
-        
-        # Get AI analysis
-        ai_analysis = self.get_ai_match_analysis(resume_text, job_description)
+    
+    def apply_ai_analysis(self, result: Dict, ai_analysis: Optional[Dict]) -> Dict:
+        """Blend an AI analysis into a heuristic match result (returns a new dict)"""
+        match_score = result['heuristic_score']
         
         # Combine with AI score (weighted: 50% formula, 50% AI)
         if ai_analysis and 'match_score' in ai_analysis:
             match_score = (match_score * 0.5) + (ai_analysis['match_score'] * 0.5)
         
-        # Generate recommendations
         recommendations = self.generate_recommendations(
-            skills_match, ai_analysis, match_score
+            {'missing': result['missing_skills']}, ai_analysis, match_score
         )
         
         return {
+            **result,
             'match_score': round(match_score, 1),
-            'technical_skills': round(skills_score, 1),
-            'experience_score': round(experience_score, 1),
-            'education_score': 85,  # Placeholder, can be enhanced
-            'keywords_score': round(keywords_score, 1),
-            'matched_skills': skills_match['matched'],
-            'missing_skills': skills_match['missing'],
             'recommendations': recommendations,
             'ai_analysis': ai_analysis
         }
     
-    def calculate_semantic_similarity(self, resume: str, jd: str) -> float:
-        """Calculate semantic similarity using TF-IDF"""
+    def calculate_semantic_similarity(
+        self, resume: str, jd: str, embedding_similarity: Optional[float] = None,
+        resume_term_counts: Optional[Dict[str, int]] = None, jd_term_counts: Optional[Dict[str, int]] = None
+    ) -> float:
+        """
+        Calculate semantic similarity using the corpus TF-IDF model, blended with
+        embedding cosine when semantic_embedding_weight > 0 (pass
+        embedding_similarity and stored term counts if they are already at hand)
+        """
         try:
-            vectorizer = TfidfVectorizer(stop_words='english', max_features=100)
-            vectors = vectorizer.fit_transform([resume, jd])
-            similarity = cosine_similarity(vectors[0:1], vectors[1:2])[0][0]
+            similarity = tfidf_model.similarity(resume, jd, resume_term_counts, jd_term_counts)
+            if settings.semantic_embedding_weight > 0:
+                if embedding_similarity is None:
+                    vectors = embed_texts([resume, jd])
+                    embedding_similarity = float(vectors[0] @ vectors[1])
+                similarity = self.blend_similarity(similarity, embedding_similarity)
             return similarity * 100
-        except:
+        except Exception:
             return 50.0
     
-    def calculate_keyword_match(self, resume: str, jd: str) -> float:
-        """Calculate keyword overlap percentage"""
-        # Extract words (simple tokenization)
-        resume_words = set(re.findall(r'\b\w+\b', resume.lower()))
-        jd_words = set(re.findall(r'\b\w+\b', jd.lower()))
-        
-        # Remove common words
-        common_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for'}
-        resume_words -= common_words
-        jd_words -= common_words
-        
-        # Calculate overlap
-        if len(jd_words) > 0:
-            overlap = len(resume_words.intersection(jd_words)) / len(jd_words)
+    def blend_similarity(self, tfidf_similarity, embedding_similarity):
+        """TF-IDF/embedding cosine blend (0-1); works on floats and NumPy arrays alike"""
+        weight = settings.semantic_embedding_weight
+        return (1 - weight) * tfidf_similarity + weight * np.maximum(embedding_similarity, 0)
+    
+    def calculate_keyword_match(self, resume_terms: Set[str], jd_terms: Set[str]) -> float:
+        """Calculate keyword overlap percentage (jd_terms without common words)"""
+        if len(jd_terms) > 0:
+            overlap = len(resume_terms.intersection(jd_terms)) / len(jd_terms)
             return overlap * 100
         return 0
     
-    def extract_and_match_skills(self, resume: str, jd: str) -> Dict:
-        """Extract and match technical skills"""
-        # Common tech skills (expand this list)
-        tech_skills = [
-            'python', 'java', 'javascript', 'react', 'angular', 'vue', 'nodejs',
-            'typescript', 'c++', 'c#', 'ruby', 'go', 'rust', 'swift', 'kotlin',
-            'aws', 'azure', 'gcp', 'docker', 'kubernetes', 'jenkins',
-            'sql', 'mongodb', 'postgresql', 'mysql', 'redis',
-            'git', 'github', 'gitlab', 'jira', 'agile', 'scrum',
-            'machine learning', 'data analysis', 'deep learning', 'tensorflow',
-            'pytorch', 'pandas', 'numpy', 'scikit-learn',
-            'rest api', 'graphql', 'microservices', 'ci/cd'
-        ]
-        
-        resume_lower = resume.lower()
-        jd_lower = jd.lower()
-        
-        # Find skills in JD and resume
-        jd_skills = [skill for skill in tech_skills if skill in jd_lower]
-        resume_skills = [skill for skill in tech_skills if skill in resume_lower]
-        
-        matched_skills = list(set(jd_skills).intersection(set(resume_skills)))
-        missing_skills = list(set(jd_skills) - set(resume_skills))
+    def extract_and_match_skills(self, resume_skill_ids: FrozenSet[int], jd_skill_ids: FrozenSet[int]) -> Dict:
+        """Match technical skills"""
+        # Both sides are canonical taxonomy ids ('k8s' and 'kubernetes' are the
+        # same skill), so matching is a set intersection
+        matched_skills = TAXONOMY.skill_names(jd_skill_ids & resume_skill_ids)
+        missing_skills = TAXONOMY.skill_names(jd_skill_ids - resume_skill_ids)
         
         # Calculate score
-        if len(jd_skills) > 0:
-            score = (len(matched_skills) / len(jd_skills)) * 100
+        if len(jd_skill_ids) > 0:
+            score = (len(matched_skills) / len(jd_skill_ids)) * 100
         else:
             score = 75  # Default if no tech skills found in JD
         
@@ -126,17 +169,12 @@ class JDMatcher:
             'missing': missing_skills[:10]
         }
     
-    def calculate_experience_match(self, resume: str, jd: str) -> float:
+    def calculate_experience_match(self, resume_years: List[int], required_years: Optional[int]) -> float:
         """Match experience level requirements"""
-        # Extract years of experience mentioned in JD
-        jd_years = re.findall(r'(\d+)\+?\s*(?:years?|yrs?)', jd.lower())
-        resume_years = re.findall(r'(\d+)\+?\s*(?:years?|yrs?)', resume.lower())
-        
-        if not jd_years:
+        if required_years is None:
             return 80  # No specific requirement mentioned
         
-        required_years = int(jd_years[0]) if jd_years else 0
-        candidate_years = max([int(y) for y in resume_years]) if resume_years else 0
+        candidate_years = max(resume_years) if resume_years else 0
         
         if candidate_years >= required_years:
             return 100
@@ -145,17 +183,42 @@ class JDMatcher:
         else:
             return max(50, (candidate_years / required_years) * 100)
     
-    def get_ai_match_analysis(self, resume: str, jd: str) -> Dict:
-        """Get AI-powered job match analysis using Gemini"""
+    def prompt_excerpts(self, resume: str, jd: str) -> Tuple[str, str]:
+        """JD and resume content for the match prompts, ranked and packed into their token budgets"""
+        return (
+            compress_job_description(jd, settings.prompt_jd_tokens),
+            compress_resume(resume, settings.prompt_resume_tokens, jd_terms(jd))
+        )
+    
+    async def get_ai_match_analysis(self, resume: str, jd: str) -> Optional[Dict]:
+        """Get AI-powered job match analysis using Gemini (None if it is unavailable)"""
+        if not llm_client.is_configured():
+            print("Gemini API key not configured, skipping AI match analysis")
+            return None
+        
         try:
-            prompt = f"""
+            jd_excerpt, resume_excerpt = self.prompt_excerpts(resume, jd)
+            prompt = self.build_match_prompt(jd_excerpt, resume_excerpt)
+            
+            return await generate_json_cached(
+                'jd_match_analysis', AI_MATCH_PROMPT_VERSION, [jd_excerpt, resume_excerpt], prompt
+            )
+            
+        except Exception as e:
+            # No made-up score: callers keep the heuristic match
+            print(f"AI match analysis error: {e}")
+            return None
+    
+    def build_match_prompt(self, jd_excerpt: str, resume_excerpt: str) -> str:
+        """Single-resume JD match prompt"""
+        return f"""
 Compare this resume with the job description and provide a detailed match analysis.
 
 Job Description:
-{jd[:2000]}
+{jd_excerpt}
 
 Resume:
-{resume[:2000]}
+{resume_excerpt}
 
 Return ONLY valid JSON in this exact format:
 {{
@@ -167,29 +230,78 @@ Return ONLY valid JSON in this exact format:
     "improvement_areas": ["areas needing improvement"]
 }}
 """
-            
-            response = self.model.generate_content(prompt)
-            response_text = response.text.strip()
-            
-            # Clean markdown
-            if response_text.startswith('```'):
-                response_text = response_text.split('```')[1]
-                if response_text.startswith('json'):
-                    response_text = response_text[4:]
-            
-            ai_result = json.loads(response_text)
-            return ai_result
-            
-        except Exception as e:
-            print(f"AI match analysis error: {e}")
-            return {
-                'match_score': 70,
-                'matched_requirements': [],
-                'missing_requirements': [],
-                'recommendations': [],
-                'strength_areas': [],
-                'improvement_areas': []
-            }
+    
+    async def stream_ai_match_analysis(self, resume: str, jd: str) -> AsyncIterator[Dict]:
+        """
+        Streamed get_ai_match_analysis: yields the partial analysis as fields
+        arrive, the complete analysis last. Raises LLMError if no usable
+        analysis could be obtained.
+        """
+        jd_excerpt, resume_excerpt = self.prompt_excerpts(resume, jd)
+        async for analysis in stream_json_cached(
+            'jd_match_analysis', AI_MATCH_PROMPT_VERSION, [jd_excerpt, resume_excerpt],
+            self.build_match_prompt(jd_excerpt, resume_excerpt), is_valid=_is_valid_match_analysis
+        ):
+            yield analysis
+    
+    def build_batch_match_prompt(self, jd_excerpt: str, resumes: List[Tuple[str, str]]) -> str:
+        """One prompt comparing several (id, resume excerpt) pairs against the same JD"""
+        blocks = "\n\n".join(
+            f'<<<RESUME id="{resume_id}">>>\n{excerpt}\n<<<END RESUME>>>'
+            for resume_id, excerpt in resumes
+        )
+        return f"""
+Compare each of the following resumes with the job description and provide a detailed match analysis.
+Assess every resume independently against the job description; do not rank them against each other.
+
+Job Description:
+{jd_excerpt}
+
+{blocks}
+
+Return ONLY a valid JSON array with one object per resume, using its id, in this exact format:
+[
+    {{
+        "id": "r1",
+        "match_score": 75,
+        "matched_requirements": ["list of matching qualifications"],
+        "missing_requirements": ["list of gaps"],
+        "recommendations": ["specific actions to improve match"],
+        "strength_areas": ["areas where candidate excels"],
+        "improvement_areas": ["areas needing improvement"]
+    }}
+]
+"""
+    
+    async def iter_ai_match_analyses(
+        self, resumes: Dict[str, str], jd: str
+    ) -> AsyncIterator[Tuple[str, Optional[Dict]]]:
+        """
+        AI match analysis of many resumes (id -> text) against one JD, several
+        per Gemini call. Yields (id, analysis or None) as each batch completes.
+        """
+        if not llm_client.is_configured():
+            for resume_id in resumes:
+                yield resume_id, None
+            return
+        
+        jd_excerpt = compress_job_description(jd, settings.prompt_jd_tokens)
+        terms = jd_terms(jd)
+        excerpts = {
+            resume_id: compress_resume(text, settings.prompt_resume_tokens, terms)
+            for resume_id, text in resumes.items()
+        }
+        
+        async for resume_id, analysis in iter_batched_json(
+            'jd_match_analysis', AI_MATCH_PROMPT_VERSION,
+            {resume_id: [jd_excerpt, excerpt] for resume_id, excerpt in excerpts.items()},
+            build_prompt=lambda batch: self.build_batch_match_prompt(jd_excerpt, batch),
+            prompt_overhead=estimate_tokens(self.build_batch_match_prompt(jd_excerpt, [])),
+            is_valid=_is_valid_match_analysis,
+            single=lambda resume_id: self.get_ai_match_analysis(resumes[resume_id], jd),
+            excerpt=excerpts.get
+        ):
+            yield resume_id, analysis
     
     def generate_recommendations(
         self, skills_match: Dict, ai_analysis: Dict, match_score: float
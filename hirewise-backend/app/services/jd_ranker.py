@@ -0,0 +1,151 @@
+"""
+Rank one resume against every job description a user has stored.
+
+A user's distinct JDs are vectorized once into a sparse matrix (L2-normalized
+rows under the corpus TF-IDF model) next to their precomputed keyword terms,
+skills and required years. Ranking is then one sparse mat-vec for semantic
+similarity plus set overlaps (skills as the canonical id sets stored at
+ingest), scored with the same weights as a single JD
+match. Indexes stay in memory until the user's JDs or the TF-IDF model change.
+"""
+from app.config import settings
+from app.services import tfidf_model
+from app.services.embeddings import embed_texts
+from app.services.jd_matcher_service import JDMatcher
+from app.services.vector_store import JDS, get_vector_store, vector_search_enabled
+from app.utils.cache import LRUCache
+from app.utils.resume_features import analyze_resume
+from app.utils.skill_taxonomy import VERSION_FIELD, stored_skill_ids
+from typing import Dict, List, Optional
+import asyncio
+import numpy as np
+
+# user id -> JD index
+_indexes = LRUCache(max_entries=settings.jd_rank_index_size)
+
+async def ensure_jd_rank_indexes(db):
+    """Index the per-user JD lookups used to build and validate rank indexes"""
+    await db.jd_matches.create_index([("user_id", 1), ("_id", -1)])
+
+async def _signature(db, user_id: str) -> tuple:
+    """Changes whenever a JD is added or removed or the TF-IDF model is swapped"""
+    latest = await db.jd_matches.find_one({"user_id": user_id}, {"_id": 1}, sort=[("_id", -1)])
+    count = await db.jd_matches.count_documents({"user_id": user_id})
+    # The index keeps its vectorizer alive, so the id cannot be reused while it is cached
+    return (count, latest['_id'] if latest else None, id(tfidf_model.get_vectorizer()))
+
+async def _jd_embeddings(entries: List[Dict]) -> np.ndarray:
+    """JD vectors from the vector store, embedding the ones it does not have yet"""
+    found, vectors = get_vector_store(JDS).get([entry['match_id'] for entry in entries])
+    by_id = dict(zip(found, vectors))
+    missing = [entry for entry in entries if entry['match_id'] not in by_id]
+    if missing:
+        embedded = await asyncio.to_thread(embed_texts, [entry['job_description'] for entry in missing])
+        by_id.update(zip((entry['match_id'] for entry in missing), embedded))
+    return np.array([by_id[entry['match_id']] for entry in entries], dtype=np.float32)
+
+def _build_index(entries: List[Dict], signature: tuple, embeddings: Optional[np.ndarray]) -> Dict:
+    matcher = JDMatcher()
+    vectorizer = tfidf_model.get_vectorizer()
+    texts = [entry['job_description'] for entry in entries]
+    return {
+        'signature': signature,
+        'entries': entries,
+        'vectorizer': vectorizer,
+        'matrix': vectorizer.transform(texts).tocsr() if texts else None,
+        'features': [matcher.jd_features(entry['job_description'], entry['skill_ids']) for entry in entries],
+        'embeddings': embeddings
+    }
+
+async def get_jd_index(db, user_id: str) -> Dict:
+    """The user's JD index, rebuilt only if their JDs or the model changed"""
+    signature = await _signature(db, user_id)
+    index = _indexes.get(user_id)
+    if index and index['signature'] == signature:
+        return index
+
+    # Newest first; the same JD pasted again is indexed once, as its latest match
+    entries = []
+    seen = set()
+    cursor = db.jd_matches.find(
+        {"user_id": user_id},
+        {"job_description": 1, "job_title": 1, "created_at": 1, "jd_skill_ids": 1, VERSION_FIELD: 1}
+    ).sort("_id", -1).limit(settings.jd_rank_max_jds * 2)
+    async for doc in cursor:
+        jd = doc.get('job_description')
+        if not jd or jd in seen:
+            continue
+        seen.add(jd)
+        entries.append({
+            'match_id': str(doc['_id']),
+            'job_title': doc.get('job_title'),
+            'job_description': jd,
+            'created_at': doc.get('created_at'),
+            # None for matches stored before the current taxonomy: rescanned
+            'skill_ids': stored_skill_ids(doc, 'jd_skill_ids')
+        })
+        if len(entries) >= settings.jd_rank_max_jds:
+            break
+
+    embeddings = await _jd_embeddings(entries) if entries and vector_search_enabled() else None
+    # Vectorizing and feature extraction are CPU-bound; keep the event loop free
+    index = await asyncio.to_thread(_build_index, entries, signature, embeddings)
+    _indexes.set(user_id, index)
+    print(f"JD rank index built for user {user_id}: {len(entries)} job description(s)")
+    return index
+
+def rank_against_index(
+    index: Dict, resume_text: str, top_k: int, resume_features: Optional[Dict] = None
+) -> List[Dict]:
+    """
+    Top `top_k` JDs of the index for a resume, best first, each as
+    {'match_id', 'job_title', 'job_description', 'created_at', 'result'}
+    where result has the shape of JDMatcher.calculate_heuristic_match
+    """
+    if index['matrix'] is None or top_k < 1:
+        return []
+    if resume_features is None:
+        resume_features = analyze_resume(resume_text)
+
+    matcher = JDMatcher()
+    # Semantic similarity against every JD at once: (n_jds x terms) . (terms x 1)
+    resume_vector = index['vectorizer'].transform([resume_text])
+    semantic = (index['matrix'] @ resume_vector.T).toarray().ravel()
+    if index['embeddings'] is not None:
+        # Same again for the embeddings: one dense mat-vec
+        semantic = matcher.blend_similarity(semantic, index['embeddings'] @ embed_texts([resume_text])[0])
+    semantic = semantic * 100
+
+    resume_terms = resume_features['terms']
+    resume_skill_ids = resume_features['skill_ids']
+    candidate_years = max(resume_features['years']) if resume_features['years'] else 0
+    scores = np.empty(len(index['features']))
+    for position, features in enumerate(index['features']):
+        jd_skill_ids = features['skill_ids']
+        skills_score = 100 * len(jd_skill_ids & resume_skill_ids) / len(jd_skill_ids) if jd_skill_ids else 75
+        scores[position] = matcher.combine_scores(
+            semantic[position],
+            matcher.calculate_keyword_match(resume_terms, features['terms']),
+            skills_score,
+            matcher.calculate_experience_match([candidate_years], features['required_years'])
+        )
+
+    top_k = min(top_k, len(scores))
+    top = np.argpartition(-scores, top_k - 1)[:top_k]
+    top = top[np.argsort(-scores[top], kind='stable')]
+
+    ranked = []
+    for position in top:
+        entry = index['entries'][position]
+        # Full result (matched/missing skills, recommendations) only for the winners
+        result = matcher.score_match(resume_features, index['features'][position], float(semantic[position]))
+        ranked.append({**entry, 'result': result})
+    return ranked
+
+async def rank_job_descriptions(
+    db, user_id: str, resume_text: str, top_k: int, resume_features: Optional[Dict] = None
+) -> List[Dict]:
+    """Rank every stored JD of a user against a resume (see rank_against_index)"""
+    index = await get_jd_index(db, user_id)
+    # Feature extraction, embedding and scoring every JD are CPU-bound; keep the event loop free
+    return await asyncio.to_thread(rank_against_index, index, resume_text, top_k, resume_features)
@@ -0,0 +1,160 @@
+from app.config import settings
+from app.database import ensure_ttl_index
+from pymongo import ReturnDocument
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from uuid import uuid4
+import random
+
+# Job lifecycle: queued -> running -> succeeded, or back to queued with a
+# backoff delay after a failure, and dead once max_attempts is exhausted
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+DEAD = 'dead'
+
+async def ensure_job_indexes(db):
+    """Indexes for claiming jobs and expiring finished ones"""
+    await db.jobs.create_index([("status", 1), ("available_at", 1)])
+    await db.jobs.create_index([("status", 1), ("lease_expires_at", 1)])
+    await ensure_ttl_index(db.jobs, "finished_at", settings.job_retention)
+
+async def enqueue_job(db, kind: str, payload: Dict, job_id: Optional[str] = None) -> str:
+    """Add a job to the queue; it is durable as soon as this returns"""
+    job_id = job_id or uuid4().hex
+    now = datetime.utcnow()
+    await db.jobs.insert_one({
+        "_id": job_id,
+        "kind": kind,
+        "payload": payload,
+        "status": QUEUED,
+        "attempts": 0,
+        "max_attempts": settings.job_max_attempts,
+        "available_at": now,
+        "lease_owner": None,
+        "lease_expires_at": None,
+        "last_error": None,
+        "result": None,
+        "created_at": now,
+        "updated_at": now
+    })
+    return job_id
+
+async def claim_job(db, worker_id: str, kinds: List[str]) -> Optional[Dict]:
+    """
+    Atomically take the oldest runnable job: a queued one whose backoff has
+    elapsed, or a running one whose worker stopped renewing its lease.
+    """
+    now = datetime.utcnow()
+    return await db.jobs.find_one_and_update(
+        {
+            "kind": {"$in": kinds},
+            "$or": [
+                {"status": QUEUED, "available_at": {"$lte": now}},
+                {"status": RUNNING, "lease_expires_at": {"$lt": now}}
+            ]
+        },
+        {
+            "$set": {
+                "status": RUNNING,
+                "lease_owner": worker_id,
+                "lease_expires_at": now + timedelta(seconds=settings.job_lease_seconds),
+                "started_at": now,
+                "updated_at": now
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("available_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def heartbeat_job(db, job_id: str, worker_id: str) -> bool:
+    """Extend the lease; False means the lease was lost to another worker"""
+    now = datetime.utcnow()
+    result = await db.jobs.update_one(
+        {"_id": job_id, "status": RUNNING, "lease_owner": worker_id},
+        {"$set": {
+            "lease_expires_at": now + timedelta(seconds=settings.job_lease_seconds),
+            "updated_at": now
+        }}
+    )
+    return result.matched_count == 1
+
+async def set_job_progress(db, job_id: str, progress: Dict) -> bool:
+    """Store a partial result for clients to show while the job is still running"""
+    update = await db.jobs.update_one(
+        {"_id": job_id, "status": RUNNING},
+        {"$set": {"progress": progress, "updated_at": datetime.utcnow()}}
+    )
+    return update.matched_count == 1
+
+async def complete_job(db, job_id: str, worker_id: str, result: Dict) -> bool:
+    """Mark a job succeeded and store its result (only while holding the lease)"""
+    now = datetime.utcnow()
+    update = await db.jobs.update_one(
+        {"_id": job_id, "status": RUNNING, "lease_owner": worker_id},
+        {"$set": {
+            "status": SUCCEEDED,
+            "result": result,
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "finished_at": now,
+            "updated_at": now
+        }}
+    )
+    return update.matched_count == 1
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with full jitter, capped at job_retry_max_delay"""
+    ceiling = min(settings.job_retry_base_delay * (2 ** max(attempts - 1, 0)), settings.job_retry_max_delay)
+    return random.uniform(ceiling / 2, ceiling)
+
+async def fail_job(db, job: Dict, worker_id: str, error: str) -> Optional[str]:
+    """
+    Record a failed attempt: requeue with backoff, or dead-letter the job once
+    it has used up its attempts. Returns the new status (None if the lease was lost).
+    """
+    now = datetime.utcnow()
+    if job['attempts'] >= job.get('max_attempts', settings.job_max_attempts):
+        status = DEAD
+        update = {"status": DEAD, "finished_at": now}
+    else:
+        status = QUEUED
+        update = {"status": QUEUED, "available_at": now + timedelta(seconds=retry_delay(job['attempts']))}
+
+    result = await db.jobs.update_one(
+        {"_id": job['_id'], "status": RUNNING, "lease_owner": worker_id},
+        {"$set": {
+            **update,
+            "last_error": error,
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "updated_at": now
+        }}
+    )
+    return status if result.matched_count == 1 else None
+
+async def release_job(db, job: Dict, worker_id: str):
+    """Hand a job back untouched (worker shutting down); the attempt is not counted"""
+    await db.jobs.update_one(
+        {"_id": job['_id'], "status": RUNNING, "lease_owner": worker_id},
+        {
+            "$set": {
+                "status": QUEUED,
+                "available_at": datetime.utcnow(),
+                "lease_owner": None,
+                "lease_expires_at": None
+            },
+            "$inc": {"attempts": -1}
+        }
+    )
+
+async def get_job(db, job_id: str) -> Optional[Dict]:
+    return await db.jobs.find_one({"_id": job_id})
+
+async def get_queue_stats(db) -> Dict:
+    """Job counts per status"""
+    stats = {QUEUED: 0, RUNNING: 0, SUCCEEDED: 0, DEAD: 0}
+    async for row in db.jobs.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+        stats[row['_id']] = row['count']
+    return stats
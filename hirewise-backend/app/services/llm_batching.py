@@ -0,0 +1,128 @@
+from app.config import settings
+from app.services import llm_client, llm_gateway
+from app.services.llm_cache import llm_cache_key, get_cached_response, store_response
+from app.services.llm_client import LLMError, parse_json_response
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+import asyncio
+
+def estimate_tokens(text: str) -> int:
+    """Rough Gemini token count (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+def pack_batches(costs: Dict[str, int], budget: int, max_items: int) -> List[List[str]]:
+    """
+    Greedily pack item ids into batches whose summed cost stays within
+    `budget`; an item over budget on its own gets a batch of one
+    """
+    batches = []
+    current: List[str] = []
+    used = 0
+    for item_id, cost in sorted(costs.items(), key=lambda item: item[1], reverse=True):
+        if current and (used + cost > budget or len(current) >= max_items):
+            batches.append(current)
+            current, used = [], 0
+        current.append(item_id)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+def parse_batch_response(response_text: str) -> Dict[str, Dict]:
+    """Demultiplex a JSON array of {"id": ..., ...} objects; entries without an id are dropped"""
+    parsed = parse_json_response(response_text)
+    if isinstance(parsed, dict):
+        parsed = parsed.get('results', [])
+    if not isinstance(parsed, list):
+        raise LLMError("Batched response is not a JSON array")
+
+    results = {}
+    for entry in parsed:
+        if isinstance(entry, dict) and 'id' in entry:
+            item_id = str(entry.pop('id'))
+            results[item_id] = entry
+    return results
+
+async def iter_batched_json(
+    template: str,
+    version: int,
+    inputs: Dict[str, Sequence[str]],
+    build_prompt: Callable[[List[Tuple[str, str]]], str],
+    prompt_overhead: int,
+    is_valid: Callable[[Dict], bool],
+    single: Callable[[str], Awaitable[Optional[Dict]]],
+    excerpt: Callable[[str], str]
+) -> AsyncIterator[Tuple[str, Optional[Dict]]]:
+    """
+    Run one analysis per item, packing several items into each Gemini call.
+
+    - inputs: item id -> cache inputs (same as the single-item prompt would use)
+    - build_prompt: [(prompt id, item excerpt)] -> batched prompt
+    - is_valid: whether one demultiplexed entry is usable
+    - single: per-item fallback for entries missing or malformed in the batch
+    - excerpt: item id -> the text packed into the batched prompt
+
+    Results are cached per item under the single-item key, so cached items
+    skip the call entirely. Yields (item id, result) as each batch finishes.
+    """
+    model_name = settings.gemini_model
+    model_id = llm_client.cache_model_id(model_name)
+    keys = {item_id: llm_cache_key(model_id, template, version, parts) for item_id, parts in inputs.items()}
+
+    pending = {}
+    for item_id, key in keys.items():
+        cached = await get_cached_response(key)
+        if cached is not None:
+            yield item_id, cached
+        else:
+            pending[item_id] = excerpt(item_id)
+
+    if not pending:
+        return
+
+    costs = {
+        item_id: estimate_tokens(text) + settings.llm_batch_output_tokens
+        for item_id, text in pending.items()
+    }
+    budget = max(settings.llm_batch_token_budget - prompt_overhead, 1)
+    batches = pack_batches(costs, budget, settings.llm_batch_max_items)
+    print(f"LLM batching: {len(pending)} item(s) in {len(batches)} call(s), {len(keys) - len(pending)} cached")
+
+    async def run_batch(batch: List[str]) -> List[Tuple[str, Optional[Dict]]]:
+        if len(batch) == 1:
+            return [(batch[0], await single(batch[0]))]
+
+        # Short ids keep the prompt small and avoid leaking internal ids
+        prompt_ids = {f"r{i + 1}": item_id for i, item_id in enumerate(batch)}
+        prompt = build_prompt([(prompt_id, pending[item_id]) for prompt_id, item_id in prompt_ids.items()])
+
+        try:
+            entries = parse_batch_response(await llm_gateway.generate_text(prompt, model_name))
+        except LLMError as e:
+            print(f"Batched {template} call failed ({e}), falling back per item")
+            entries = {}
+
+        results = []
+        fallbacks = []
+        for prompt_id, item_id in prompt_ids.items():
+            entry = entries.get(prompt_id)
+            if entry is not None and is_valid(entry):
+                await store_response(keys[item_id], template, model_id, entry)
+                results.append((item_id, entry))
+            else:
+                fallbacks.append(item_id)
+
+        if fallbacks:
+            print(f"Batched {template}: {len(fallbacks)} item(s) malformed or missing, retrying singly")
+            singles = await asyncio.gather(*(single(item_id) for item_id in fallbacks))
+            results.extend(zip(fallbacks, singles))
+        return results
+
+    tasks = [asyncio.create_task(run_batch(batch)) for batch in batches]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            for item_id, result in await finished:
+                yield item_id, result
+    finally:
+        # Consumer stopped early (e.g. client disconnected)
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,183 @@
+from app.config import settings
+from app.database import ensure_ttl_index, get_database
+from app.services import llm_client, llm_gateway
+from app.services.mongo_cache import is_expired
+from app.utils.cache import LRUCache
+from app.utils.partial_json import IncrementalJSONParser
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, Optional, Sequence
+import asyncio
+import hashlib
+import re
+import unicodedata
+
+_WHITESPACE = re.compile(r'\s+')
+
+_memory_cache = LRUCache(
+    max_entries=settings.llm_cache_size,
+    ttl_seconds=settings.llm_cache_ttl
+)
+
+_stats = {'memory_hits': 0, 'mongo_hits': 0, 'misses': 0, 'shared': 0}
+
+# cache key -> future of the Gemini call in flight, so concurrent identical
+# analyses wait for one call instead of each paying for their own
+_in_flight: Dict[str, asyncio.Future] = {}
+
+def get_llm_cache_stats() -> Dict:
+    """Hit/miss counters for this process"""
+    lookups = _stats['memory_hits'] + _stats['mongo_hits'] + _stats['misses']
+    hits = _stats['memory_hits'] + _stats['mongo_hits']
+    return {
+        **_stats,
+        'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+        'memory_entries': len(_memory_cache)
+    }
+
+async def ensure_llm_cache_indexes(db):
+    """Expire cached responses so model or prompt drift is eventually picked up"""
+    await ensure_ttl_index(db.llm_cache, "created_at", settings.llm_cache_ttl)
+
+def normalize_input(text: str) -> str:
+    """Unicode-normalize, casefold and collapse whitespace before hashing"""
+    text = unicodedata.normalize('NFKC', text)
+    return _WHITESPACE.sub(' ', text).strip().casefold()
+
+def llm_cache_key(model_name: str, template: str, version: int, inputs: Sequence[str]) -> str:
+    """SHA-256 of (model, prompt template + version, normalized inputs)"""
+    hasher = hashlib.sha256()
+    for part in (model_name, template, str(version)):
+        hasher.update(part.encode('utf-8'))
+        hasher.update(b'\x1f')
+    for text in inputs:
+        hasher.update(normalize_input(text).encode('utf-8'))
+        hasher.update(b'\x1e')
+    return hasher.hexdigest()
+
+async def get_cached_response(key: str) -> Optional[Dict]:
+    """Look up a parsed LLM response (memory first, then MongoDB)"""
+    response = _memory_cache.get(key)
+    if response is not None:
+        _stats['memory_hits'] += 1
+        return response
+
+    db = get_database()
+    try:
+        doc = await db.llm_cache.find_one({"_id": key})
+        if doc:
+            if is_expired(doc, settings.llm_cache_ttl, "created_at"):
+                doc = None
+            else:
+                await db.llm_cache.update_one(
+                    {"_id": key},
+                    {"$set": {"last_used_at": datetime.utcnow()}, "$inc": {"hits": 1}}
+                )
+    except Exception as e:
+        print(f"LLM cache lookup failed: {e}")
+        doc = None
+
+    if not doc:
+        _stats['misses'] += 1
+        return None
+
+    _stats['mongo_hits'] += 1
+    _memory_cache.set(key, doc['response'])
+    return doc['response']
+
+async def store_response(key: str, template: str, model_name: str, response: Dict):
+    _memory_cache.set(key, response)
+
+    now = datetime.utcnow()
+    try:
+        await get_database().llm_cache.update_one(
+            {"_id": key},
+            {
+                "$set": {
+                    "response": response,
+                    "template": template,
+                    "model": model_name,
+                    "created_at": now,
+                    "last_used_at": now
+                },
+                "$setOnInsert": {"hits": 0}
+            },
+            upsert=True
+        )
+    except Exception as e:
+        print(f"LLM cache store failed: {e}")
+
+async def generate_json_cached(
+    template: str, version: int, inputs: Sequence[str], prompt: str,
+    model_name: Optional[str] = None
+) -> Dict:
+    """
+    Gateway-controlled generate_json behind the response cache. `inputs` are the values
+    interpolated into `prompt`; bump `version` whenever the template changes.
+    Only successfully parsed responses are cached.
+    """
+    model_name = model_name or settings.gemini_model
+    key = llm_cache_key(llm_client.cache_model_id(model_name), template, version, inputs)
+
+    cached = await get_cached_response(key)
+    if cached is not None:
+        print(f"LLM cache hit: {template} {key[:12]}")
+        return cached
+
+    pending = _in_flight.get(key)
+    if pending is not None:
+        _stats['shared'] += 1
+        return await asyncio.shield(pending)
+
+    future = asyncio.get_running_loop().create_future()
+    _in_flight[key] = future
+    try:
+        response = await llm_gateway.generate_json(prompt, model_name)
+        await store_response(key, template, llm_client.cache_model_id(model_name), response)
+        future.set_result(response)
+        return response
+    except asyncio.CancelledError:
+        future.set_exception(llm_client.LLMError("Shared Gemini call was cancelled"))
+        future.exception()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Nobody may be waiting on it; don't log "exception never retrieved"
+        future.exception()
+        raise
+    finally:
+        del _in_flight[key]
+
+async def stream_json_cached(
+    template: str, version: int, inputs: Sequence[str], prompt: str,
+    is_valid: Optional[Callable[[Dict], bool]] = None, model_name: Optional[str] = None
+) -> AsyncIterator[Dict]:
+    """
+    Streaming generate_json_cached: yields the partial JSON object each time
+    another field or list item completes, and the complete object last.
+    A cache hit yields the complete object once. The final object (repaired if
+    the reply was fenced or cut off) is cached only if `is_valid` accepts it;
+    otherwise LLMError is raised. Not single-flighted, unlike generate_json_cached.
+    """
+    model_name = model_name or settings.gemini_model
+    key = llm_cache_key(llm_client.cache_model_id(model_name), template, version, inputs)
+
+    cached = await get_cached_response(key)
+    if cached is not None:
+        print(f"LLM cache hit: {template} {key[:12]}")
+        yield cached
+        return
+
+    parser = IncrementalJSONParser()
+    last = None
+    async for chunk in llm_gateway.stream_text(prompt, model_name):
+        if parser.feed(chunk):
+            partial = parser.partial()
+            if isinstance(partial, dict) and partial != last:
+                last = partial
+                yield partial
+
+    response = parser.result()
+    if not isinstance(response, dict) or (is_valid and not is_valid(response)):
+        raise llm_client.LLMError(f"Gemini returned an incomplete {template} response")
+    await store_response(key, template, llm_client.cache_model_id(model_name), response)
+    yield response
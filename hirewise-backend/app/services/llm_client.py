@@ -0,0 +1,198 @@
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from app.config import settings
+from app.utils.partial_json import repair_json
+from typing import AsyncIterator, Dict, Optional
+import abc
+import asyncio
+import json
+import time
+
+class LLMError(Exception):
+    """The LLM call failed or returned something unusable"""
+    # Transient backend trouble: worth retrying, and counted by the circuit breaker
+    retryable = False
+
+class LLMTimeoutError(LLMError):
+    """The LLM call did not finish within its timeout"""
+    retryable = True
+
+class LLMRateLimitError(LLMError):
+    """Gemini answered 429 / quota exhausted"""
+    retryable = True
+
+class LLMBackendError(LLMError):
+    """Gemini answered with a server-side error"""
+    retryable = True
+
+class LLMUnavailableError(LLMError):
+    """The call was not attempted (circuit open, queue full or rate limited locally)"""
+
+class LLMBackend(abc.ABC):
+    """
+    Where completions come from (selected with the `llm_backend` setting).
+    Implementations raise the LLMError subclasses above; `timeout` bounds the
+    whole call, and cancelling the awaiting task cancels the request.
+    """
+    name = 'base'
+
+    def is_configured(self) -> bool:
+        return True
+
+    def model_id(self, model_name: str) -> str:
+        """Model identity used in response cache keys"""
+        return model_name
+
+    @abc.abstractmethod
+    async def generate(self, prompt: str, model_name: str, timeout: float) -> str:
+        """The whole completion"""
+
+    @abc.abstractmethod
+    def stream(self, prompt: str, model_name: str, timeout: float) -> AsyncIterator[str]:
+        """The completion as text chunks, as they arrive"""
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through google-generativeai"""
+    name = 'gemini'
+
+    def __init__(self):
+        # Configure Gemini once per process
+        genai.configure(api_key=settings.gemini_api_key)
+        # Model name -> GenerativeModel; each model keeps its own async client
+        # (and its connection) for the life of the process
+        self._models: Dict[str, genai.GenerativeModel] = {}
+
+    def is_configured(self) -> bool:
+        return bool(settings.gemini_api_key) and settings.gemini_api_key != "your_gemini_api_key_here"
+
+    def get_model(self, model_name: str) -> genai.GenerativeModel:
+        """Shared GenerativeModel for this process"""
+        model = self._models.get(model_name)
+        if model is None:
+            model = genai.GenerativeModel(model_name)
+            self._models[model_name] = model
+        return model
+
+    async def generate(self, prompt: str, model_name: str, timeout: float) -> str:
+        model = self.get_model(model_name)
+        try:
+            response = await asyncio.wait_for(model.generate_content_async(prompt), timeout)
+        except Exception as e:
+            _raise_llm_error(e, timeout)
+
+        try:
+            return response.text.strip()
+        except ValueError as e:
+            # Raised when the response was blocked and has no text parts
+            raise LLMError(f"Gemini returned no text: {e}") from e
+
+    async def stream(self, prompt: str, model_name: str, timeout: float) -> AsyncIterator[str]:
+        model = self.get_model(model_name)
+        deadline = time.monotonic() + timeout
+        try:
+            response = await asyncio.wait_for(
+                model.generate_content_async(prompt, stream=True),
+                max(deadline - time.monotonic(), 0)
+            )
+            chunks = response.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), max(deadline - time.monotonic(), 0))
+                except StopAsyncIteration:
+                    return
+                try:
+                    text = chunk.text
+                except ValueError as e:
+                    raise LLMError(f"Gemini returned no text: {e}") from e
+                if text:
+                    yield text
+        except LLMError:
+            raise
+        except Exception as e:
+            _raise_llm_error(e, timeout)
+
+def _raise_llm_error(error: BaseException, timeout: float):
+    """Re-raise an exception from the Gemini SDK as the matching LLMError"""
+    if isinstance(error, asyncio.TimeoutError):
+        raise LLMTimeoutError(f"Gemini call timed out after {timeout}s")
+    if isinstance(error, google_exceptions.TooManyRequests):
+        raise LLMRateLimitError(f"Gemini rate limited: {error}") from error
+    if isinstance(error, (google_exceptions.ServerError, google_exceptions.DeadlineExceeded)):
+        raise LLMBackendError(f"Gemini backend error: {error}") from error
+    raise LLMError(f"Gemini call failed: {error}") from error
+
+_backend: Optional[LLMBackend] = None
+
+def get_backend() -> LLMBackend:
+    """The process-wide LLM backend chosen by `llm_backend` ("gemini" or "fake")"""
+    global _backend
+    if _backend is None:
+        if settings.llm_backend == 'fake':
+            from app.services.fake_llm import FakeLLMBackend
+            _backend = FakeLLMBackend()
+        elif settings.llm_backend == 'gemini':
+            _backend = GeminiBackend()
+        else:
+            raise ValueError(f"Unknown llm_backend: {settings.llm_backend}")
+        print(f"LLM backend: {_backend.name}")
+    return _backend
+
+def is_configured() -> bool:
+    return get_backend().is_configured()
+
+def cache_model_id(model_name: Optional[str] = None) -> str:
+    """Model identity for cache keys, so e.g. fake responses never mix with real ones"""
+    return get_backend().model_id(model_name or settings.gemini_model)
+
+async def generate_text(
+    prompt: str, model_name: Optional[str] = None, timeout: Optional[float] = None
+) -> str:
+    """
+    Generate a completion without blocking the event loop.
+    Cancelling the awaiting task cancels the request; raises LLMTimeoutError
+    after `timeout` seconds (llm_timeout by default) and LLMError otherwise.
+    """
+    backend = get_backend()
+    if not backend.is_configured():
+        raise LLMError("Gemini API key not configured")
+    return await backend.generate(prompt, model_name or settings.gemini_model, timeout or settings.llm_timeout)
+
+async def stream_text(
+    prompt: str, model_name: Optional[str] = None, timeout: Optional[float] = None
+) -> AsyncIterator[str]:
+    """
+    Stream a completion chunk by chunk; `timeout` bounds the whole generation.
+    Errors are mapped as in generate_text.
+    """
+    backend = get_backend()
+    if not backend.is_configured():
+        raise LLMError("Gemini API key not configured")
+    async for chunk in backend.stream(prompt, model_name or settings.gemini_model, timeout or settings.llm_timeout):
+        yield chunk
+
+def parse_json_response(response_text: str) -> Dict:
+    """
+    Parse a JSON reply, removing markdown code fences if present and
+    repairing trailing commas or a truncated ending
+    """
+    response_text = response_text.strip()
+    if response_text.startswith('```'):
+        response_text = response_text.split('```')[1]
+        if response_text.startswith('json'):
+            response_text = response_text[4:]
+
+    try:
+        return json.loads(response_text)
+    except json.JSONDecodeError as e:
+        error = e
+
+    try:
+        return repair_json(response_text)
+    except ValueError:
+        raise LLMError(f"Gemini returned invalid JSON: {error}") from error
+
+async def generate_json(
+    prompt: str, model_name: Optional[str] = None, timeout: Optional[float] = None
+) -> Dict:
+    """Generate a completion and parse it as JSON"""
+    return parse_json_response(await generate_text(prompt, model_name, timeout))
@@ -0,0 +1,282 @@
+from app.config import settings
+from app.services import llm_client
+from app.services.llm_client import LLMError, LLMUnavailableError
+from typing import AsyncIterator, Dict, Optional
+import asyncio
+import random
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` tokens per second"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> float:
+        """Take a token; returns 0 on success, else seconds until one is available"""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for a token"""
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire()
+            if wait == 0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for
+    `cooldown` seconds, then lets a single probe through (half-open): success
+    closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return CLOSED
+        if time.monotonic() - self._opened_at >= self.cooldown:
+            return HALF_OPEN
+        return OPEN
+
+    def allow(self) -> bool:
+        """Whether a call may go out now (claims the probe slot when half-open)"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def end_probe(self):
+        self._probing = False
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self._probing or self.consecutive_failures >= self.failure_threshold:
+            if self.state == CLOSED:
+                print(f"LLM circuit opened after {self.consecutive_failures} consecutive failure(s)")
+            self._opened_at = time.monotonic()
+            self._probing = False
+
+class LLMGateway:
+    """
+    Admission control in front of the Gemini client for this process:
+    a token bucket matched to the quota, a cap on calls in flight, a bounded
+    wait queue, a circuit breaker, and retries/hedging with jitter.
+    """
+
+    def __init__(self):
+        self.bucket = TokenBucket(settings.llm_rate_per_minute / 60.0, settings.llm_burst)
+        self.breaker = CircuitBreaker(settings.llm_breaker_failures, settings.llm_breaker_cooldown)
+        self.max_in_flight = settings.llm_max_in_flight
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self.in_flight = 0
+        self.waiting = 0
+        self.counters = {'calls': 0, 'rejected': 0, 'retries': 0, 'hedged': 0, 'failures': 0}
+
+    async def _admit(self):
+        """Wait for an in-flight slot and a rate token, or fail fast when overloaded"""
+        deadline = time.monotonic() + settings.llm_queue_timeout
+
+        if self._slots.locked():
+            if self.waiting >= settings.llm_max_queue:
+                self.counters['rejected'] += 1
+                raise LLMUnavailableError("LLM queue is full")
+
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), settings.llm_queue_timeout)
+            except asyncio.TimeoutError:
+                self.counters['rejected'] += 1
+                raise LLMUnavailableError("Timed out waiting for an LLM slot")
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+
+        try:
+            got_token = await self.bucket.acquire(max(deadline - time.monotonic(), 0))
+        except BaseException:
+            self._slots.release()
+            raise
+        if not got_token:
+            self._slots.release()
+            self.counters['rejected'] += 1
+            raise LLMUnavailableError("LLM rate limit reached")
+
+    async def _attempt(self, prompt: str, model_name: Optional[str], timeout: Optional[float]) -> str:
+        await self._admit()
+        self.in_flight += 1
+        try:
+            text = await llm_client.generate_text(prompt, model_name, timeout)
+        except LLMError as e:
+            if e.retryable:
+                self.counters['failures'] += 1
+                self.breaker.record_failure()
+            raise
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+        self.breaker.record_success()
+        return text
+
+    async def _hedged(self, prompt: str, model_name: Optional[str], timeout: Optional[float]) -> str:
+        """
+        One attempt; if it is still running after llm_hedge_delay and there is
+        spare capacity, race a second one and keep whichever answers first
+        """
+        first = asyncio.create_task(self._attempt(prompt, model_name, timeout))
+        if settings.llm_hedge_delay <= 0:
+            return await first
+
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=settings.llm_hedge_delay)
+            if not done and self.waiting == 0 and self.in_flight < self.max_in_flight:
+                self.counters['hedged'] += 1
+                tasks.add(asyncio.create_task(self._attempt(prompt, model_name, timeout)))
+
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def generate_text(
+        self, prompt: str, model_name: Optional[str] = None, timeout: Optional[float] = None
+    ) -> str:
+        """Gemini completion through the gateway; raises LLMUnavailableError when shedding load"""
+        self.counters['calls'] += 1
+        was_half_open = self.breaker.state == HALF_OPEN
+        if not self.breaker.allow():
+            self.counters['rejected'] += 1
+            raise LLMUnavailableError("LLM circuit is open")
+
+        try:
+            for attempt in range(1, settings.llm_max_attempts + 1):
+                try:
+                    return await self._hedged(prompt, model_name, timeout)
+                except LLMError as e:
+                    if not e.retryable or attempt == settings.llm_max_attempts or self.breaker.state != CLOSED:
+                        raise
+                    # Exponential backoff with full jitter
+                    self.counters['retries'] += 1
+                    await asyncio.sleep(random.uniform(0, settings.llm_retry_base_delay * (2 ** (attempt - 1))))
+        finally:
+            if was_half_open:
+                self.breaker.end_probe()
+
+    async def stream_text(
+        self, prompt: str, model_name: Optional[str] = None, timeout: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """
+        Streamed completion through the gateway. Retried like generate_text until
+        the first chunk arrives, but never hedged (chunks are already on their way)
+        """
+        self.counters['calls'] += 1
+        was_half_open = self.breaker.state == HALF_OPEN
+        if not self.breaker.allow():
+            self.counters['rejected'] += 1
+            raise LLMUnavailableError("LLM circuit is open")
+
+        try:
+            for attempt in range(1, settings.llm_max_attempts + 1):
+                started = False
+                await self._admit()
+                self.in_flight += 1
+                try:
+                    async for chunk in llm_client.stream_text(prompt, model_name, timeout):
+                        started = True
+                        yield chunk
+                except LLMError as e:
+                    if e.retryable:
+                        self.counters['failures'] += 1
+                        self.breaker.record_failure()
+                    if started or not e.retryable or attempt == settings.llm_max_attempts or self.breaker.state != CLOSED:
+                        raise
+                else:
+                    self.breaker.record_success()
+                    return
+                finally:
+                    self.in_flight -= 1
+                    self._slots.release()
+
+                self.counters['retries'] += 1
+                await asyncio.sleep(random.uniform(0, settings.llm_retry_base_delay * (2 ** (attempt - 1))))
+        finally:
+            if was_half_open:
+                self.breaker.end_probe()
+
+    def stats(self) -> Dict:
+        self.bucket._refill()
+        return {
+            'breaker': self.breaker.state,
+            'consecutive_failures': self.breaker.consecutive_failures,
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'queue_depth': self.waiting,
+            'tokens_available': round(self.bucket.tokens, 2),
+            **self.counters
+        }
+
+_gateway: Optional[LLMGateway] = None
+
+def get_gateway() -> LLMGateway:
+    global _gateway
+    if _gateway is None:
+        _gateway = LLMGateway()
+    return _gateway
+
+def get_gateway_stats() -> Dict:
+    """Queue depth, in-flight calls and breaker state for this process"""
+    return get_gateway().stats()
+
+async def generate_text(prompt: str, model_name: Optional[str] = None, timeout: Optional[float] = None) -> str:
+    return await get_gateway().generate_text(prompt, model_name, timeout)
+
+def stream_text(prompt: str, model_name: Optional[str] = None, timeout: Optional[float] = None) -> AsyncIterator[str]:
+    return get_gateway().stream_text(prompt, model_name, timeout)
+
+async def generate_json(prompt: str, model_name: Optional[str] = None, timeout: Optional[float] = None) -> Dict:
+    """Gateway-controlled generate_text, parsed as JSON"""
+    return llm_client.parse_json_response(await generate_text(prompt, model_name, timeout))
@@ -0,0 +1,26 @@
+"""
+Shared pieces of the two-tier caches (extraction_cache, llm_cache,
+jd_feature_cache): each keeps an in-process LRUCache in front of a MongoDB
+collection whose documents expire through a TTL index and, where the
+collection is size-bounded, are evicted least recently used first.
+"""
+from datetime import datetime, timedelta
+from typing import Dict
+
+def is_expired(doc: Dict, ttl_seconds: int, field: str = "last_used_at") -> bool:
+    """
+    Whether a cached document has outlived its TTL. MongoDB's TTL monitor only
+    runs every 60s, so an expired document can still be returned by a query.
+    """
+    return doc[field] + timedelta(seconds=ttl_seconds) < datetime.utcnow()
+
+async def trim_lru_collection(collection, max_documents: int, field: str = "last_used_at"):
+    """Evict least recently used documents once the collection exceeds max_documents"""
+    overflow = await collection.estimated_document_count() - max_documents
+    if overflow <= 0:
+        return
+
+    stale = collection.find({}, {"_id": 1}).sort(field, 1).limit(overflow)
+    stale_ids = [doc["_id"] async for doc in stale]
+    if stale_ids:
+        await collection.delete_many({"_id": {"$in": stale_ids}})
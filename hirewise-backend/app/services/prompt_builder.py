@@ -0,0 +1,251 @@
+"""
+Prompt-builder stage: instead of sending the first N characters of a resume
+or JD, segment it, drop noise (contact details, repeated lines, extra
+whitespace) and pack the most relevant content into a token budget.
+"""
+from app.services.llm_batching import estimate_tokens
+from app.utils.resume_features import SECTION_PATTERNS, BULLET_INDICATORS, extract_terms, extract_skill_ids, YEARS_PATTERN
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+from typing import Dict, List, Optional, Set
+import math
+import re
+
+# Headings that start a section; contact details are dropped entirely
+_HEADINGS = {
+    **{name: re.compile(pattern) for name, pattern in SECTION_PATTERNS.items() if name != 'contact'},
+    'contact': re.compile(r'contact|personal (?:details|information)'),
+}
+_HEADING_MAX_WORDS = 4
+
+# How much each section is worth when there is no JD to rank against
+SECTION_WEIGHTS = {
+    'skills': 3.0, 'experience': 3.0, 'summary': 2.5, 'projects': 2.0,
+    'certifications': 1.5, 'education': 1.5, 'header': 1.0
+}
+
+_SPACES = re.compile(r'[ \t ]+')
+_CONTACT = re.compile(
+    r'[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}'           # email
+    r'|(?:https?://|www\.)\S+|\b(?:linkedin|github)\.com/\S*'  # links
+    r'|\b(?:e-?mail|phone|mobile|tel|linkedin|github)\s*:',      # their labels
+    re.IGNORECASE
+)
+# Digit runs with separators; only dropped when long enough to be a phone
+# number (so "2019 - 2023" survives)
+_PHONE_CANDIDATE = re.compile(r'\+?\d[\d\s().-]{6,}\d')
+_UNIT_MAX_CHARS = 300
+_SENTENCE_END = re.compile(r'(?<=[.!?;])\s+')
+_OMITTED = "[...]"
+
+# JD lines that are about the job rather than the company or legalese
+_REQUIREMENT_HINTS = re.compile(r'experience|required|requirement|must|responsib|qualif|proficien|knowledge|familiar|degree')
+_BOILERPLATE_HINTS = re.compile(r'equal opportunity|benefits|salary|about us|apply|eeo|diversity|perks|we offer')
+
+def _clean_line(raw: str) -> str:
+    return _SPACES.sub(' ', raw).strip()
+
+def _strip_contact(line: str) -> str:
+    line = _CONTACT.sub('', line)
+    return _PHONE_CANDIDATE.sub(
+        lambda match: '' if sum(char.isdigit() for char in match.group()) >= 10 else match.group(), line
+    )
+
+def _heading_name(line: str) -> Optional[str]:
+    """Section name if the line looks like a heading ("Technical Skills:", "EXPERIENCE")"""
+    words = line.rstrip(':').split()
+    if not words or len(words) > _HEADING_MAX_WORDS or line[0] in BULLET_INDICATORS:
+        return None
+    if any(char.isdigit() for char in line) or line.endswith('.'):
+        return None
+    lower = line.lower()
+    for name, pattern in _HEADINGS.items():
+        if pattern.search(lower):
+            return name
+    return None
+
+def _split_long_line(line: str) -> List[str]:
+    """
+    A line as unit-sized pieces: its sentences, hard-wrapped at word boundaries
+    if still too long (some PDFs extract as one very long line)
+    """
+    if len(line) <= _UNIT_MAX_CHARS:
+        return [line]
+    pieces = []
+    for sentence in _SENTENCE_END.split(line):
+        while len(sentence) > _UNIT_MAX_CHARS:
+            cut = sentence.rfind(' ', 0, _UNIT_MAX_CHARS)
+            if cut <= 0:
+                cut = _UNIT_MAX_CHARS
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if sentence:
+            pieces.append(sentence)
+    return pieces
+
+def segment_resume(text: str) -> List[Dict]:
+    """
+    Split a resume into sections of content units (a bullet or a short
+    paragraph each). Contact details and lines repeated across pages are
+    dropped, and a heading seen again continues its earlier section.
+    """
+    sections = [{'name': 'header', 'heading': None, 'units': []}]
+    by_name = {'header': sections[0]}
+    current = sections[0]
+    seen: Set[str] = set()
+    unit: List[str] = []
+
+    def flush():
+        if unit:
+            current['units'].append(' '.join(unit))
+            unit.clear()
+
+    for raw in text.splitlines():
+        line = _clean_line(raw)
+        if not line:
+            flush()
+            continue
+
+        name = _heading_name(line)
+        if name:
+            flush()
+            current = by_name.get(name)
+            if current is None:
+                current = {'name': name, 'heading': line.rstrip(':'), 'units': []}
+                by_name[name] = current
+                sections.append(current)
+            continue
+        if current['name'] == 'contact':
+            continue
+
+        line = _clean_line(_strip_contact(line)).strip('|,;·• ')
+        if not line:
+            continue
+        if len(line) > 3:
+            key = line.lower()
+            if key in seen:
+                continue
+            seen.add(key)
+        # Name/location lines above the first heading carry nothing to analyse
+        if current['name'] == 'header' and len(line.split()) <= _HEADING_MAX_WORDS:
+            continue
+
+        for piece in _split_long_line(line):
+            if piece[0] in BULLET_INDICATORS or sum(len(part) for part in unit) > _UNIT_MAX_CHARS:
+                flush()
+            unit.append(piece)
+    flush()
+
+    return [section for section in sections if section['units'] or section['heading']]
+
+def jd_terms(jd: str) -> Set[str]:
+    """Content words of a JD, used to rank resume units by relevance"""
+    return {term for term in extract_terms(jd.lower()) if term not in ENGLISH_STOP_WORDS and len(term) > 1}
+
+def _unit_score(section: str, position: int, text: str, terms: Optional[Set[str]]) -> float:
+    score = SECTION_WEIGHTS.get(section, 1.0) - 0.05 * position
+    if terms:
+        lower = text.lower()
+        unit_terms = extract_terms(lower)
+        overlap = len(unit_terms & terms)
+        score += 4.0 * overlap / math.sqrt(len(unit_terms) or 1)
+        score += 1.5 * len(extract_skill_ids(lower))
+    return score
+
+def _render(sections: List[Dict], chosen: Set[tuple]) -> str:
+    lines = []
+    for s_index, section in enumerate(sections):
+        kept = [unit for u_index, unit in enumerate(section['units']) if (s_index, u_index) in chosen]
+        if not kept and not section['heading']:
+            continue
+        if section['heading']:
+            lines.append(section['heading'].upper())
+        lines.extend(kept)
+        if len(kept) < len(section['units']):
+            lines.append(_OMITTED)
+    return '\n'.join(lines)
+
+def compress_resume(text: str, token_budget: int, terms: Optional[Set[str]] = None) -> str:
+    """
+    The resume content that fits `token_budget`, ranked by section and, when
+    `terms` (see jd_terms) are given, by relevance to the JD. Every section
+    keeps its heading and best unit so the model still sees what exists;
+    output stays in document order with "[...]" where units were left out.
+    """
+    sections = segment_resume(text)
+    units = [
+        (s_index, u_index, unit)
+        for s_index, section in enumerate(sections)
+        for u_index, unit in enumerate(section['units'])
+    ]
+    if not units:
+        return _clean_line(text)[:token_budget * 4]
+
+    chosen = {(s_index, u_index) for s_index, u_index, _ in units}
+    if estimate_tokens(_render(sections, chosen)) <= token_budget:
+        return _render(sections, chosen)
+
+    scores = {
+        (s_index, u_index): _unit_score(sections[s_index]['name'], u_index, unit, terms)
+        for s_index, u_index, unit in units
+    }
+    cost = {(s_index, u_index): estimate_tokens(unit) for s_index, u_index, unit in units}
+    # Headings plus an omission marker per section
+    used = sum(estimate_tokens(section['heading'] or '') + 2 for section in sections)
+
+    chosen = set()
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    # Coverage pass: the best unit of every section, then the rest by score
+    best_per_section = {}
+    for key in ranked:
+        best_per_section.setdefault(key[0], key)
+    for key in list(best_per_section.values()) + ranked:
+        if key not in chosen and used + cost[key] <= token_budget:
+            chosen.add(key)
+            used += cost[key]
+
+    if not chosen:
+        # Not even one unit fits: plain truncation beats sending headings only
+        return _clean_line(text)[:token_budget * 4]
+    return _render(sections, chosen)
+
+def _jd_line_score(line: str) -> float:
+    lower = line.lower()
+    score = 2.0 * len(extract_skill_ids(lower))
+    if YEARS_PATTERN.search(lower):
+        score += 2.0
+    if _REQUIREMENT_HINTS.search(lower):
+        score += 1.0
+    if line[0] in BULLET_INDICATORS:
+        score += 0.5
+    if _BOILERPLATE_HINTS.search(lower):
+        score -= 3.0
+    return score
+
+def compress_job_description(jd: str, token_budget: int) -> str:
+    """
+    The JD lines that fit `token_budget`, preferring requirements (skills,
+    years, "must have") over company blurb and legal boilerplate
+    """
+    lines = []
+    seen: Set[str] = set()
+    for raw in jd.splitlines():
+        line = _clean_line(raw)
+        if line and line.lower() not in seen:
+            seen.add(line.lower())
+            lines.append(line)
+
+    if estimate_tokens('\n'.join(lines)) <= token_budget:
+        return '\n'.join(lines)
+
+    order = sorted(range(len(lines)), key=lambda i: (_jd_line_score(lines[i]), -i), reverse=True)
+    chosen = set()
+    used = 0
+    for index in order:
+        cost = estimate_tokens(lines[index]) + 1
+        if used + cost <= token_budget:
+            chosen.add(index)
+            used += cost
+
+    if not chosen:
+        return lines[0][:token_budget * 4] if lines else ''
+    return '\n'.join(lines[i] for i in sorted(chosen))
@@ -0,0 +1,407 @@
+"""
+Inverted index over stored resumes for recruiter search (one JD, best resumes).
+
+Postings map a normalized term (word tokens without stop words, plus
+"skill:<name>" for each detected tech skill) to compact arrays of internal
+document ids and term frequencies. Candidates are the union of the JD terms'
+postings, optionally intersected with required skills, scored with BM25; only
+the top ones are reranked with the JDMatcher formula. Skills are the canonical
+taxonomy skills stored in each resume's feature record at ingest, so an alias in the JD or in
+required_skills finds every spelling.
+
+The index lives in each process, is snapshotted to models_dir and catches up
+from MongoDB incrementally: resumes with a newer _id are added and
+`resume_deletions` tombstones (written by the delete endpoint) removed.
+"""
+from app.config import settings
+from app.database import ensure_ttl_index
+from app.services.embeddings import embed_texts
+from app.services.feature_store import features_from_record
+from app.services.jd_feature_cache import get_jd_features
+from app.services.jd_matcher_service import JDMatcher
+from app.services.vector_store import RESUMES, get_vector_store, vector_search_enabled
+from app.utils.keyword_matcher import tokenize
+from app.utils.resume_features import analyze_resume, extract_skill_ids
+from app.utils.skill_taxonomy import TAXONOMY, VERSION_FIELD, stored_skill_ids
+from array import array
+from bson import ObjectId
+from collections import Counter
+from datetime import datetime, timedelta
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import joblib
+import math
+import numpy as np
+import os
+
+SNAPSHOT_FILE = "resume_index.joblib"
+SKILL_PREFIX = "skill:"
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Compact postings once this share of indexed documents has been deleted
+_COMPACT_RATIO = 0.2
+# Inserts from other processes may carry slightly older ObjectIds; rescan this far back
+_SYNC_OVERLAP = timedelta(minutes=2)
+_MAX_TF = 65535
+# On large collections, terms in more than this share of resumes are skipped once
+# there are enough candidates: their BM25 idf is small but their postings are the
+# longest to score
+_MAX_DF_RATIO = 0.25
+_MAX_DF_MIN_DOCUMENTS = 1000
+
+def index_terms(text: str, skill_ids: Optional[Iterable[int]] = None) -> Counter:
+    """Term frequencies of a document (or JD) as indexed (skill_ids: as stored at ingest)"""
+    text_lower = text.lower()
+    terms = Counter(
+        term for term in (token.rstrip('+#') for token in tokenize(text_lower))
+        if len(term) > 1 and (term[0].isalnum() or term[0] == '_') and term not in ENGLISH_STOP_WORDS
+    )
+    if skill_ids is None:
+        skill_ids = extract_skill_ids(text_lower)
+    for skill in TAXONOMY.skill_names(skill_ids):
+        terms[SKILL_PREFIX + skill] = 1
+    return terms
+
+def required_terms(skills: Iterable[str]) -> Set[str]:
+    """
+    Index terms a resume must have for each required skill: "k8s" -> skill:kubernetes,
+    "terraform" -> terraform if the taxonomy does not know it
+    """
+    required = set()
+    for skill in skills:
+        skill_id = TAXONOMY.lookup(skill)
+        if skill_id is not None:
+            required.add(SKILL_PREFIX + TAXONOMY.names[skill_id])
+        else:
+            required.update(index_terms(skill))
+    return required
+
+class ResumeIndex:
+    """In-memory BM25 index; not thread-safe, mutate from the event loop only"""
+
+    def __init__(self):
+        self.resume_ids: List[str] = []          # internal id -> resume _id
+        self.positions: Dict[str, int] = {}      # resume _id -> internal id
+        self.lengths = array('I')
+        self.live = bytearray()
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.live_count = 0
+        self.total_length = 0
+        self.deleted = 0
+        # Sync cursors
+        self.last_id: Optional[ObjectId] = None
+        self.synced_at: Optional[datetime] = None
+        # Skill terms are only valid for the taxonomy they were indexed with
+        self.taxonomy_version = TAXONOMY.version
+
+    def add(self, resume_id: str, text: str, skill_ids: Optional[Iterable[int]] = None):
+        if resume_id in self.positions:
+            return
+        terms = index_terms(text, skill_ids)
+        doc = len(self.resume_ids)
+        self.resume_ids.append(resume_id)
+        self.positions[resume_id] = doc
+        length = sum(terms.values())
+        self.lengths.append(length)
+        self.live.append(1)
+        self.live_count += 1
+        self.total_length += length
+        for term, tf in terms.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = (array('I'), array('H'))
+                self.postings[term] = postings
+            postings[0].append(doc)
+            postings[1].append(min(tf, _MAX_TF))
+
+    def remove(self, resume_id: str):
+        """Tombstone a document; its postings go at the next compaction"""
+        doc = self.positions.pop(resume_id, None)
+        if doc is None or not self.live[doc]:
+            return
+        self.live[doc] = 0
+        self.live_count -= 1
+        self.total_length -= self.lengths[doc]
+        self.deleted += 1
+        if self.deleted > _COMPACT_RATIO * len(self.resume_ids):
+            self.compact()
+
+    def compact(self):
+        """Drop deleted documents and renumber the rest"""
+        keep = np.frombuffer(bytes(self.live), dtype=np.uint8).astype(bool)
+        remap = np.cumsum(keep) - 1
+        postings = {}
+        for term, (docs, tfs) in self.postings.items():
+            docs_np = np.frombuffer(docs, dtype=np.uint32)
+            mask = keep[docs_np]
+            if mask.any():
+                postings[term] = (
+                    array('I', remap[docs_np[mask]].astype(np.uint32).tobytes()),
+                    array('H', np.frombuffer(tfs, dtype=np.uint16)[mask].tobytes())
+                )
+        self.resume_ids = [resume_id for resume_id, alive in zip(self.resume_ids, keep) if alive]
+        self.positions = {resume_id: doc for doc, resume_id in enumerate(self.resume_ids)}
+        self.lengths = array('I', np.frombuffer(self.lengths, dtype=np.uint32)[keep].tobytes())
+        self.live = bytearray(b'\x01' * len(self.resume_ids))
+        self.postings = postings
+        self.deleted = 0
+
+    def search(
+        self, terms: Iterable[str], limit: int, required: Iterable[str] = (), only: Optional[Iterable[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Top `limit` (resume _id, BM25 score) for the query terms. Candidates
+        are the union of the terms' postings; with `required` terms only
+        documents in the intersection of their postings are kept, and with
+        `only` only those resume _ids.
+        """
+        if not self.live_count or limit < 1:
+            return []
+        count = len(self.resume_ids)
+        lengths = np.frombuffer(self.lengths, dtype=np.uint32)
+        average_length = self.total_length / self.live_count or 1.0
+        scores = np.zeros(count)
+        required = set(required)
+        allowed = None
+        if only is not None:
+            allowed = np.zeros(count, dtype=bool)
+            allowed[[self.positions[resume_id] for resume_id in only if resume_id in self.positions]] = True
+        # Skipping common terms assumes the whole collection is competing; not so when restricted
+        max_df = (
+            _MAX_DF_RATIO * self.live_count
+            if self.live_count >= _MAX_DF_MIN_DOCUMENTS and allowed is None else count
+        )
+
+        # Rarest terms first; common ones only while there are too few candidates
+        query = sorted(
+            (term for term in set(terms) | required if term in self.postings),
+            key=lambda term: len(self.postings[term][0])
+        )
+        enough = False
+        for term in query:
+            docs, tfs = self.postings[term]
+            df = len(docs)
+            if df > max_df and term not in required:
+                enough = enough or np.count_nonzero(scores) >= limit
+                if enough:
+                    continue
+            docs = np.frombuffer(docs, dtype=np.uint32)
+            tfs = np.frombuffer(tfs, dtype=np.uint16).astype(np.float64)
+            idf = math.log(1 + (self.live_count - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[docs] / average_length)
+            # Each document appears once per posting list, so plain fancy-index add is safe
+            scores[docs] += idf * tfs * (BM25_K1 + 1) / (tfs + norm)
+
+        mask = np.frombuffer(bytes(self.live), dtype=np.uint8).astype(bool) & (scores > 0)
+        for term in required:
+            postings = self.postings.get(term)
+            in_postings = np.zeros(count, dtype=bool)
+            if postings is not None:
+                in_postings[np.frombuffer(postings[0], dtype=np.uint32)] = True
+            mask &= in_postings
+        if allowed is not None:
+            mask &= allowed
+
+        candidates = np.flatnonzero(mask)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(self.resume_ids[doc], float(scores[doc])) for doc in candidates]
+
+    def stats(self) -> Dict:
+        return {
+            'documents': self.live_count,
+            'terms': len(self.postings),
+            'deleted_pending': self.deleted,
+            'synced_at': self.synced_at.isoformat() if self.synced_at else None
+        }
+
+_index = ResumeIndex()
+_sync_lock = asyncio.Lock()
+_changes_since_snapshot = 0
+
+def snapshot_path() -> str:
+    return os.path.join(settings.models_dir, SNAPSHOT_FILE)
+
+def get_resume_index_stats() -> Dict:
+    return _index.stats()
+
+async def ensure_resume_index_indexes(db):
+    """Tombstones only need to outlive the snapshot they are replayed onto"""
+    await ensure_ttl_index(db.resume_deletions, "deleted_at", settings.resume_index_tombstone_ttl)
+
+async def record_resume_deletion(db, resume_id: str):
+    """Tell every process's index (at its next sync) that a resume is gone"""
+    await db.resume_deletions.insert_one({"resume_id": resume_id, "deleted_at": datetime.utcnow()})
+
+def load_resume_index() -> bool:
+    """Load the snapshot if one exists and its deletions can still be replayed"""
+    global _index
+    path = snapshot_path()
+    if not os.path.exists(path):
+        return False
+    try:
+        saved = joblib.load(path)
+    except Exception as e:
+        print(f"Could not load resume index from {path}: {e}")
+        return False
+    tombstone_horizon = datetime.utcnow() - timedelta(seconds=settings.resume_index_tombstone_ttl)
+    if saved.synced_at is None or saved.synced_at < tombstone_horizon:
+        print("Resume index snapshot is older than the deletion log, rebuilding")
+        return False
+    if getattr(saved, 'taxonomy_version', None) != TAXONOMY.version:
+        print("Resume index snapshot was built with another skill taxonomy, rebuilding")
+        return False
+    _index = saved
+    print(f"Resume index loaded: {_index.live_count} resumes, {len(_index.postings)} terms")
+    return True
+
+def _save(index: ResumeIndex):
+    """Write atomically so other processes never load a half-written file"""
+    os.makedirs(settings.models_dir, exist_ok=True)
+    path = snapshot_path()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(index, tmp_path)
+    os.replace(tmp_path, path)
+
+async def sync_resume_index(db) -> int:
+    """Apply resumes inserted and deleted since the last sync; returns the number of changes"""
+    global _changes_since_snapshot
+    async with _sync_lock:
+        started = datetime.utcnow()
+        changes = 0
+
+        query = {}
+        if _index.last_id is not None:
+            query["_id"] = {"$gt": ObjectId.from_datetime(_index.last_id.generation_time - _SYNC_OVERLAP)}
+        cursor = db.resumes.find(
+            query, {"extracted_text": 1, "features.skill_ids": 1, f"features.{VERSION_FIELD}": 1}
+        ).sort("_id", 1)
+        async for doc in cursor:
+            resume_id = str(doc['_id'])
+            if doc.get('extracted_text') and resume_id not in _index.positions:
+                _index.add(resume_id, doc['extracted_text'], stored_skill_ids(doc.get('features') or {}))
+                changes += 1
+            if _index.last_id is None or doc['_id'] > _index.last_id:
+                _index.last_id = doc['_id']
+            if changes and changes % 100 == 0:
+                # Indexing is CPU-bound; let other requests in during a bulk catch-up
+                await asyncio.sleep(0)
+
+        if _index.synced_at is not None:
+            since = _index.synced_at - _SYNC_OVERLAP
+            async for doc in db.resume_deletions.find({"deleted_at": {"$gte": since}}, {"resume_id": 1}):
+                if doc['resume_id'] in _index.positions:
+                    _index.remove(doc['resume_id'])
+                    changes += 1
+
+        _index.synced_at = started
+        _changes_since_snapshot += changes
+
+    if changes:
+        print(f"Resume index synced: {changes} change(s), {_index.live_count} resumes")
+    return changes
+
+async def save_resume_index():
+    """Snapshot the index if it changed since the last snapshot"""
+    global _changes_since_snapshot
+    if not _changes_since_snapshot:
+        return
+    # Hold the sync lock so the index is not mutated while it is pickled
+    async with _sync_lock:
+        _changes_since_snapshot = 0
+        await asyncio.to_thread(_save, _index)
+
+async def sync_resume_index_periodically(db):
+    """Keep the index current for recruiter queries and snapshot it now and then"""
+    while True:
+        try:
+            await sync_resume_index(db)
+            if _changes_since_snapshot >= settings.resume_index_snapshot_changes:
+                await save_resume_index()
+        except Exception as e:
+            print(f"Resume index sync failed: {e}")
+        await asyncio.sleep(settings.resume_index_sync_interval)
+
+async def search_resumes(
+    db, job_description: str, top_k: int, required_skills: Optional[List[str]] = None,
+    user_id: Optional[str] = None
+) -> List[Dict]:
+    """
+    Best stored resumes for a JD: the top resume_index_rerank BM25 candidates
+    (plus as many nearest neighbours from the vector store when embeddings are
+    on), rescored with the JDMatcher formula. With `user_id`, only that user's resumes.
+    Returns dicts with 'resume', 'bm25' and 'result' (a heuristic match).
+    """
+    # Catch up first, unless a bulk catch-up is already running (then use what is indexed)
+    if not _sync_lock.locked():
+        await sync_resume_index(db)
+    own = None
+    if user_id is not None:
+        own = {str(doc['_id']) async for doc in db.resumes.find({"user_id": user_id}, {"_id": 1})}
+        if not own:
+            return []
+    required = required_terms(required_skills or [])
+    candidates = _index.search(
+        index_terms(job_description), max(settings.resume_index_rerank, top_k), required, own
+    )
+
+    # Add the nearest resumes by meaning, which BM25 misses when wording differs
+    jd_vector = None
+    if vector_search_enabled():
+        jd_vector = (await asyncio.to_thread(embed_texts, [job_description]))[0]
+        lexical = {resume_id for resume_id, _ in candidates}
+        candidates += [
+            (resume_id, 0.0)
+            for resume_id, _ in get_vector_store(RESUMES).search(jd_vector, settings.resume_index_rerank)
+            if resume_id not in lexical and (own is None or resume_id in own)
+        ]
+    if not candidates:
+        return []
+
+    resumes = {}
+    cursor = db.resumes.find(
+        {"_id": {"$in": [ObjectId(resume_id) for resume_id, _ in candidates]}},
+        {"user_id": 1, "file_name": 1, "uploaded_at": 1, "extracted_text": 1, "features": 1}
+    )
+    async for doc in cursor:
+        resumes[str(doc['_id'])] = doc
+
+    embedding_similarity = {}
+    if jd_vector is not None:
+        found, vectors = get_vector_store(RESUMES).get(list(resumes))
+        embedding_similarity = dict(zip(found, (float(score) for score in vectors @ jd_vector)))
+
+    # Scoring a few hundred resumes is CPU-bound; keep the event loop free
+    jd_features = await get_jd_features(db, job_description)
+    ranked = await asyncio.to_thread(
+        _rerank, job_description, jd_features, candidates, resumes, embedding_similarity
+    )
+    return ranked[:top_k]
+
+def _rerank(
+    job_description: str, jd_features: Dict, candidates: List[Tuple[str, float]], resumes: Dict[str, Dict],
+    embedding_similarity: Dict[str, float]
+) -> List[Dict]:
+    matcher = JDMatcher()
+    ranked = []
+    for resume_id, bm25 in candidates:
+        resume = resumes.get(resume_id)
+        if resume is None:
+            # Deleted by another process since our last sync
+            continue
+        text = resume.pop('extracted_text', None) or ''
+        # Stored at upload; resumes without a current record are analyzed here
+        features = features_from_record(resume.pop('features', None)) or analyze_resume(text)
+        semantic_score = matcher.calculate_semantic_similarity(
+            text, job_description, embedding_similarity.get(resume_id),
+            features.get('tfidf_counts'), jd_features['tfidf_counts']
+        )
+        ranked.append({
+            'resume': resume,
+            'bm25': bm25,
+            'result': matcher.score_match(features, jd_features, semantic_score)
+        })
+    ranked.sort(key=lambda item: item['result']['match_score'], reverse=True)
+    return ranked
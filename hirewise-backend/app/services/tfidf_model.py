@@ -0,0 +1,191 @@
+"""
+Corpus-level TF-IDF model for resume/JD similarity.
+
+The vocabulary and IDF are fitted offline over stored resumes (extraction
+cache) and job descriptions, persisted to disk and loaded once per process;
+requests only weight terms against it. Until a model has been built, a stateless
+hashing vectorizer is used instead. Build one by hand with
+`python -m app.services.tfidf_model`; the API refreshes it periodically.
+"""
+from app.config import settings
+from app.database import connect_to_mongo, close_mongo_connection, get_database
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+import asyncio
+import joblib
+import math
+import os
+import time
+
+MODEL_FILE = "tfidf.joblib"
+
+# Used until a fitted model exists: no IDF, but no fitting either
+_hashing = HashingVectorizer(stop_words='english', alternate_sign=False, norm='l2', n_features=2 ** 18)
+
+_model: Optional[TfidfVectorizer] = None
+_model_info: Dict = {}
+# term -> IDF of the fitted model, for pairwise similarity without sparse matrices
+_term_idf: Optional[Dict[str, float]] = None
+_analyzer: Callable[[str], List[str]] = _hashing.build_analyzer()
+
+def model_path() -> str:
+    return os.path.join(settings.models_dir, MODEL_FILE)
+
+def get_vectorizer():
+    """The fitted corpus model, or the hashing fallback (both give L2-normalized rows)"""
+    return _model if _model is not None else _hashing
+
+def get_tfidf_stats() -> Dict:
+    if _model is None:
+        return {'kind': 'hashing'}
+    return {'kind': 'tfidf', **_model_info}
+
+def _install(vectorizer: TfidfVectorizer, info: Dict):
+    global _model, _model_info, _term_idf, _analyzer
+    _term_idf = {term: float(vectorizer.idf_[index]) for term, index in vectorizer.vocabulary_.items()}
+    _analyzer = vectorizer.build_analyzer()
+    _model, _model_info = vectorizer, info
+
+def term_counts(text: str) -> Dict[str, int]:
+    """
+    Analyzed term frequencies of a text. The fitted model and the hashing
+    fallback share one analyzer, so counts stay valid across refits and can be
+    stored (see feature_store)
+    """
+    return dict(Counter(_analyzer(text)))
+
+def weights_from_counts(counts: Dict[str, int]) -> Dict[str, float]:
+    """
+    L2-normalized weights of a text's terms, same as a row of
+    get_vectorizer().transform() but keyed by term (plain term frequencies
+    under the hashing fallback)
+    """
+    if _term_idf is None:
+        weights = {term: float(count) for term, count in counts.items()}
+    else:
+        # sublinear_tf, as fitted
+        weights = {
+            term: (1 + math.log(count)) * _term_idf[term]
+            for term, count in counts.items() if term in _term_idf
+        }
+    norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+    return {term: weight / norm for term, weight in weights.items()} if norm else {}
+
+def term_weights(text: str) -> Dict[str, float]:
+    return weights_from_counts(term_counts(text))
+
+def cosine(weights_a: Dict[str, float], weights_b: Dict[str, float]) -> float:
+    if len(weights_a) > len(weights_b):
+        weights_a, weights_b = weights_b, weights_a
+    return sum(weight * weights_b.get(term, 0.0) for term, weight in weights_a.items())
+
+def similarity(
+    text_a: str, text_b: str, counts_a: Optional[Dict[str, int]] = None, counts_b: Optional[Dict[str, int]] = None
+) -> float:
+    """Cosine similarity (0-1) of two texts under the current model (counts_*: stored term_counts of each)"""
+    return cosine(
+        weights_from_counts(counts_a if counts_a is not None else term_counts(text_a)),
+        weights_from_counts(counts_b if counts_b is not None else term_counts(text_b))
+    )
+
+def load_tfidf_model() -> bool:
+    """Load the persisted model, if any; returns whether one was loaded"""
+    path = model_path()
+    if not os.path.exists(path):
+        print("No TF-IDF model on disk yet, using the hashing vectorizer")
+        return False
+    try:
+        saved = joblib.load(path)
+    except Exception as e:
+        print(f"Could not load TF-IDF model from {path}: {e}")
+        return False
+    _install(saved['vectorizer'], {**saved['info'], 'mtime': os.path.getmtime(path)})
+    print(f"TF-IDF model loaded: {_model_info['documents']} documents, {_model_info['vocabulary']} terms")
+    return True
+
+async def load_corpus(db) -> List[str]:
+    """Stored resume texts and distinct job descriptions, newest first"""
+    limit = settings.tfidf_max_documents
+    documents = []
+    async for doc in db.extraction_cache.find({}, {"text": 1}).sort("last_used_at", -1).limit(limit):
+        if doc.get('text'):
+            documents.append(doc['text'])
+
+    seen = set()
+    async for doc in db.jd_matches.find({}, {"job_description": 1}).sort("created_at", -1).limit(limit):
+        jd = doc.get('job_description')
+        if jd and jd not in seen:
+            seen.add(jd)
+            documents.append(jd)
+    return documents
+
+def fit_tfidf_model(documents: List[str]) -> TfidfVectorizer:
+    # Document-frequency cut-offs only make sense on a sizeable corpus
+    large = len(documents) >= 100
+    vectorizer = TfidfVectorizer(
+        stop_words='english',
+        sublinear_tf=True,
+        min_df=2 if large else 1,
+        max_df=0.9 if large else 1.0,
+        max_features=settings.tfidf_max_features
+    )
+    vectorizer.fit(documents)
+    return vectorizer
+
+def _save(vectorizer: TfidfVectorizer, info: Dict):
+    """Write atomically so other processes never load a half-written file"""
+    os.makedirs(settings.models_dir, exist_ok=True)
+    path = model_path()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    joblib.dump({'vectorizer': vectorizer, 'info': info}, tmp_path)
+    os.replace(tmp_path, path)
+
+async def build_tfidf_model(db) -> bool:
+    """Fit on the current corpus, persist and swap in; False if the corpus is too small"""
+    documents = await load_corpus(db)
+    if len(documents) < settings.tfidf_min_documents:
+        print(f"TF-IDF corpus has {len(documents)} document(s), need {settings.tfidf_min_documents}; not fitting")
+        return False
+
+    started = time.perf_counter()
+    # Fitting is CPU-bound; keep the event loop free
+    vectorizer = await asyncio.to_thread(fit_tfidf_model, documents)
+    info = {
+        'documents': len(documents),
+        'vocabulary': len(vectorizer.vocabulary_),
+        'fitted_at': datetime.utcnow().isoformat()
+    }
+    await asyncio.to_thread(_save, vectorizer, info)
+    _install(vectorizer, {**info, 'mtime': os.path.getmtime(model_path())})
+    print(f"TF-IDF model fitted on {len(documents)} documents in {time.perf_counter() - started:.1f}s")
+    return True
+
+async def refresh_tfidf_model_periodically(db):
+    """
+    Every tfidf_refresh_interval: pick up a newer model written by another
+    process if there is one, otherwise refit and persist
+    """
+    interval = settings.tfidf_refresh_interval
+    while True:
+        try:
+            path = model_path()
+            on_disk = os.path.getmtime(path) if os.path.exists(path) else 0
+            if on_disk > _model_info.get('mtime', 0) and time.time() - on_disk < interval:
+                load_tfidf_model()
+            elif time.time() - _model_info.get('mtime', 0) >= interval:
+                await build_tfidf_model(db)
+        except Exception as e:
+            print(f"TF-IDF model refresh failed: {e}")
+        await asyncio.sleep(interval)
+
+async def main():
+    await connect_to_mongo()
+    try:
+        await build_tfidf_model(get_database())
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,321 @@
+"""
+Append-only, memory-mapped vector store for semantic search over stored
+resumes and job descriptions.
+
+Each store is one file of fixed-size records (id, deleted flag, float32
+vector) per embedder, so a record is written with a single append and any
+process can map the file read-only and pick up rows other processes wrote.
+The latest record for an id wins; a deleted record hides it. Only the id map
+and a live-row mask are kept in RAM: vectors are read from the mapped file
+batch by batch for exact search, or just for the probed lists once the store
+is large enough for an IVF index (k-means centroids, persisted next to it).
+
+Stores are kept in step with MongoDB by sync_vector_stores (resumes and
+jd_matches by _id, resume deletions from `resume_deletions`).
+"""
+from app.config import settings
+from app.services.embeddings import get_embedder
+from bson import ObjectId
+from datetime import datetime, timedelta
+from sklearn.cluster import MiniBatchKMeans
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import numpy as np
+import os
+import re
+
+RESUMES = "resumes"
+JDS = "jds"
+ID_BYTES = 63
+# Keep each append well below sizes where a write could be split
+_WRITE_RECORDS = 256
+_IVF_SAMPLE = 100000
+_SYNC_BATCH = 64
+_SYNC_OVERLAP = timedelta(minutes=2)
+
+def _record_dtype(dimension: int) -> np.dtype:
+    return np.dtype([('id', f'S{ID_BYTES}'), ('deleted', 'u1'), ('vector', '<f4', (dimension,))])
+
+class VectorStore:
+    """One memory-mapped vector file; mutate and query from the event loop"""
+
+    def __init__(self, path: str, dimension: int):
+        self.path = path
+        self.dimension = dimension
+        self.dtype = _record_dtype(dimension)
+        self.rows = 0
+        self.positions: Dict[str, int] = {}   # id -> its latest live row
+        self.live = np.zeros(0, dtype=bool)
+        self._records: Optional[np.memmap] = None
+        # IVF: unit centroids and the list of each row covered so far
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.ivf_rows = 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            # Drop a torn record left by a crash mid-append
+            size = os.path.getsize(path)
+            if size % self.dtype.itemsize:
+                with open(path, 'r+b') as f:
+                    f.truncate(size - size % self.dtype.itemsize)
+        self.refresh()
+        self._load_ivf()
+
+    @property
+    def ivf_path(self) -> str:
+        return f"{self.path}.ivf.npz"
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def refresh(self):
+        """Map rows appended since the last refresh, by this or another process"""
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        rows = size // self.dtype.itemsize
+        if rows <= self.rows:
+            return
+        records = np.memmap(self.path, dtype=self.dtype, mode='r', shape=(rows,))
+        first = self.rows
+        live = np.concatenate([self.live, np.zeros(rows - first, dtype=bool)])
+        new = records[first:rows]
+        for offset, (raw_id, deleted) in enumerate(zip(new['id'], new['deleted'])):
+            key = raw_id.decode('utf-8')
+            previous = self.positions.pop(key, None)
+            if previous is not None:
+                live[previous] = False
+            if not deleted:
+                self.positions[key] = first + offset
+                live[first + offset] = True
+        self.live = live
+        self._records = records
+        self.rows = rows
+        self._assign()
+
+    def _append(self, ids: List[str], vectors: np.ndarray, deleted: bool):
+        records = np.zeros(len(ids), dtype=self.dtype)
+        records['id'] = [key.encode('utf-8')[:ID_BYTES] for key in ids]
+        records['deleted'] = 1 if deleted else 0
+        if vectors is not None:
+            records['vector'] = vectors
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            for start in range(0, len(records), _WRITE_RECORDS):
+                os.write(fd, records[start:start + _WRITE_RECORDS].tobytes())
+        finally:
+            os.close(fd)
+        self.refresh()
+
+    def add(self, ids: List[str], vectors: np.ndarray):
+        """Insert or replace vectors (rows of L2-normalized float32)"""
+        if ids:
+            self._append(ids, np.asarray(vectors, dtype=np.float32), deleted=False)
+
+    def delete(self, ids: List[str]):
+        ids = [key for key in ids if key in self.positions]
+        if ids:
+            self._append(ids, None, deleted=True)
+
+    def get(self, ids: List[str]) -> Tuple[List[str], np.ndarray]:
+        """Stored vectors for the ids that have one, in the order given"""
+        found = [key for key in ids if key in self.positions]
+        if not found:
+            return [], np.zeros((0, self.dimension), dtype=np.float32)
+        rows = np.array([self.positions[key] for key in found])
+        return found, np.asarray(self._records['vector'][rows])
+
+    def _row_ids(self, rows: np.ndarray) -> List[str]:
+        return [raw.decode('utf-8') for raw in self._records['id'][rows]]
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        """Top k (id, cosine) for a unit query vector, via IVF when one is built"""
+        if not self.positions or k < 1:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        if self.centroids is not None:
+            return self._search_ivf(query, k)
+
+        best_rows = np.zeros(0, dtype=np.int64)
+        best_scores = np.zeros(0, dtype=np.float32)
+        batch = settings.vector_search_batch
+        for start in range(0, self.rows, batch):
+            end = min(start + batch, self.rows)
+            scores = self._records['vector'][start:end] @ query
+            scores[~self.live[start:end]] = -np.inf
+            best_rows, best_scores = _top_k(
+                np.concatenate([best_rows, np.arange(start, end)]),
+                np.concatenate([best_scores, scores]), k
+            )
+        return self._results(best_rows, best_scores)
+
+    def _search_ivf(self, query: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        probe = np.argsort(-(self.centroids @ query))[:settings.vector_ivf_probe]
+        rows = np.flatnonzero(np.isin(self.assignments, probe) & self.live)
+        if not len(rows):
+            return []
+        # Fancy indexing the map reads only the pages of the probed rows
+        scores = np.asarray(self._records['vector'][rows]) @ query
+        best_rows, best_scores = _top_k(rows, scores, k)
+        return self._results(best_rows, best_scores)
+
+    def _results(self, rows: np.ndarray, scores: np.ndarray) -> List[Tuple[str, float]]:
+        keep = np.isfinite(scores)
+        rows, scores = rows[keep], scores[keep]
+        return list(zip(self._row_ids(rows), (float(score) for score in scores)))
+
+    # ---- IVF ----
+
+    def needs_ivf(self) -> bool:
+        """Worth (re)building: large enough and grown 2x since the last build"""
+        return len(self) >= settings.vector_ivf_min_rows and len(self) >= 2 * self.ivf_rows
+
+    def build_ivf(self) -> Dict:
+        """Train k-means on a sample of live rows; run off the event loop"""
+        rows, records = self.rows, self._records
+        live_rows = np.flatnonzero(self.live[:rows])
+        sample = live_rows
+        if len(sample) > _IVF_SAMPLE:
+            sample = np.sort(np.random.default_rng(0).choice(live_rows, _IVF_SAMPLE, replace=False))
+        lists = settings.vector_ivf_lists or max(int(np.sqrt(len(live_rows))), 1)
+        kmeans = MiniBatchKMeans(n_clusters=lists, random_state=0, n_init=3, batch_size=4096)
+        kmeans.fit(np.asarray(records['vector'][sample]))
+        centroids = kmeans.cluster_centers_.astype(np.float32)
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        assignments = _nearest(records, centroids, 0, rows)
+
+        tmp_path = f"{self.ivf_path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, centroids=centroids, assignments=assignments, rows=len(live_rows))
+        os.replace(tmp_path, self.ivf_path)
+        return {'centroids': centroids, 'assignments': assignments, 'rows': len(live_rows)}
+
+    def install_ivf(self, ivf: Dict):
+        self.centroids = ivf['centroids']
+        self.assignments = ivf['assignments']
+        self.ivf_rows = int(ivf['rows'])
+        self._assign()
+
+    def _load_ivf(self):
+        if not os.path.exists(self.ivf_path):
+            return
+        try:
+            with np.load(self.ivf_path) as saved:
+                ivf = {name: saved[name] for name in ('centroids', 'assignments', 'rows')}
+        except Exception as e:
+            print(f"Could not load IVF index {self.ivf_path}: {e}")
+            return
+        if len(ivf['assignments']) <= self.rows:
+            self.install_ivf(ivf)
+
+    def _assign(self):
+        """Put rows appended since the IVF was built into their nearest list"""
+        covered = len(self.assignments)
+        if self.centroids is not None and covered < self.rows:
+            self.assignments = np.concatenate([
+                self.assignments, _nearest(self._records, self.centroids, covered, self.rows)
+            ])
+
+def _nearest(records: np.memmap, centroids: np.ndarray, start: int, end: int) -> np.ndarray:
+    """Nearest centroid of rows start..end, read batch by batch"""
+    assignments = np.empty(end - start, dtype=np.int32)
+    batch = settings.vector_search_batch
+    for offset in range(start, end, batch):
+        chunk = records['vector'][offset:min(offset + batch, end)]
+        assignments[offset - start:offset - start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+def _top_k(rows: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    if len(scores) > k:
+        keep = np.argpartition(-scores, k - 1)[:k]
+        rows, scores = rows[keep], scores[keep]
+    order = np.argsort(-scores, kind='stable')
+    return rows[order], scores[order]
+
+_stores: Dict[str, VectorStore] = {}
+# Newest MongoDB _id already embedded, per store
+_cursors: Dict[str, Optional[ObjectId]] = {}
+_deletions_synced_at: Optional[datetime] = None
+
+def get_vector_store(name: str) -> VectorStore:
+    """The store for `name` in the current embedder's vector space"""
+    store = _stores.get(name)
+    if store is None:
+        embedder = get_embedder()
+        slug = re.sub(r'[^A-Za-z0-9.-]+', '_', embedder.model_id())
+        path = os.path.join(settings.vector_store_dir, f"{name}-{slug}.vec")
+        store = VectorStore(path, embedder.dimension)
+        _stores[name] = store
+        print(f"Vector store {name}: {len(store)} vectors ({path})")
+    store.refresh()
+    return store
+
+def vector_search_enabled() -> bool:
+    return settings.semantic_embedding_weight > 0
+
+def _newest_object_id(store: VectorStore) -> Optional[ObjectId]:
+    ids = [ObjectId(key) for key in store.positions if ObjectId.is_valid(key)]
+    return max(ids) if ids else None
+
+async def _sync_collection(store_name: str, collection, text_field: str) -> int:
+    store = get_vector_store(store_name)
+    if store_name not in _cursors:
+        _cursors[store_name] = _newest_object_id(store)
+    cursor_id = _cursors[store_name]
+
+    query = {text_field: {"$exists": True}}
+    if cursor_id is not None:
+        query["_id"] = {"$gt": ObjectId.from_datetime(cursor_id.generation_time - _SYNC_OVERLAP)}
+    added = 0
+    pending: List[Tuple[str, str]] = []
+
+    async def flush():
+        nonlocal added
+        # Embedding is CPU-bound; keep the event loop free
+        vectors = await asyncio.to_thread(get_embedder().embed, [text for _, text in pending])
+        store.add([key for key, _ in pending], vectors)
+        added += len(pending)
+        pending.clear()
+
+    async for doc in collection.find(query, {text_field: 1}).sort("_id", 1):
+        key = str(doc['_id'])
+        if doc.get(text_field) and key not in store.positions:
+            pending.append((key, doc[text_field]))
+            if len(pending) >= _SYNC_BATCH:
+                await flush()
+        if cursor_id is None or doc['_id'] > cursor_id:
+            cursor_id = doc['_id']
+    if pending:
+        await flush()
+    _cursors[store_name] = cursor_id
+    return added
+
+async def sync_vector_stores(db) -> int:
+    """Embed resumes and JDs added since the last sync and drop deleted resumes"""
+    global _deletions_synced_at
+    started = datetime.utcnow()
+    changes = await _sync_collection(RESUMES, db.resumes, "extracted_text")
+    changes += await _sync_collection(JDS, db.jd_matches, "job_description")
+
+    since = (_deletions_synced_at or started - timedelta(seconds=settings.resume_index_tombstone_ttl)) - _SYNC_OVERLAP
+    deleted = [doc['resume_id'] async for doc in db.resume_deletions.find({"deleted_at": {"$gte": since}}, {"resume_id": 1})]
+    resumes = get_vector_store(RESUMES)
+    before = len(resumes)
+    resumes.delete(deleted)
+    changes += before - len(resumes)
+    _deletions_synced_at = started
+
+    for store in _stores.values():
+        if store.needs_ivf():
+            print(f"Building IVF index for {store.path} ({len(store)} vectors)")
+            store.install_ivf(await asyncio.to_thread(store.build_ivf))
+    if changes:
+        print(f"Vector stores synced: {changes} change(s)")
+    return changes
+
+async def sync_vector_stores_periodically(db):
+    """Only runs when embeddings take part in matching (semantic_embedding_weight > 0)"""
+    while vector_search_enabled():
+        try:
+            await sync_vector_stores(db)
+        except Exception as e:
+            print(f"Vector store sync failed: {e}")
+        await asyncio.sleep(settings.vector_store_sync_interval)
@@ -1,4 +1,7 @@
+from fastapi import Depends, Header, HTTPException
 from passlib.context import CryptContext
+from typing import Optional
+from app.database import get_database
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -9,3 +12,21 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     """Hash a password"""
     return pwd_context.hash(password)
+
+# Users with this `role` may search every user's resumes (recruiter mode)
+RECRUITER_ROLE = "recruiter"
+
+# Temporary: Get user from Authorization header (email-based)
+async def get_current_user_email(authorization: Optional[str] = Header(None), db = Depends(get_database)):
+    """Get current user from authorization header (email)"""
+    if not authorization:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    # Extract email from "Bearer email@example.com"
+    email = authorization.replace("Bearer ", "").strip()
+    user = await db.users.find_one({"email": email})
+    
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+    
+    return user
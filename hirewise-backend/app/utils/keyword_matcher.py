@@ -0,0 +1,104 @@
+import re
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Set
+
+# Word tokens keep trailing '+' / '#' (c++, c#); any other symbol is its own
+# token, so "ci/cd" -> ['ci', '/', 'cd'] and "node.js" -> ['node', '.', 'js']
+TOKEN_PATTERN = re.compile(r'\w+[+#]*|[^\s\w]')
+
+def tokenize(text_lower: str) -> List[str]:
+    """Tokens of already-lowercased text, in order"""
+    return TOKEN_PATTERN.findall(text_lower)
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over tokens rather than characters.
+    Matching whole tokens gives word-boundary semantics for free ('java' does
+    not match inside 'javascript', 'go' not inside 'good') and a document is
+    matched in one linear scan no matter how many phrases are loaded.
+    """
+
+    def __init__(self):
+        # Node 0 is the root; each node maps token -> child node id
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Any]] = [[]]
+        self._built = False
+        self.size = 0
+
+    def add(self, phrase: str, value: Any = None):
+        """Register a phrase; `value` is reported on match (defaults to the phrase)"""
+        tokens = tokenize(phrase.lower())
+        if not tokens:
+            return
+
+        node = 0
+        for token in tokens:
+            child = self._goto[node].get(token)
+            if child is None:
+                child = len(self._goto)
+                self._goto[node][token] = child
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = child
+
+        self._output[node].append(phrase if value is None else value)
+        self._built = False
+        self.size += 1
+
+    def build(self):
+        """Compute failure links breadth-first and merge outputs along them"""
+        queue = deque(self._goto[0].values())
+        for child in queue:
+            self._fail[child] = 0
+
+        while queue:
+            node = queue.popleft()
+            for token, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and token not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(token, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+        self._built = True
+        return self
+
+    def scan(self, tokens: Iterable[str]) -> Iterator[Any]:
+        """Yield the value of every phrase occurrence in the token stream"""
+        if not self._built:
+            self.build()
+
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        node = 0
+
+        for token in tokens:
+            while node and token not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(token, 0)
+            if output[node]:
+                yield from output[node]
+
+    def find_all(self, tokens: Iterable[str]) -> Set[Any]:
+        """Distinct values of every phrase found in the token stream"""
+        if not self._built:
+            self.build()
+
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        found = set()
+        node = 0
+
+        for token in tokens:
+            while node and token not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(token, 0)
+            if output[node]:
+                found.update(output[node])
+
+        return found
@@ -0,0 +1,163 @@
+import json
+from typing import Any, List, Optional
+
+_CLOSERS = {'{': '}', '[': ']'}
+_WHITESPACE = ' \t\r\n'
+
+class IncrementalJSONParser:
+    """
+    Parse a JSON document as it streams in.
+
+    Text before the first '{' or '[' (prose, a ```json fence) and after the
+    root value closes (closing fence) is ignored, and trailing commas are
+    dropped. partial() returns everything complete so far: values are only
+    surfaced once they end, so a streamed "85" is never seen as 8.
+    """
+
+    def __init__(self):
+        self._out: List[str] = []
+        # Open containers as [char, expecting_key]
+        self._stack: List[list] = []
+        self._in_string = False
+        self._string_is_key = False
+        self._escape = False
+        self._in_literal = False
+        self._started = False
+        self.done = False
+        # Last point where everything before it is a complete value
+        self._safe_len = 0
+        self._safe_closers = ''
+        self._partial_len = -1
+        self._partial: Any = None
+
+    def feed(self, chunk: str) -> bool:
+        """Consume a chunk; True if more of the document became complete"""
+        safe_before, done_before = self._safe_len, self.done
+        for char in chunk:
+            if self.done:
+                break
+            if not self._started:
+                if char in _CLOSERS:
+                    self._started = True
+                    self._open(char)
+                continue
+            if self._in_string:
+                self._string_char(char)
+            else:
+                self._structural_char(char)
+        return self._safe_len != safe_before or self.done != done_before
+
+    def _mark_safe(self):
+        self._safe_len = len(self._out)
+        self._safe_closers = ''.join(_CLOSERS[entry[0]] for entry in reversed(self._stack))
+
+    def _open(self, char: str):
+        self._out.append(char)
+        self._stack.append([char, char == '{'])
+        self._mark_safe()
+
+    def _close(self, char: str):
+        while self._out and self._out[-1] == ',':
+            self._out.pop()
+        self._out.append(char)
+        self._stack.pop()
+        if self._stack:
+            self._mark_safe()
+        else:
+            self.done = True
+
+    def _string_char(self, char: str):
+        self._out.append(char)
+        if self._escape:
+            self._escape = False
+        elif char == '\\':
+            self._escape = True
+        elif char == '"':
+            self._in_string = False
+            if not self._string_is_key:
+                self._mark_safe()
+
+    def _structural_char(self, char: str):
+        if self._in_literal and (char in _WHITESPACE or char in ',}]'):
+            self._in_literal = False
+            self._mark_safe()
+
+        top = self._stack[-1]
+        if char in _WHITESPACE:
+            return
+        if char == '"':
+            self._in_string = True
+            self._string_is_key = top[0] == '{' and top[1]
+            self._out.append(char)
+        elif char in _CLOSERS:
+            self._open(char)
+        elif char in '}]':
+            self._close(char)
+        elif char == ',':
+            self._out.append(char)
+            if top[0] == '{':
+                top[1] = True
+        elif char == ':':
+            self._out.append(char)
+            top[1] = False
+        else:
+            # Number, true/false/null (or junk that json.loads will reject)
+            self._in_literal = True
+            self._out.append(char)
+
+    def partial(self) -> Optional[Any]:
+        """The document with every complete value so far (None before the root opens)"""
+        if self.done:
+            return self.result()
+        return self._snapshot()
+
+    def _snapshot(self) -> Optional[Any]:
+        if not self._started:
+            return None
+        if self._partial_len != self._safe_len:
+            text = ''.join(self._out[:self._safe_len]) + self._safe_closers
+            try:
+                self._partial = json.loads(text, strict=False)
+            except json.JSONDecodeError:
+                # Junk inside the document; keep the last good snapshot
+                pass
+            self._partial_len = self._safe_len
+        return self._partial
+
+    def result(self) -> Optional[Any]:
+        """
+        Best-effort parse once the stream has ended: a truncated document is
+        closed off, keeping a cut-off string but not a cut-off number
+        """
+        if not self._started:
+            return None
+        if not self.done:
+            if self._in_literal:
+                return self._snapshot()
+            text = ''.join(self._out)
+            if self._in_string:
+                if self._string_is_key:
+                    return self._snapshot()
+                text += '"'
+            text = text.rstrip(',')
+            if text.endswith(':'):
+                return self._snapshot()
+            text += ''.join(_CLOSERS[entry[0]] for entry in reversed(self._stack))
+            try:
+                return json.loads(text, strict=False)
+            except json.JSONDecodeError:
+                return self._snapshot()
+
+        try:
+            return json.loads(''.join(self._out), strict=False)
+        except json.JSONDecodeError:
+            return self._snapshot()
+
+def repair_json(text: str) -> Any:
+    """Parse JSON wrapped in fences/prose, with trailing commas or truncated; ValueError if hopeless"""
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    parsed = parser.result()
+    if parsed is None:
+        raise ValueError("No JSON object or array found")
+    return parsed
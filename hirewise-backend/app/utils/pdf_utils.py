@@ -1,108 +1,231 @@
 import PyPDF2
 import pdfplumber
+import io
 import re
-from typing import Dict, List
+from app.utils.resume_features import analyze_resume, formatting_report
+from typing import Dict, Iterator, List, Optional, Union
 
-def extract_text_from_pdf(file_path: str) -> str:
-    """Extract text from PDF using multiple methods for best results"""
-    text = ""
+# A PDF is either a path on disk or the raw bytes of an in-memory upload
+PDFSource = Union[str, bytes]
+
+def _as_stream(source: PDFSource):
+    """Give each parser its own reader; BytesIO over bytes shares the buffer"""
+    return io.BytesIO(source) if isinstance(source, bytes) else source
+
+def _open_pypdf2(source: PDFSource):
+    try:
+        return PyPDF2.PdfReader(_as_stream(source))
+    except Exception as e:
+        print(f"PyPDF2 failed: {e}")
+        return None
+
+def _pypdf2_page_text(reader, page_index: int) -> str:
+    try:
+        return reader.pages[page_index].extract_text() or ""
+    except Exception as e:
+        print(f"PyPDF2 failed on page {page_index + 1}: {e}")
+        return ""
+
+def iter_pdf_pages(
+    source: PDFSource,
+    max_pages: Optional[int] = None,
+    max_page_chars: Optional[int] = None
+) -> Iterator[Dict]:
+    """
+    Lazily yield one dict per page: page number, total pages, text and parser.
+    pdfplumber runs first; PyPDF2 is only used for the pages it fails on
+    (or for the whole document if pdfplumber cannot open it).
+    """
+    fallback_reader = None
     
-    # Try pdfplumber first (better for complex PDFs)
     try:
-        with pdfplumber.open(file_path) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
+        pdf = pdfplumber.open(_as_stream(source))
     except Exception as e:
         print(f"pdfplumber failed: {e}")
+        pdf = None
     
-    # Fallback to PyPDF2 if pdfplumber fails
-    if not text.strip():
-        try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page in pdf_reader.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-        except Exception as e:
-            print(f"PyPDF2 failed: {e}")
+    if pdf is None:
+        fallback_reader = _open_pypdf2(source)
+        if fallback_reader is None:
+            return
+        total_pages = len(fallback_reader.pages)
+        for index in range(total_pages):
+            if max_pages and index >= max_pages:
+                return
+            yield {
+                'page': index + 1,
+                'total_pages': total_pages,
+                'text': _pypdf2_page_text(fallback_reader, index)[:max_page_chars],
+                'parser': 'pypdf2'
+            }
+        return
     
-    return text.strip()
+    with pdf:
+        total_pages = len(pdf.pages)
+        for index, page in enumerate(pdf.pages):
+            if max_pages and index >= max_pages:
+                return
+            
+            parser = 'pdfplumber'
+            try:
+                page_text = page.extract_text() or ""
+            except Exception as e:
+                print(f"pdfplumber failed on page {index + 1}: {e}")
+                page_text = ""
+            finally:
+                # Drop the parsed layout objects before moving to the next page
+                page.flush_cache()
+            
+            if not page_text.strip():
+                if fallback_reader is None:
+                    fallback_reader = _open_pypdf2(source)
+                if fallback_reader is not None:
+                    page_text = _pypdf2_page_text(fallback_reader, index)
+                    parser = 'pypdf2'
+            
+            yield {
+                'page': index + 1,
+                'total_pages': total_pages,
+                'text': page_text[:max_page_chars],
+                'parser': parser
+            }
 
-def extract_sections(text: str) -> Dict[str, bool]:
-    """Extract common resume sections"""
-    text_lower = text.lower()
-    sections = {}
+def iter_fast_pages(
+    source: PDFSource,
+    max_pages: Optional[int] = None,
+    max_page_chars: Optional[int] = None
+) -> Iterator[Dict]:
+    """Lazily yield pages using PyPDF2 only (the cheap tier)"""
+    reader = _open_pypdf2(source)
+    if reader is None:
+        return
+    total_pages = len(reader.pages)
+    for index in range(total_pages):
+        if max_pages and index >= max_pages:
+            return
+        yield {
+            'page': index + 1,
+            'total_pages': total_pages,
+            'text': _pypdf2_page_text(reader, index)[:max_page_chars],
+            'parser': 'pypdf2'
+        }
+
+# Quality heuristic patterns
+_TOKEN_PATTERN = re.compile(r'\S+')
+_COLUMN_GAP_PATTERN = re.compile(r'\S {3,}\S')
+
+def score_text_quality(text: str, page_count: int) -> Dict:
+    """
+    Score extracted text from 0 to 1 so bad fast-tier output can be escalated.
+    Looks at character density per page, broken words (letter-by-letter
+    spacing or glued words) and side-by-side columns merged onto one line.
+    """
+    tokens = _TOKEN_PATTERN.findall(text)
+    lines = [line for line in text.splitlines() if line.strip()]
+    if not tokens or not lines:
+        return {'score': 0.0, 'density': 0, 'broken_word_ratio': 1.0, 'column_ratio': 0.0}
+    
+    # 1. Character density - scanned or mis-decoded pages yield very little text
+    density = len(text) / max(page_count, 1)
+    density_score = min(density / 800, 1.0)
+    
+    # 2. Broken words - "S o f t w a r e" or "softwareengineerwithsixyears"
+    single_letters = sum(1 for t in tokens if len(t) == 1 and t.isalpha() and t not in ('a', 'A', 'I'))
+    glued = sum(1 for t in tokens if len(t) > 25 and t.isalpha())
+    broken_word_ratio = (single_letters + glued) / len(tokens)
     
-    # Define section patterns
-    section_patterns = {
-        'contact': r'(email|phone|mobile|address)',
-        'summary': r'(summary|objective|profile)',
-        'experience': r'(experience|employment|work history)',
-        'education': r'(education|academic|qualification)',
-        'skills': r'(skills|technical skills|competencies)',
-        'certifications': r'(certification|certificate|licenses)',
-        'projects': r'(projects|portfolio)'
+    # 3. Column interleaving - wide gaps inside a line mean two columns were merged
+    column_ratio = sum(1 for line in lines if _COLUMN_GAP_PATTERN.search(line)) / len(lines)
+    
+    score = density_score
+    score -= min(broken_word_ratio * 3, 1.0)
+    score -= min(column_ratio * 2, 1.0)
+    
+    return {
+        'score': round(max(score, 0.0), 3),
+        'density': round(density),
+        'broken_word_ratio': round(broken_word_ratio, 3),
+        'column_ratio': round(column_ratio, 3)
     }
+
+def _collect_pages(pages: Iterator[Dict], max_chars: Optional[int]) -> Dict:
+    """Join streamed pages, stopping once the character budget is reached"""
+    texts = []
+    parsers = set()
+    char_count = 0
+    page_count = 0
+    pages_parsed = 0
     
-    for section_name, pattern in section_patterns.items():
-        if re.search(pattern, text_lower):
-            sections[section_name] = section_name
+    for page in pages:
+        page_count = page['total_pages']
+        pages_parsed = page['page']
+        if page['text']:
+            texts.append(page['text'])
+            parsers.add(page['parser'])
+            char_count += len(page['text']) + 1
+        if max_chars and char_count >= max_chars:
+            break
     
-    return sections
+    text = "\n".join(texts)
+    if max_chars:
+        text = text[:max_chars]
+    
+    return {
+        'text': text.strip(),
+        'page_count': page_count,
+        'pages_parsed': pages_parsed,
+        'truncated': pages_parsed < page_count or (bool(max_chars) and char_count > max_chars),
+        'parser': '+'.join(sorted(parsers)) if parsers else None
+    }
+
+def extract_pdf_content(
+    source: PDFSource,
+    max_chars: Optional[int] = None,
+    max_pages: Optional[int] = None,
+    max_page_chars: Optional[int] = None,
+    quality_threshold: Optional[float] = None
+) -> Dict:
+    """
+    Extract text from PDF along with parse metadata.
+    With a quality_threshold, the fast PyPDF2 tier runs first and pdfplumber
+    layout extraction only runs when the fast output scores below it.
+    Stops reading pages as soon as the character/page budget is reached.
+    """
+    quality = None
+    
+    if quality_threshold is not None:
+        fast = _collect_pages(iter_fast_pages(source, max_pages, max_page_chars), max_chars)
+        quality = score_text_quality(fast['text'], fast['pages_parsed'])
+        if fast['text'] and quality['score'] >= quality_threshold:
+            fast['tier'] = 'fast'
+            fast['quality'] = quality
+            return fast
+    
+    result = _collect_pages(iter_pdf_pages(source, max_pages, max_page_chars), max_chars)
+    result['tier'] = 'layout'
+    result['quality'] = quality
+    return result
+
+def extract_text_from_pdf(file_path: str) -> str:
+    """Extract text from PDF using multiple methods for best results"""
+    return extract_pdf_content(file_path)['text']
+
+def extract_sections(text: str) -> Dict[str, str]:
+    """Extract common resume sections"""
+    return {name: name for name in analyze_resume(text)['sections']}
 
 def extract_contact_info(text: str) -> Dict[str, bool]:
     """Check for contact information"""
+    features = analyze_resume(text)
     return {
-        'has_email': bool(re.search(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', text)),
-        'has_phone': bool(re.search(r'\b\d{10}\b|\b\d{3}[-.\s]?\d{3}[-.\s]?\d{4}\b', text))
+        'has_email': features['has_email'],
+        'has_phone': features['has_phone']
     }
 
 def extract_keywords(text: str) -> List[str]:
     """Extract common professional keywords"""
-    keywords = [
-        'managed', 'developed', 'led', 'created', 'improved', 'achieved',
-        'analyzed', 'designed', 'implemented', 'coordinated', 'executed',
-        'delivered', 'optimized', 'increased', 'decreased', 'generated',
-        'built', 'established', 'launched', 'streamlined', 'collaborated'
-    ]
-    
-    text_lower = text.lower()
-    found_keywords = [kw for kw in keywords if kw in text_lower]
-    return found_keywords
+    return analyze_resume(text)['action_verbs']
 
 def check_formatting(text: str) -> Dict[str, any]:
     """Check resume formatting quality"""
-    issues = []
-    score = 100
-    
-    # Check for bullet points
-    bullet_indicators = ['•', '-', '*', '○', '▪']
-    has_bullets = any(b in text for b in bullet_indicators)
-    if not has_bullets:
-        issues.append("No bullet points found. Use bullets for listing achievements.")
-        score -= 10
-    
-    # Check length
-    word_count = len(text.split())
-    if word_count < 300:
-        issues.append("Resume is too short. Aim for 300-800 words.")
-        score -= 15
-    elif word_count > 1000:
-        issues.append("Resume is too long. Keep it concise (max 2 pages).")
-        score -= 10
-    
-    # Check for dates
-    date_pattern = r'\b(19|20)\d{2}\b|Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec'
-    if not re.search(date_pattern, text):
-        issues.append("No dates found. Include dates for experience and education.")
-        score -= 10
-    
-    return {
-        'score': max(score, 0),
-        'has_bullets': has_bullets,
-        'word_count': word_count,
-        'issues': issues
-    }
+    return formatting_report(analyze_resume(text))
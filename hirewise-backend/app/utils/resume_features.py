@@ -0,0 +1,136 @@
+import re
+from app.utils.keyword_matcher import KeywordAutomaton, tokenize
+from app.utils.skill_taxonomy import TAXONOMY
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set
+
+# Action verbs counted as ATS keywords
+ACTION_VERBS = [
+    'managed', 'developed', 'led', 'created', 'improved', 'achieved',
+    'analyzed', 'designed', 'implemented', 'coordinated', 'executed',
+    'delivered', 'optimized', 'increased', 'decreased', 'generated',
+    'built', 'established', 'launched', 'streamlined', 'collaborated'
+]
+
+# Section name -> keyword alternatives (matched on lowercased text)
+SECTION_PATTERNS = {
+    'contact': r'email|phone|mobile|address',
+    'summary': r'summary|objective|profile',
+    'experience': r'experience|employment|work history',
+    'education': r'education|academic|qualification',
+    'skills': r'skills|technical skills|competencies',
+    'certifications': r'certification|certificate|licenses',
+    'projects': r'projects|portfolio'
+}
+
+BULLET_INDICATORS = frozenset('•-*○▪')
+
+# Precompiled once at import
+_SECTION_PATTERNS = {name: re.compile(pattern) for name, pattern in SECTION_PATTERNS.items()}
+_EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b')
+_PHONE_PATTERN = re.compile(r'\b\d{10}\b|\b\d{3}[-.\s]?\d{3}[-.\s]?\d{4}\b')
+_DATE_PATTERN = re.compile(r'\b(19|20)\d{2}\b|Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec')
+_YEARS_SUFFIX_PATTERN = re.compile(r'(\d+)\+?(?:years?|yrs?)')
+
+# Still used on the JD side, which is not tokenized by analyze_resume
+YEARS_PATTERN = re.compile(r'(\d+)\+?\s*(?:years?|yrs?)')
+
+def _build_matcher(phrases: List[str]) -> KeywordAutomaton:
+    matcher = KeywordAutomaton()
+    for phrase in phrases:
+        matcher.add(phrase)
+    return matcher.build()
+
+# Token-boundary keyword automaton, built once at startup (skills: see skill_taxonomy)
+ACTION_VERB_MATCHER = _build_matcher(ACTION_VERBS)
+
+def _word_terms(tokens: List[str]) -> Set[str]:
+    """Plain word terms (no symbols, 'c++' -> 'c') for keyword overlap"""
+    return {token.rstrip('+#') for token in tokens if token[0].isalnum() or token[0] == '_'}
+
+def extract_terms(text_lower: str) -> Set[str]:
+    """Unique word tokens of already-lowercased text"""
+    return _word_terms(tokenize(text_lower))
+
+def extract_skill_ids(text_lower: str) -> FrozenSet[int]:
+    """Canonical skill ids mentioned in already-lowercased text, aliases included"""
+    return TAXONOMY.extract_ids(tokenize(text_lower))
+
+def extract_skills(text_lower: str) -> List[str]:
+    """Canonical names of the skills mentioned in already-lowercased text, in taxonomy order"""
+    return TAXONOMY.skill_names(extract_skill_ids(text_lower))
+
+def _years_from_tokens(tokens: List[str]) -> List[int]:
+    """Years-of-experience mentions ("5 years", "5+ yrs", "5years") from the token stream"""
+    years = []
+    for token, following in zip(tokens, tokens[1:] + ['']):
+        if not token[0].isdigit():
+            continue
+        number = token.rstrip('+')
+        if number.isdigit():
+            if following.startswith(('year', 'yr')):
+                years.append(int(number))
+        else:
+            match = _YEARS_SUFFIX_PATTERN.match(token)
+            if match:
+                years.append(int(match.group(1)))
+    return years
+
+def analyze_resume(text: str, skill_ids: Optional[Iterable[int]] = None) -> Dict:
+    """
+    Compute every text feature the ATS scorer and JD matcher need in one go:
+    the text is lowercased and tokenized once and all patterns are precompiled.
+    Pass the skill ids stored at ingest to skip the skill scan.
+    """
+    text_lower = text.lower()
+    tokens = tokenize(text_lower)
+    terms = _word_terms(tokens)
+    verbs = ACTION_VERB_MATCHER.find_all(tokens)
+    skill_ids = TAXONOMY.extract_ids(tokens) if skill_ids is None else frozenset(skill_ids)
+
+    return {
+        'word_count': len(text.split()),
+        'has_bullets': not BULLET_INDICATORS.isdisjoint(text),
+        'has_dates': _DATE_PATTERN.search(text) is not None,
+        'has_email': _EMAIL_PATTERN.search(text) is not None,
+        'has_phone': _PHONE_PATTERN.search(text) is not None,
+        'sections': [
+            name for name, pattern in _SECTION_PATTERNS.items()
+            if pattern.search(text_lower)
+        ],
+        'action_verbs': [verb for verb in ACTION_VERBS if verb in verbs],
+        'skill_ids': skill_ids,
+        'skills': TAXONOMY.skill_names(skill_ids),
+        'years': _years_from_tokens(tokens),
+        'terms': terms
+    }
+
+def formatting_report(features: Dict) -> Dict:
+    """Formatting score and issues derived from precomputed features"""
+    issues = []
+    score = 100
+
+    # Check for bullet points
+    if not features['has_bullets']:
+        issues.append("No bullet points found. Use bullets for listing achievements.")
+        score -= 10
+
+    # Check length
+    word_count = features['word_count']
+    if word_count < 300:
+        issues.append("Resume is too short. Aim for 300-800 words.")
+        score -= 15
+    elif word_count > 1000:
+        issues.append("Resume is too long. Keep it concise (max 2 pages).")
+        score -= 10
+
+    # Check for dates
+    if not features['has_dates']:
+        issues.append("No dates found. Include dates for experience and education.")
+        score -= 10
+
+    return {
+        'score': max(score, 0),
+        'has_bullets': features['has_bullets'],
+        'word_count': word_count,
+        'issues': issues
+    }
@@ -0,0 +1,97 @@
+"""
+Skill taxonomy: canonical tech skills with stable integer ids, their aliases
+("k8s", "node.js", "postgres") and parent categories, loaded from a JSON data
+file (app/data/skill_taxonomy.json unless skill_taxonomy_path is set).
+
+All names and aliases are compiled into one token-level keyword automaton at
+startup, so a document's canonical skill set is found in a single scan.
+Resumes and JDs store that set as a sorted id array at ingest, tagged with the
+taxonomy version; matching is then a set intersection. Bump "version" in the
+data file whenever ids or aliases change so stored arrays are recomputed
+rather than trusted.
+"""
+from app.config import settings
+from app.utils.keyword_matcher import KeywordAutomaton, tokenize
+from typing import Dict, FrozenSet, Iterable, List, Optional
+import json
+import os
+
+DEFAULT_TAXONOMY_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'skill_taxonomy.json')
+
+# Stored next to the id arrays on resumes and jd_matches
+VERSION_FIELD = 'skill_taxonomy_version'
+
+def _phrase_key(phrase: str) -> str:
+    return ' '.join(tokenize(phrase.lower()))
+
+class SkillTaxonomy:
+    def __init__(self, data: Dict):
+        self.version = data['version']
+        # category -> parent category (None at the top)
+        self.parents: Dict[str, Optional[str]] = {
+            name: category.get('parent') for name, category in data['categories'].items()
+        }
+        for name, parent in self.parents.items():
+            if parent is not None and parent not in self.parents:
+                raise ValueError(f"Category '{name}' has unknown parent '{parent}'")
+
+        self.names: Dict[int, str] = {}          # skill id -> canonical name
+        self.categories: Dict[int, str] = {}     # skill id -> category
+        self._ids: Dict[str, int] = {}           # normalized name or alias -> skill id
+        self._matcher = KeywordAutomaton()
+        for skill in data['skills']:
+            skill_id, name = skill['id'], skill['name']
+            if skill_id in self.names:
+                raise ValueError(f"Skill id {skill_id} is used twice")
+            if skill['category'] not in self.parents:
+                raise ValueError(f"Skill '{name}' has unknown category '{skill['category']}'")
+            self.names[skill_id] = name
+            self.categories[skill_id] = skill['category']
+            for phrase in [name, *skill.get('aliases', [])]:
+                key = _phrase_key(phrase)
+                if self._ids.get(key, skill_id) != skill_id:
+                    raise ValueError(f"'{phrase}' names both {self.names[self._ids[key]]} and {name}")
+                self._ids[key] = skill_id
+                self._matcher.add(phrase, skill_id)
+        self._matcher.build()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def extract_ids(self, tokens: Iterable[str]) -> FrozenSet[int]:
+        """Canonical skill ids mentioned in a token stream (see keyword_matcher.tokenize)"""
+        return frozenset(self._matcher.find_all(tokens))
+
+    def lookup(self, phrase: str) -> Optional[int]:
+        """Id of a canonical skill name or alias, None if it is not in the taxonomy"""
+        return self._ids.get(_phrase_key(phrase))
+
+    def skill_names(self, skill_ids: Iterable[int]) -> List[str]:
+        """Canonical names, in id order"""
+        return [self.names[skill_id] for skill_id in sorted(skill_ids) if skill_id in self.names]
+
+    def category_path(self, skill_id: int) -> List[str]:
+        """A skill's category followed by its ancestors, e.g. ['databases', 'data']"""
+        path = []
+        category = self.categories.get(skill_id)
+        while category is not None and category not in path:
+            path.append(category)
+            category = self.parents[category]
+        return path
+
+def load_taxonomy(path: Optional[str] = None) -> SkillTaxonomy:
+    with open(path or DEFAULT_TAXONOMY_PATH, encoding='utf-8') as f:
+        return SkillTaxonomy(json.load(f))
+
+# Compiled once at startup
+TAXONOMY = load_taxonomy(settings.skill_taxonomy_path or None)
+
+def skill_fields(skill_ids: Iterable[int], field: str = 'skill_ids') -> Dict:
+    """Document fields storing a canonical skill set"""
+    return {field: sorted(skill_ids), VERSION_FIELD: TAXONOMY.version}
+
+def stored_skill_ids(doc: Dict, field: str = 'skill_ids') -> Optional[FrozenSet[int]]:
+    """The skill set stored on a document, None if missing or from another taxonomy version"""
+    if doc.get(VERSION_FIELD) != TAXONOMY.version or field not in doc:
+        return None
+    return frozenset(doc[field])
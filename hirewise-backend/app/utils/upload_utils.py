@@ -0,0 +1,225 @@
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from datetime import datetime
+from typing import Dict, List, Optional
+from uuid import uuid4
+import hashlib
+import io
+import os
+import zipfile
+
+CHUNK_SIZE = 256 * 1024  # 256KB
+PDF_MAGIC = b'%PDF-'
+ZIP_MAGIC = b'PK\x03\x04'
+
+# Room for multipart boundaries and the other form fields
+FORM_OVERHEAD = 64 * 1024
+
+class _BodyTooLarge(Exception):
+    pass
+
+def format_size(num_bytes: int) -> str:
+    if num_bytes >= 1024 * 1024:
+        return f"{num_bytes / (1024 * 1024):g}MB"
+    return f"{num_bytes // 1024}KB"
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject request bodies over the limit before the multipart parser spools them.
+    Checks Content-Length up front and counts streamed bytes for chunked uploads.
+    """
+
+    def __init__(self, app, max_body_size: int, path_limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.max_body_size = max_body_size + FORM_OVERHEAD
+        self.path_limits = {
+            path: limit + FORM_OVERHEAD for path, limit in (path_limits or {}).items()
+        }
+
+    def _too_large(self, limit: int) -> JSONResponse:
+        return JSONResponse(
+            status_code=413,
+            content={"detail": f"Upload too large. Maximum size is {format_size(limit)}"}
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT"):
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.path_limits.get(scope["path"], self.max_body_size)
+
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > limit:
+            await self._too_large(limit - FORM_OVERHEAD)(scope, receive, send)
+            return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    exceeded = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if exceeded:
+                # The body parser may turn our error into a generic 400; answer 413 instead
+                if message["type"] == "http.response.start" and not response_started:
+                    response_started = True
+                    await self._too_large(limit - FORM_OVERHEAD)(scope, receive, send)
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except _BodyTooLarge:
+            if not response_started:
+                await self._too_large(limit - FORM_OVERHEAD)(scope, receive, send)
+
+def _new_upload_path(upload_dir: str) -> str:
+    """Collision-free file name for a stored upload"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return os.path.join(upload_dir, f"resume_{timestamp}_{uuid4().hex}.pdf")
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+async def _read_chunks(file: UploadFile, max_size: int, magic: tuple, kind: str) -> Dict:
+    """Read an upload in chunks, hashing it and enforcing size and file signature"""
+    hasher = hashlib.sha256()
+    chunks = []
+    size = 0
+
+    while True:
+        chunk = await file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+
+        if size == 0 and not chunk.startswith(magic):
+            raise HTTPException(status_code=400, detail=f"Uploaded file is not a valid {kind}")
+
+        size += len(chunk)
+        if size > max_size:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File too large. Maximum size is {format_size(max_size)}"
+            )
+
+        hasher.update(chunk)
+        chunks.append(chunk)
+
+    if size == 0:
+        raise HTTPException(status_code=400, detail="Uploaded file is empty")
+
+    return {
+        'data': chunks[0] if len(chunks) == 1 else b"".join(chunks),
+        'content_hash': hasher.hexdigest(),
+        'size': size
+    }
+
+async def read_upload(file: UploadFile, max_size: int) -> Dict:
+    """
+    Read an uploaded PDF into memory in chunks, hashing it on the way.
+    Raises 413 as soon as max_size is exceeded and 400 if it is not a PDF.
+    Nothing is written to disk; see persist_upload.
+    """
+    return await _read_chunks(file, max_size, (PDF_MAGIC,), "PDF")
+
+def _unpack_zip(data: bytes, max_size: int, max_files: int) -> List[Dict]:
+    """PDF members of a zip archive; sizes are checked before decompressing"""
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data))
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Uploaded file is not a valid ZIP archive")
+
+    members = [
+        info for info in archive.infolist()
+        if not info.is_dir()
+        and info.filename.lower().endswith('.pdf')
+        and not os.path.basename(info.filename).startswith('.')
+        and not info.filename.startswith('__MACOSX/')
+    ]
+    if len(members) > max_files:
+        raise HTTPException(status_code=413, detail=f"Too many files. Maximum is {max_files}")
+
+    pdfs = []
+    for info in members:
+        name = os.path.basename(info.filename)
+        if info.file_size > max_size:
+            pdfs.append({'file_name': name, 'error': f"File too large. Maximum size is {format_size(max_size)}"})
+            continue
+
+        # Read at most max_size + 1 bytes in case the header understates the size
+        with archive.open(info) as member:
+            content = member.read(max_size + 1)
+        if len(content) > max_size:
+            pdfs.append({'file_name': name, 'error': f"File too large. Maximum size is {format_size(max_size)}"})
+        elif not content.startswith(PDF_MAGIC):
+            pdfs.append({'file_name': name, 'error': "File is not a valid PDF"})
+        else:
+            pdfs.append({
+                'file_name': name,
+                'data': content,
+                'content_hash': hashlib.sha256(content).hexdigest(),
+                'size': len(content)
+            })
+    return pdfs
+
+async def read_batch_uploads(
+    files: List[UploadFile], max_size: int, max_files: int, max_archive_size: int
+) -> List[Dict]:
+    """
+    Read a batch of PDF and/or ZIP uploads into memory.
+    Returns one entry per PDF; entries that could not be read carry an 'error'
+    instead of 'data' so the rest of the batch can still be processed.
+    """
+    items = []
+    for file in files:
+        name = file.filename or "upload"
+        try:
+            if name.lower().endswith('.zip'):
+                archive = await _read_chunks(file, max_archive_size, (ZIP_MAGIC,), "ZIP archive")
+                items.extend(await run_in_threadpool(_unpack_zip, archive['data'], max_size, max_files))
+            elif name.lower().endswith('.pdf'):
+                upload = await read_upload(file, max_size)
+                items.append({'file_name': name, **upload})
+            else:
+                items.append({'file_name': name, 'error': "Only PDF and ZIP files are supported"})
+        except HTTPException as e:
+            items.append({'file_name': name, 'error': e.detail})
+
+        if len(items) > max_files:
+            raise HTTPException(status_code=413, detail=f"Too many files. Maximum is {max_files}")
+
+    return items
+
+def _write_file(path: str, data: bytes):
+    part_path = path + ".part"
+    try:
+        with open(part_path, "wb") as buffer:
+            buffer.write(data)
+        os.replace(part_path, path)
+    except BaseException:
+        _remove_quietly(part_path)
+        raise
+
+async def persist_upload(upload: Dict, upload_dir: str) -> str:
+    """Write an in-memory upload to a collision-free path off the event loop"""
+    file_path = _new_upload_path(upload_dir)
+    await run_in_threadpool(_write_file, file_path, upload['data'])
+    return file_path
@@ -0,0 +1,158 @@
+"""
+Analysis worker: claims jobs from the MongoDB `jobs` queue and runs them.
+
+Run standalone with `python -m app.worker` to scale compute separately from
+the API; the API also runs `job_embedded_workers` slots of its own.
+"""
+from app.config import settings
+from app.database import connect_to_mongo, close_mongo_connection, get_database
+from app.services.job_queue import (
+    DEAD, ensure_job_indexes, claim_job, heartbeat_job, complete_job, fail_job, release_job
+)
+from app.services.llm_cache import ensure_llm_cache_indexes
+from app.services.enrichment_service import (
+    ATS_ENRICHMENT, JD_ENRICHMENT,
+    run_ats_enrichment, fail_ats_enrichment, run_jd_enrichment, fail_jd_enrichment
+)
+from typing import List, Optional
+from uuid import uuid4
+import asyncio
+import os
+import signal
+import socket
+
+# kind -> (handler, dead-letter handler)
+JOB_HANDLERS = {
+    ATS_ENRICHMENT: (run_ats_enrichment, fail_ats_enrichment),
+    JD_ENRICHMENT: (run_jd_enrichment, fail_jd_enrichment),
+}
+
+def new_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:6]}"
+
+async def _keep_lease(db, job_id: str, worker_id: str, running: asyncio.Task, lost: asyncio.Event):
+    """Renew the lease while the job runs; cancel the job if the lease is lost"""
+    while True:
+        await asyncio.sleep(settings.job_heartbeat_interval)
+        if not await heartbeat_job(db, job_id, worker_id):
+            print(f"Lost lease on job {job_id}, abandoning it")
+            lost.set()
+            running.cancel()
+            return
+
+async def _dead_letter(db, job: dict):
+    print(f"Job {job['_id']} dead-lettered after {job['attempts']} attempt(s)")
+    _, on_dead = JOB_HANDLERS[job['kind']]
+    try:
+        await on_dead(db, job['payload'])
+    except Exception as e:
+        print(f"Dead-letter handler for job {job['_id']} failed: {e}")
+
+async def process_job(db, job: dict, worker_id: str):
+    """Run one claimed job, recording success, retry or dead-letter"""
+    job_id = job['_id']
+
+    # Lease expired too often (e.g. the job keeps crashing its worker)
+    if job['attempts'] > job['max_attempts']:
+        if await fail_job(db, job, worker_id, "Lease expired on every attempt") == DEAD:
+            await _dead_letter(db, job)
+        return
+
+    handler, _ = JOB_HANDLERS[job['kind']]
+    running = asyncio.create_task(
+        asyncio.wait_for(handler(db, job['payload']), settings.enrichment_timeout)
+    )
+    lost = asyncio.Event()
+    lease = asyncio.create_task(_keep_lease(db, job_id, worker_id, running, lost))
+
+    try:
+        result = await running
+    except asyncio.CancelledError:
+        if lost.is_set():
+            return
+        # Worker is shutting down: hand the job back for someone else
+        running.cancel()
+        await release_job(db, job, worker_id)
+        raise
+    except Exception as e:
+        error = "Timed out" if isinstance(e, asyncio.TimeoutError) else f"{type(e).__name__}: {e}"
+        print(f"Job {job_id} attempt {job['attempts']} failed: {error}")
+        if await fail_job(db, job, worker_id, error) == DEAD:
+            await _dead_letter(db, job)
+        return
+    finally:
+        lease.cancel()
+
+    if await complete_job(db, job_id, worker_id, result):
+        print(f"Job {job_id} ({job['kind']}) succeeded")
+
+async def _worker_slot(db, worker_id: str, kinds: List[str], stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            job = await claim_job(db, worker_id, kinds)
+        except Exception as e:
+            print(f"Error claiming job: {e}")
+            job = None
+
+        if job is None:
+            try:
+                await asyncio.wait_for(stop.wait(), settings.job_poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        await process_job(db, job, worker_id)
+
+async def run_worker(db, concurrency: int, stop: asyncio.Event, worker_id: Optional[str] = None):
+    """Run `concurrency` job slots until `stop` is set (current jobs are finished first)"""
+    worker_id = worker_id or new_worker_id()
+    kinds = list(JOB_HANDLERS)
+    print(f"Worker {worker_id} started with {concurrency} slot(s)")
+    await asyncio.gather(*(_worker_slot(db, worker_id, kinds, stop) for _ in range(concurrency)))
+    print(f"Worker {worker_id} stopped")
+
+# Job slots running inside the API process (see job_embedded_workers)
+_embedded_stop: Optional[asyncio.Event] = None
+_embedded_task: Optional[asyncio.Task] = None
+
+def start_embedded_workers(db):
+    """Run job slots on the API's event loop so a single process works out of the box"""
+    global _embedded_stop, _embedded_task
+    if settings.job_embedded_workers <= 0 or _embedded_task is not None:
+        return
+    _embedded_stop = asyncio.Event()
+    _embedded_task = asyncio.create_task(
+        run_worker(db, settings.job_embedded_workers, _embedded_stop)
+    )
+
+async def stop_embedded_workers(grace_seconds: float = 10.0):
+    """Let embedded slots finish their current job, then release whatever is left"""
+    global _embedded_stop, _embedded_task
+    if _embedded_task is None:
+        return
+    _embedded_stop.set()
+    try:
+        await asyncio.wait_for(_embedded_task, grace_seconds)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        pass
+    _embedded_stop = None
+    _embedded_task = None
+
+async def main():
+    await connect_to_mongo()
+    db = get_database()
+    await ensure_job_indexes(db)
+    await ensure_llm_cache_indexes(db)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await run_worker(db, settings.job_worker_concurrency, stop)
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Settings require a Gemini key; tests never call Gemini
+os.environ.setdefault('GEMINI_API_KEY', 'test-key')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,38 @@
+from app.utils.keyword_matcher import KeywordAutomaton, tokenize
+
+def _find(phrases, text):
+    automaton = KeywordAutomaton()
+    for phrase in phrases:
+        automaton.add(phrase)
+    return automaton.find_all(tokenize(text.lower()))
+
+def test_tokenize_keeps_plus_and_hash_suffixes():
+    assert tokenize('c++ and c# on ci/cd') == ['c++', 'and', 'c#', 'on', 'ci', '/', 'cd']
+
+def test_matches_whole_words_only():
+    assert _find(['java'], 'Senior JavaScript developer') == set()
+    assert _find(['java'], 'Java and JavaScript') == {'java'}
+
+def test_short_words_do_not_match_inside_longer_ones():
+    assert _find(['led', 'go'], 'Called the good team') == set()
+    assert _find(['led', 'go'], 'Led a Go rewrite') == {'led', 'go'}
+
+def test_multi_token_phrases():
+    assert _find(['machine learning', 'ci/cd'], 'Built CI/CD for machine learning models') == {'machine learning', 'ci/cd'}
+    assert _find(['machine learning'], 'machine vision and learning') == set()
+
+def test_overlapping_phrases_are_all_reported():
+    assert _find(['spring', 'spring boot', 'boot'], 'Spring Boot services') == {'spring', 'spring boot', 'boot'}
+
+def test_scan_reports_every_occurrence_with_its_value():
+    automaton = KeywordAutomaton()
+    automaton.add('node.js', 7)
+    automaton.add('nodejs', 7)
+    assert list(automaton.scan(tokenize('node.js, nodejs and node.js'))) == [7, 7, 7]
+
+def test_phrases_added_after_build_are_found():
+    automaton = KeywordAutomaton()
+    automaton.add('python')
+    assert automaton.find_all(['python', 'rust']) == {'python'}
+    automaton.add('rust')
+    assert automaton.find_all(['python', 'rust']) == {'python', 'rust'}
@@ -0,0 +1,24 @@
+import pytest
+
+from app.services.llm_batching import parse_batch_response
+from app.services.llm_client import LLMError
+
+def test_entries_are_keyed_by_id_without_the_id_field():
+    results = parse_batch_response('[{"id": "r1", "score": 70}, {"id": 2, "score": 55}]')
+    assert results == {'r1': {'score': 70}, '2': {'score': 55}}
+
+def test_entries_without_id_are_dropped():
+    assert parse_batch_response('[{"score": 70}, "junk", {"id": "r2", "score": 40}]') == {'r2': {'score': 40}}
+
+def test_results_wrapper_object_is_accepted():
+    assert parse_batch_response('{"results": [{"id": "a", "ok": true}]}') == {'a': {'ok': True}}
+
+def test_fenced_and_truncated_array_keeps_complete_entries():
+    text = '```json\n[{"id": "a", "score": 1}, {"id": "b", "score": 2}, {"id": "c", "sco'
+    results = parse_batch_response(text)
+    assert results['a'] == {'score': 1}
+    assert results['b'] == {'score': 2}
+
+def test_non_array_response_is_an_error():
+    with pytest.raises(LLMError):
+        parse_batch_response('"just a string"')
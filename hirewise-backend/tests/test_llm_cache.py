@@ -0,0 +1,27 @@
+from app.services.llm_cache import llm_cache_key, normalize_input
+
+def _key(*inputs, model='gemini-pro', template='ats_analysis', version=1):
+    return llm_cache_key(model, template, version, list(inputs))
+
+def test_normalize_input_folds_case_whitespace_and_unicode():
+    assert normalize_input('  Senior\tPython\n\nENGINEER ') == 'senior python engineer'
+    # NFKC: full-width letters and ligatures fold to their plain forms
+    assert normalize_input('Ｐｙｔｈｏｎ ﬁle') == 'python file'
+
+def test_key_is_stable_across_formatting_differences():
+    assert _key('Python  Engineer\n', 'Resume') == _key('python engineer', 'RESUME')
+
+def test_key_is_a_fixed_sha256():
+    # Persisted keys must not change between releases unless intended
+    assert _key('resume text') == _key('resume text')
+    assert len(_key('resume text')) == 64
+
+def test_key_changes_with_model_template_and_version():
+    base = _key('resume text')
+    assert _key('resume text', model='gemini-1.5-flash') != base
+    assert _key('resume text', template='jd_match_analysis') != base
+    assert _key('resume text', version=2) != base
+
+def test_input_boundaries_are_part_of_the_key():
+    assert _key('ab', 'c') != _key('a', 'bc')
+    assert _key('ab') != _key('a', 'b')
@@ -0,0 +1,53 @@
+import pytest
+
+from app.utils.partial_json import IncrementalJSONParser, repair_json
+
+def _feed_chars(text):
+    """Feed one character at a time, recording every partial() seen"""
+    parser = IncrementalJSONParser()
+    seen = []
+    for char in text:
+        if parser.feed(char):
+            seen.append(parser.partial())
+    return parser, seen
+
+def test_numbers_are_only_surfaced_once_complete():
+    parser, seen = _feed_chars('{"match_score": 85, "level": "senior"}')
+    scores = [partial.get('match_score') for partial in seen if partial]
+    assert 8 not in scores
+    assert 85 in scores
+    assert parser.done
+    assert parser.result() == {'match_score': 85, 'level': 'senior'}
+
+def test_strings_are_only_surfaced_once_closed():
+    _, seen = _feed_chars('{"summary": "Strong backend profile"}')
+    summaries = {partial.get('summary') for partial in seen if partial}
+    assert summaries <= {None, 'Strong backend profile'}
+
+def test_partial_keeps_completed_list_items():
+    parser = IncrementalJSONParser()
+    parser.feed('{"skills": ["python", "docker", "kube')
+    assert parser.partial() == {'skills': ['python', 'docker']}
+
+def test_prose_and_fences_around_the_document_are_ignored():
+    parser = IncrementalJSONParser()
+    parser.feed('Here you go:\n```json\n{"a": [1, 2,],}\n```\nAnything else?')
+    assert parser.done
+    assert parser.result() == {'a': [1, 2]}
+
+def test_truncated_document_is_closed_keeping_cut_off_string():
+    assert repair_json('{"a": 1, "notes": ["one", "tw') == {'a': 1, 'notes': ['one', 'tw']}
+
+def test_truncated_document_drops_cut_off_number():
+    assert repair_json('{"a": "x", "score": 8') == {'a': 'x'}
+
+def test_truncated_document_drops_key_without_value():
+    assert repair_json('{"a": 1, "b":') == {'a': 1}
+    assert repair_json('{"a": 1, "ke') == {'a': 1}
+
+def test_escaped_quotes_do_not_end_strings():
+    assert repair_json(r'{"quote": "said \"hi\", then left"}') == {'quote': 'said "hi", then left'}
+
+def test_repair_json_rejects_text_without_json():
+    with pytest.raises(ValueError):
+        repair_json('Sorry, I cannot help with that.')
@@ -0,0 +1,37 @@
+from app.utils.pdf_utils import score_text_quality
+
+_CLEAN_PAGE = '\n'.join(
+    f"- Developed Python services for project {i}, improving latency by {i} percent for the team"
+    for i in range(12)
+)
+
+def test_clean_text_scores_high():
+    quality = score_text_quality(_CLEAN_PAGE, 1)
+    assert quality['score'] >= 0.9
+    assert quality['broken_word_ratio'] == 0
+    assert quality['column_ratio'] == 0
+
+def test_empty_text_scores_zero():
+    assert score_text_quality('', 1)['score'] == 0.0
+    assert score_text_quality('   \n  ', 2)['score'] == 0.0
+
+def test_sparse_pages_score_lower():
+    assert score_text_quality(_CLEAN_PAGE, 10)['score'] < score_text_quality(_CLEAN_PAGE, 1)['score']
+
+def test_letter_spaced_words_are_penalized():
+    spaced = '\n'.join(' '.join(line) for line in _CLEAN_PAGE.splitlines())
+    quality = score_text_quality(spaced, 1)
+    assert quality['broken_word_ratio'] > 0.5
+    assert quality['score'] == 0.0
+
+def test_glued_words_are_penalized():
+    glued = '\n'.join(['softwareengineerwithsixyearsofexperience buildingscalablebackendsystems'] * 20)
+    quality = score_text_quality(glued, 1)
+    assert quality['broken_word_ratio'] == 1.0
+    assert quality['score'] == 0.0
+
+def test_merged_columns_are_penalized():
+    merged = '\n'.join(f"{line}     Skills: Python, Docker" for line in _CLEAN_PAGE.splitlines())
+    quality = score_text_quality(merged, 1)
+    assert quality['column_ratio'] == 1.0
+    assert quality['score'] < 0.5
@@ -0,0 +1,26 @@
+from app.services.llm_batching import estimate_tokens
+from app.services.prompt_builder import compress_resume, segment_resume
+
+def _one_line_resume(name: str) -> str:
+    """A resume as some PDFs extract it: everything on a single line"""
+    return ' '.join(
+        f"{name} worked on project {i} building Python services, improving latency by {i}% for the team."
+        for i in range(200)
+    )
+
+def test_long_single_line_is_split_into_units():
+    units = [unit for section in segment_resume(_one_line_resume('Alice')) for unit in section['units']]
+    assert len(units) > 1
+    assert all(len(unit) <= 600 for unit in units)
+
+def test_long_single_line_compresses_within_budget():
+    excerpt = compress_resume(_one_line_resume('Alice'), 200)
+    assert 'Alice' in excerpt
+    assert estimate_tokens(excerpt) <= 200
+
+def test_distinct_long_resumes_give_distinct_excerpts():
+    assert compress_resume(_one_line_resume('Alice'), 200) != compress_resume(_one_line_resume('Bob'), 200)
+
+def test_unbroken_text_falls_back_to_truncation():
+    excerpt = compress_resume('x' * 5000, 50)
+    assert excerpt == 'x' * 200
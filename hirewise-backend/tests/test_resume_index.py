@@ -0,0 +1,46 @@
+from app.services.resume_index import ResumeIndex, SKILL_PREFIX, index_terms, required_terms
+
+_RESUMES = {
+    'backend': "Python engineer, 6 years building Django REST APIs on AWS with Docker and Kubernetes",
+    'frontend': "Frontend developer: React, TypeScript and CSS design systems",
+    'data': "Data analyst using Python, pandas and SQL dashboards",
+    'sales': "Account executive who exceeded sales quotas and managed client relationships",
+}
+
+def _index():
+    index = ResumeIndex()
+    for resume_id, text in _RESUMES.items():
+        index.add(resume_id, text)
+    return index
+
+def _search(index, query, limit=10, **kwargs):
+    return [resume_id for resume_id, _ in index.search(index_terms(query), limit, **kwargs)]
+
+def test_best_match_ranks_first_and_unrelated_resumes_are_left_out():
+    ranked = _search(_index(), "Python backend engineer with Docker, Kubernetes and AWS")
+    assert ranked[0] == 'backend'
+    assert 'data' in ranked
+    assert 'sales' not in ranked
+
+def test_scores_are_descending_and_limited():
+    results = _index().search(index_terms("Python React SQL sales"), 2)
+    assert len(results) == 2
+    assert results[0][1] >= results[1][1]
+
+def test_skill_aliases_in_the_query_find_canonical_skills():
+    assert SKILL_PREFIX + 'kubernetes' in index_terms("k8s")
+    assert _search(_index(), "k8s")[0] == 'backend'
+
+def test_required_skills_filter_candidates():
+    required = required_terms(['sql'])
+    assert _search(_index(), "Python engineer", required=required) == ['data']
+
+def test_only_restricts_to_the_given_resumes():
+    assert _search(_index(), "Python engineer", only={'data', 'sales'}) == ['data']
+
+def test_removed_resumes_are_not_returned():
+    index = _index()
+    index.remove('backend')
+    assert 'backend' not in _search(index, "Python Docker Kubernetes AWS")
+    index.compact()
+    assert _search(index, "Python")[0] == 'data'